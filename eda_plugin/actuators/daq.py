@@ -12,18 +12,23 @@ import copy
 import logging
 import time
 
-import nidaqmx
-import nidaqmx.stream_writers
 import numpy as np
+from eda_plugin.actuators.daq_streaming import Segment, SegmentStream, hold_samples
 from eda_plugin.utility.event_bus import EventBus
 from eda_plugin.utility.data_structures import ParameterSet
 from pymm_eventserver.data_structures import MMSettings
 from qtpy.QtCore import QObject, Signal, Slot
-from isimgui.hardware.nidaq_components.devices import Camera, Galvo, Twitcher, LED, AOTF, Stage
-from isimgui.hardware.nidaq_components.settings import NIDAQSettings
 
 log = logging.getLogger("EDA")
 
+# Cached device segments, the cache is cleared if it gets larger than this
+MAX_SEGMENTS = 256
+# Length of the chunks written to the DAQ card, and how many are written before the start
+CHUNK_MS = 20
+BUFFERED_CHUNKS = 3
+# Seconds to wait for space in the DAQ buffer when writing a chunk
+WRITE_TIMEOUT = 10
+
 
 class DAQActuator(QObject):
     """Deliver new data to the DAQ with the framerate as given by the FrameRateInterpreter."""
@@ -31,33 +36,61 @@ class DAQActuator(QObject):
     new_daq_data = Signal(np.ndarray)
     start_acq_signal = Signal(np.ndarray)
 
-    def __init__(self, event_bus: EventBus, my_task = nidaqmx.Task):
-        """Initialize the DAQ with the settings that are fixed for all modes."""
-        super().__init__()
+    def __init__(self, event_bus: EventBus, my_task = None, simulate: bool = False,
+                 devices: dict = None, core=None, settings: MMSettings = None):
+        """Initialize the DAQ with the settings that are fixed for all modes.
 
-        self.sampling_rate = 500
+        nidaqmx and the isimgui devices are only imported here, so that importing this module stays
+        cheap on machines without the DAQ drivers. With simulate, the SimulatedTask from
+        daq_simulation is used instead of nidaqmx. The devices (galvo, stage, camera, aotf,
+        twitcher and their ni_settings), the core and the MDA settings are taken from isimgui and
+        Micro-Manager if they are not passed, so simulate needs neither if they are.
+        """
+        super().__init__()
+        if simulate:
+            from eda_plugin.actuators import daq_simulation as nidaqmx
+        else:
+            import nidaqmx
+            import nidaqmx.constants
+            import nidaqmx.errors
+            import nidaqmx.stream_writers
+        self.nidaqmx = nidaqmx
 
         self.event_bus = event_bus
-        self.core = self.event_bus.event_thread.bridge.get_core()
-        settings = (
-            self.event_bus.event_thread.bridge.get_studio()
-            .acquisitions()
-            .get_acquisition_settings()
-        )
-        self.settings = MMSettings(settings)
+        if core is None:
+            core = self.event_bus.event_thread.bridge.get_core()
+        self.core = core
+        if settings is None:
+            settings = MMSettings(
+                self.event_bus.event_thread.bridge.get_studio()
+                .acquisitions()
+                .get_acquisition_settings()
+            )
+        self.settings = settings
         self.eda_params = None
 
         self.sampling_rate = 9600
-        self.ni_settings = NIDAQSettings(self.sampling_rate)
+        if devices is None:
+            from isimgui.hardware.nidaq_components.settings import NIDAQSettings
+            self.ni_settings = NIDAQSettings(self.sampling_rate)
+        else:
+            self.ni_settings = devices["ni_settings"]
         self._update_settings(self.settings)
 
-        self.galvo = Galvo(self)
-        self.stage = Stage(self)
-        self.camera = Camera(self)
-        self.aotf = AOTF(self)
-        self.twitcher = Twitcher(self.ni_settings)
+        if devices is None:
+            devices = self._isimgui_devices()
+        self.galvo = devices["galvo"]
+        self.stage = devices["stage"]
+        self.camera = devices["camera"]
+        self.aotf = devices["aotf"]
+        self.twitcher = devices["twitcher"]
+
+        # Waveform segments by device and the inputs they were made from, see _segment
+        self._segments = {}
+        self._timepoint = None
+        self._timepoint_keys = {}
 
-        self.my_task = my_task
+        self.my_task = nidaqmx.Task if my_task is None else my_task
         self._init_task()
 
 
@@ -67,6 +100,12 @@ class DAQActuator(QObject):
         # self.event_bus.mda_settings_event.connect(self.new_settings)
         self._connect_events()
 
+    def _isimgui_devices(self) -> dict:
+        from isimgui.hardware.nidaq_components.devices import Camera, Galvo, Twitcher, AOTF, Stage
+
+        return {"galvo": Galvo(self), "stage": Stage(self), "camera": Camera(self),
+                "aotf": AOTF(self), "twitcher": Twitcher(self.ni_settings)}
+
     def _connect_events(self):
         self.event_bus.configuration_settings_event.connect(self.configuration_settings)
         self.event_bus.new_parameters.connect(self.update_intervals)
@@ -123,7 +162,12 @@ class DAQActuator(QObject):
             self.acq.interval_fast = params.fast_interval
             self.acq.interval = params.slow_interval
             self.eda_params = params
-        self.acq = EDAAcquisition(self, self.settings, self.eda_params)
+        # The timepoint comes from the cache, only the task has to be set up again if the length
+        # of the data changed
+        shape = self.acq.daq_data_shape
+        self.acq.make_daq_data()
+        if self.acq.daq_data_shape != shape:
+            self.acq.update_settings(self.settings)
 
     @Slot(object)
     def run_acquisition_task(self, _):
@@ -132,7 +176,7 @@ class DAQActuator(QObject):
         time.sleep(1)
         try:
             self.task.start()
-        except nidaqmx.errors.DaqError:
+        except self.nidaqmx.errors.DaqError:
             self._init_task()
             self.acq = EDAAcquisition(self, self.settings, self.eda_params)
             self.task.start()
@@ -183,37 +227,82 @@ class DAQActuator(QObject):
                 self.blockSignals(True)
                 self.task.close()
 
-        # if device in ["561_AOTF", "488_AOTF", "exposure"]:
-        #     self.live.make_daq_data()
+        if device in ["561_AOTF", "488_AOTF"] and prop == r"Power (% of max)":
+            # Only the AOTF frames are made and copied into the timepoint again
+            self.acq.make_daq_data()
         log.info(f"{device}.{prop} -> {value}")
 
     def _generate_one_timepoint(self):
-        """One timepoint, at the moment only in slices first, channels second."""
+        """One timepoint, at the moment only in slices first, channels second.
+
+        The frames of the devices are cached by the settings they depend on, and the timepoint is
+        assembled in a buffer that is reused. Only the blocks whose segment changed since the last
+        call are copied, so e.g. a new laser power only recomputes and copies the AOTF rows.
+        The buffer is overwritten by the next call, copy it to keep it.
+        """
         iter_slices = copy.deepcopy(self.settings.slices)
         iter_slices_rev = copy.deepcopy(iter_slices)
         iter_slices_rev.reverse()
 
-        galvo = self.galvo.one_frame(self.ni_settings)
-        camera = self.camera.one_frame(self.ni_settings)
-        twitcher = self.twitcher.one_frame(self.ni_settings)
+        galvo = self._segment("galvo", self.galvo, (),
+                              lambda: self.galvo.one_frame(self.ni_settings))
+        camera = self._segment("camera", self.camera, (),
+                               lambda: self.camera.one_frame(self.ni_settings))
+        twitcher = self._segment("twitcher", self.twitcher, (),
+                                 lambda: self.twitcher.one_frame(self.ni_settings))
 
         z_iter = 0
-        channels_data = []
+        frames = []
         for channel in self.settings.channels.values():
             if channel["use"]:
-                slices_data = []
                 slices = iter_slices if not np.mod(z_iter, 2) else iter_slices_rev
+                aotf = self._segment("aotf", self.aotf, (channel["name"],),
+                                     lambda: self.aotf.one_frame(self.ni_settings, channel))
                 for sli in slices:
-                    aotf = self.aotf.one_frame(self.ni_settings, channel)
                     offset = sli - self.settings.slices[0]
-                    stage = self.stage.one_frame(self.ni_settings, offset)
-                    data = np.vstack((galvo, stage, camera, aotf, twitcher))
-                    slices_data.append(data)
+                    stage = self._segment("stage", self.stage, (offset,),
+                                          lambda: self.stage.one_frame(self.ni_settings, offset))
+                    frames.append((galvo, stage, camera, aotf, twitcher))
                 z_iter += 1
-                data = np.hstack(slices_data)
-                channels_data.append(data)
-        timepoint = np.hstack(channels_data)
-        return timepoint
+        return self._assemble(frames)
+
+    def _settings_key(self) -> tuple:
+        """What all the device frames depend on."""
+        return (self.smpl_rate, self.sampling_rate, self.sweeps_per_frame,
+                _scalar_attributes(self.ni_settings))
+
+    def _segment(self, name: str, device, key: tuple, make) -> tuple:
+        """(key, frame) of a device, the frame is only made if the key is new.
+
+        The key includes the settings and the scalar attributes of the device, like the laser
+        powers of the AOTF, so that a change in those makes a new frame.
+        """
+        key = (name, self._settings_key(), _scalar_attributes(device), *key)
+        frame = self._segments.get(key)
+        if frame is None:
+            if len(self._segments) >= MAX_SEGMENTS:
+                self._segments.clear()
+            frame = self._segments[key] = np.atleast_2d(make())
+        return key, frame
+
+    def _assemble(self, frames: list) -> np.ndarray:
+        """Copy the device rows of each frame into the timepoint buffer, skip unchanged ones."""
+        rows = sum(frame.shape[0] for _, frame in frames[0])
+        length = frames[0][0][1].shape[1]
+        shape = (rows, length * len(frames))
+        if self._timepoint is None or self._timepoint.shape != shape:
+            self._timepoint = np.empty(shape)
+            self._timepoint_keys = {}
+        for index, segments in enumerate(frames):
+            row = 0
+            for key, frame in segments:
+                block = (index, row)
+                if self._timepoint_keys.get(block) != key:
+                    self._timepoint[row:row + frame.shape[0],
+                                    index * length:(index + 1) * length] = frame
+                    self._timepoint_keys[block] = key
+                row += frame.shape[0]
+        return self._timepoint
 
 
 class EDAAcquisition(QObject):
@@ -222,6 +311,16 @@ class EDAAcquisition(QObject):
     This setup of a separate object for the Acquisition comes from the isimgui, where there are two
     different classes for the live mode and the mda acquisition. Here it could be included in the
     main class, but to keep things consistent it will remain in its own class.
+
+    The DAQ data is not written out for the whole interval. A timepoint is a Segment of the active
+    pattern and the number of samples to hold the last value for, and the SegmentStream writes it
+    in chunks of chunk_ms to the DAQ card.
+
+    The state asked for by the interpreter (here the interval) is checked for every chunk. If it
+    changed while the outputs hold after a timepoint, the hold is changed right away, so a switch
+    takes effect after the chunks already in the DAQ buffer and at most one more chunk. The
+    latency of each switch, from setting the state to the output of its first sample, is logged
+    and kept in switch_latencies (ms).
     """
 
     def __init__(self, ni: DAQActuator, settings: MMSettings, eda_params: ParameterSet = None):
@@ -229,6 +328,7 @@ class EDAAcquisition(QObject):
         super().__init__()
         self.settings = settings
         self.ni = ni
+        self._switch_requested = None
         if eda_params is None:
             self.interval = 3
             self.interval_fast = 0
@@ -238,8 +338,13 @@ class EDAAcquisition(QObject):
             self.interval_slow = eda_params.slow_interval
             self.interval_fast = eda_params.fast_interval
             self.interval = eda_params.slow_interval
-        self.daq_data_fast = None
-        self.daq_data_slow = None
+        self.chunk_ms = CHUNK_MS
+        self.timepoint = None
+        self.stream = None
+        self.playing = None
+        self.switch_latencies = []
+        self._switch_requested = None
+        self._stream_start = 0
         self.daq_data_shape = None
         self.make_daq_data()
         try:
@@ -250,8 +355,23 @@ class EDAAcquisition(QObject):
             log.warning("No data to write yet.")
 
 
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval: float):
+        self._request()
+        self._interval = interval
+
+    def _request(self):
+        """The interpreter asks for a state, the latency of the switch is measured from now."""
+        if getattr(self, "_switch_requested", None) is None:
+            self._switch_requested = time.perf_counter()
+
     def update_settings(self, new_settings, write=True):
         """Update the settings according to the daq_data that the acquisition has generated."""
+        nidaqmx = self.ni.nidaqmx
         self.ni._init_task()
         self.ni.task.timing.cfg_samp_clk_timing(
             rate=self.ni.smpl_rate,
@@ -266,47 +386,101 @@ class EDAAcquisition(QObject):
                 self.ni.task.out_stream, auto_start=False
             )
             if write:
-                self.ni.stream.write_many_sample(self.daq_data_fast)
+                self.write_first_chunks()
         except FileNotFoundError:
             log.warning("DAQ not connected no data sent")
         self.ni.task.register_every_n_samples_transferred_from_buffer_event(
             self.daq_data_shape[1], self.get_new_data
         )
 
+    def write_first_chunks(self):
+        """Fill the DAQ buffer before the start, the acquisition starts with a new timepoint."""
+        self.stream.reset()
+        self.playing = None
+        self._switch_requested = None
+        # Sample of the stream that the task outputs first
+        self._stream_start = self.stream.samples
+        for _ in range(BUFFERED_CHUNKS):
+            self.ni.stream.write_many_sample(self.stream.next_chunk(self.next_segment))
+
     def get_new_data(self, *_):
         """Pass new data to the DAQ card.
 
         This function was called because the DAQ card is running out of samples to write to the
         outputs. The additional parameters have information about the event that we don't use here.
         """
-        log.info(self.interval)
-        if self.interval == self.interval_fast:
-            timeout = max(self.interval_fast - 10, 10)
-            self.ni.stream.write_many_sample(self.daq_data_fast, timeout=timeout)
-        elif self.interval == self.interval_slow:
-            timeout = max(self.interval_slow - 10, 10)
-            self.ni.stream.write_many_sample(self.daq_data_slow, timeout=timeout)
-        else:
-            log.warning("Intervals have changes please restart the acquisition")
+        self.follow_state()
+        self.ni.stream.write_many_sample(self.stream.next_chunk(self.next_segment),
+                                         timeout=WRITE_TIMEOUT)
         return 0
 
+    def state(self):
+        """What the interpreter asks for at the moment."""
+        return self.interval
+
+    def segment_for(self, state) -> Segment:
+        """The timepoint to play for a state."""
+        return Segment(self.timepoint,
+                       hold_samples(self.ni.smpl_rate, state * 1000, self.timepoint))
+
+    def retime(self, state) -> bool:
+        """Adapt the playing timepoint to a new state, True if it plays as asked for now."""
+        active = self.stream.segment.active
+        self.stream.retime(hold_samples(self.ni.smpl_rate, state * 1000, active))
+        return self.stream.position < len(self.stream.segment)
+
+    def follow_state(self):
+        """Retime the playing timepoint if the interpreter asks for something new."""
+        state = self.state()
+        if state == self.playing or self.stream.segment is None:
+            self._switch_requested = None
+            return
+        if self.retime(state):
+            self._switched(state, self.stream.samples)
+
+    def next_segment(self) -> Segment:
+        """The next timepoint for the current state, called by the stream."""
+        state = self.state()
+        if state != self.playing and self._switch_requested is not None:
+            self._switched(state, self.stream.start)
+        self.playing = state
+        return self.segment_for(state)
+
+    def _switched(self, state, sample: int):
+        """The samples for state are played from sample on, log how long the switch took."""
+        if self._switch_requested is None:
+            self._request()
+        generated = self.ni.task.out_stream.total_samp_per_chan_generated
+        # The sample is still in the buffer, it is output that much later than now
+        ahead = (sample - self._stream_start - generated) / self.ni.smpl_rate
+        latency = (time.perf_counter() + ahead - self._switch_requested) * 1000
+        self.switch_latencies.append(latency)
+        log.info(f"Switched to {state} after {latency:.0f} ms")
+        self._switch_requested = None
+        self.playing = state
+
     def make_daq_data(self):
-        """Prepare the two versions of daq_data so they can be pass fast later to the DAQ stream."""
-        timepoint = self.ni._generate_one_timepoint()
-        self.daq_data_fast = self.add_interval(timepoint, self.interval_fast * 1000)
-        self.daq_data_slow = self.add_interval(timepoint, self.interval_slow * 1000)
-        self.daq_data_shape = self.daq_data_fast.shape
+        """Prepare the timepoint and the stream that writes it in chunks to the DAQ card."""
+        # The actuator reuses the buffer of the timepoint, the stream might still be playing it
+        self.timepoint = self.ni._generate_one_timepoint().copy()
+        self._make_stream(self.timepoint.shape[0])
+
+    def _make_stream(self, n_channels: int):
+        """New SegmentStream if the number of channels or the chunk size changed."""
+        chunk_size = max(round(self.ni.smpl_rate * self.chunk_ms / 1000), 1)
+        if self.stream is None or self.stream.buffer.shape != (n_channels, chunk_size):
+            self.stream = SegmentStream(n_channels, chunk_size)
+        self.daq_data_shape = self.stream.buffer.shape
 
     def add_interval(self, timepoint, interval_ms):
         """Fastest timepoint possible, now add parking data to match the specified interval."""
-        if interval_ms > 0:
-            missing_samples = round(
-                self.ni.smpl_rate * interval_ms / 1000 - timepoint.shape[1]
-            )
-            delay = np.repeat(timepoint[:,-1][..., None], missing_samples, axis=1)
-            timepoint = np.hstack([timepoint, delay])
-        print("INTERVAL: ", interval_ms)
-        return timepoint
+        return Segment(timepoint, hold_samples(self.ni.smpl_rate, interval_ms, timepoint)).samples()
+
+
+def _scalar_attributes(obj) -> tuple:
+    """Numbers, strings and flags of an object, the part of its state that can go into a key."""
+    return tuple(sorted((name, value) for name, value in getattr(obj, "__dict__", {}).items()
+                        if isinstance(value, (int, float, str, bool, np.number))))
 
 
 def make_pulse(ni, start, end, offset):
@@ -1,95 +1,161 @@
-"""An actuator that saves two settings from the MDA window to switch between"""
-from unittest import mock
+"""An actuator that saves settings from the MDA window as named presets to switch between.
+
+Each preset has MDA settings and the device settings (e.g. laser powers) set in Micro-Manager while
+it was active. The DAQ data of a preset is rendered on its own, with the actuator and devices set up
+for it only while rendering, and kept until its settings change. Switching between presets during
+the acquisition only changes which Segment the stream plays next.
+"""
+import contextlib
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
 from eda_plugin.actuators.daq import EDAAcquisition
+from eda_plugin.actuators.daq_streaming import Segment, hold_samples
 from eda_plugin.utility.event_bus import EventBus
 from eda_plugin.actuators.daq import DAQActuator
 from qtpy import QtWidgets, QtCore
 from eda_plugin.utility.qt_classes import QWidgetRestore
 from pymm_eventserver.data_structures import MMSettings
-from pycromanager import Studio, Core
-from collections import defaultdict
-import logging
-import time
-import nidaqmx
-import numpy as np
 
 log = logging.getLogger("EDA")
-studio = Studio()
-core = Core()
+
+POWER = r"Power (% of max)"
+# What _update_settings sets on the actuator
+PRESET_ATTRIBUTES = ("settings", "cycle_time", "sweeps_per_frame", "frame_rate", "smpl_rate",
+                     "n_points", "duty_cycle")
+
+
+def _config() -> defaultdict:
+    return defaultdict(lambda: defaultdict(str))
+
+
+@dataclass
+class DAQPreset:
+    """MDA settings and device settings of a preset, with its DAQ data once rendered."""
+
+    settings: MMSettings
+    config: defaultdict = field(default_factory=_config)
+    segment: Segment = None
+
+    def invalidate(self):
+        """The settings changed, render the DAQ data again when it is needed."""
+        self.segment = None
 
 
 class DAQPresetsActuator(DAQActuator):
-    """Actuator that saves two MM settings to toggle between for screening and imaging."""
+    """Actuator that saves MM settings as presets to toggle between, e.g. screening and imaging.
+
+    The interpreter selects the preset by its index, so 0 is the first preset ("screen") and 1 the
+    second ("image"). Further presets can be added with add_preset.
+    """
 
     def __init__(self, event_bus: EventBus = EventBus):
+        # Only connect to Micro-Manager when the actuator is created, not on import
+        from pycromanager import Studio, Core
+
         super().__init__(event_bus)
-        settings = studio.acquisitions().get_acquisition_settings()
+        self.studio = Studio()
+        self.mm_core = Core()
+        settings = self.studio.acquisitions().get_acquisition_settings()
 
         #TODO: Load this from saved settings
-        self.screen_settings = MMSettings(settings, post_delay = 0)
-        self.image_settings = MMSettings(settings, post_delay = 0)
-        self.screen_config_settings = defaultdict(lambda: defaultdict(str))
-        self.image_config_settings = defaultdict(lambda: defaultdict(str))
-        self.initialize_laser_settings()
+        self.presets = {}
+        self.add_preset("screen", MMSettings(settings, post_delay = 0),
+                        {"488_AOTF": {POWER: 20.0}, "561_AOTF": {POWER: 0}})
+        self.add_preset("image", MMSettings(settings, post_delay = 0),
+                        {"488_AOTF": {POWER: 20.0}, "561_AOTF": {POWER: 50.0}})
 
         self.gui = DAQPresetsActuatorGUI(self)
 
-        studio.acquisitions().set_acquisition_settings(self.screen_settings.java_settings)
-        self.active_settings = "screen"
+        self.studio.acquisitions().set_acquisition_settings(
+            self.presets["screen"].settings.java_settings)
+        self.active_preset = "screen"
         self._connect_events()
         self.event_bus.exposure_changed_event.connect(self.configuration_settings)
 
         self.acq = DAQPresetsAcquisition(self, settings)
 
+    def add_preset(self, name: str, settings: MMSettings, config: dict = None) -> DAQPreset:
+        """Add or replace a preset, config maps device -> property -> value."""
+        preset = DAQPreset(settings)
+        for device, properties in (config or {}).items():
+            preset.config[device].update(properties)
+        self.presets[name] = preset
+        if getattr(self, "gui", None) is not None:
+            self.gui.add_preset_button(name)
+        return preset
+
     @QtCore.Slot(object)
     def new_settings(self, new_settings:  MMSettings):
-        print("New settings before!")
         try:
             super().new_settings(new_settings)
         except AttributeError:
-            # There is no daq_data_fast for updating the settings
+            # There is no daq data yet for updating the settings
             pass
         self.acq.update_settings(new_settings, write=False)
-        print("New Settings!")
-        if self.active_settings == "screen":
-            self.screen_settings = new_settings
-        elif self.active_settings == "image":
-            self.image_settings = new_settings
-        # self.acq.make_daq_data()
-
+        preset = self.presets.get(getattr(self, "active_preset", None))
+        if preset is not None:
+            preset.settings = new_settings
+            preset.invalidate()
 
     @QtCore.Slot(str, str, str)
     def configuration_settings(self, device, prop, value):
         super().configuration_settings(device, prop, value)
-        print(device, value)
-        if device in ["EDA"]:
+        preset = self.presets.get(getattr(self, "active_preset", None))
+        if device in ["EDA"] or preset is None:
             return
-        if self.active_settings == "screen":
-            self.screen_config_settings[device][prop] = float(value)
-        if self.active_settings == "image":
-            self.image_config_settings[device][prop] = float(value)
-        # self.acq.make_daq_data()
-
-    def initialize_laser_settings(self):
-        self.screen_config_settings['488_AOTF'][ r"Power (% of max)"] = 20.0
-        self.screen_config_settings['561_AOTF'][ r"Power (% of max)"] = 0
-        self.image_config_settings['488_AOTF'][ r"Power (% of max)"] = 20.0
-        self.image_config_settings['561_AOTF'][ r"Power (% of max)"] = 50.0
+        try:
+            preset.config[device][prop] = float(value)
+        except ValueError:
+            # Settings like the camera trigger mode don't go into the DAQ data
+            return
+        preset.invalidate()
+        if prop == POWER:
+            # The actuator made the DAQ data with the cached segment of the preset
+            self.acq.make_daq_data()
 
-    def update_settings_in_devices(self):
-        """Send the config settings to the devices.
+    def update_settings_in_devices(self, name: str = None):
+        """Send the config settings of a preset (by default the active one) to the devices.
 
         When the GUI is updating the settings in Micro-Manager, we are blocking events to not get
         confused about which setting they belong to. So do this 'manually'."""
-        if self.active_settings == "screen":
-            settings = self.screen_config_settings
-        else:
-            settings = self.image_config_settings
-        new_488_power = settings['488_AOTF'][r"Power (% of max)"]
-        print(f"RESETING 488 POWER to {new_488_power}")
-        print(settings)
-        self.aotf.power_488 = float(settings['488_AOTF'][ r"Power (% of max)"])
-        self.aotf.power_561 = float(settings['561_AOTF'][ r"Power (% of max)"])
+        config = self.presets[name or self.active_preset].config
+        self.aotf.power_488 = float(config["488_AOTF"].get(POWER, self.aotf.power_488))
+        self.aotf.power_561 = float(config["561_AOTF"].get(POWER, self.aotf.power_561))
+        log.info(f"AOTF powers set to {self.aotf.power_488}/{self.aotf.power_561}")
+
+    @contextlib.contextmanager
+    def _preset_applied(self, name: str):
+        """Actuator and devices set up for a preset, restored to how they were afterwards."""
+        saved = [(obj, {attribute: getattr(obj, attribute) for attribute in attributes})
+                 for obj, attributes in [(self, PRESET_ATTRIBUTES),
+                                         (self.ni_settings, ("camera_readout_time", "cycle_time")),
+                                         (self.aotf, ("power_488", "power_561"))]]
+        try:
+            self._update_settings(self.presets[name].settings)
+            self.update_settings_in_devices(name)
+            yield
+        finally:
+            for obj, attributes in saved:
+                for attribute, value in attributes.items():
+                    setattr(obj, attribute, value)
+
+    def render(self, name: str) -> Segment:
+        """DAQ data of a preset, only rendered if its settings changed since the last time."""
+        preset = self.presets[name]
+        if preset.segment is None:
+            with self._preset_applied(name):
+                # The timepoint is the reused buffer of the actuator
+                timepoint = self._generate_one_timepoint().copy()
+                preset.segment = Segment(timepoint, hold_samples(
+                    self.smpl_rate, preset.settings.interval_ms, timepoint))
+                if self.smpl_rate != self.task.timing.samp_clk_rate:
+                    log.warning(f"Preset {name} needs a sample rate of {self.smpl_rate}, the DAQ "
+                                f"runs at {self.task.timing.samp_clk_rate}")
+            log.info(f"DAQ data for preset {name} rendered")
+        return preset.segment
 
     def _connect_events(self):
         self.event_bus.configuration_settings_event.connect(self.configuration_settings)
@@ -103,9 +169,9 @@ class DAQPresetsActuator(DAQActuator):
         """Run the acquisition by forwarding the pyqtSignal to the Acquisition instance."""
         if not self.acq.running:
             self.event_bus.mda_settings_event.disconnect(self.new_settings)
-            print("====================================== ACQ started Evt")
             self.acq.make_daq_data()
-            self.stream.write_many_sample(self.acq.daq_data_screen)
+            # Set the task up for the active preset and fill the buffer
+            self.acq.update_settings(self.settings)
             time.sleep(2)
             self.acq.running = True
             self.task.start()
@@ -121,163 +187,108 @@ class DAQPresetsActuator(DAQActuator):
 
     @QtCore.Slot(float)
     def call_action(self, new_interval):
-        """Interpreter has emitted a new interval to use, adapt the acquisition instance."""
-        print(f"=== CALLING ACTION === mode {new_interval}")
-        if new_interval == 0:
-            self.acq.mode = 'screen'
-            self.daq_data_shape = self.acq.daq_data_screen.shape
-        elif new_interval == 1:
-            self.acq.mode = "image"
-            self.daq_data_shape = self.acq.daq_data_image.shape
-
-            # if self.acq.running:
-            #     t0 = time.perf_counter()
-            #     self.task.stop()
-            #     self.task.close()
-            #     print(f"TIME TO CLOSE TASK {time.perf_counter() - t0}")
-            #     self.acq.update_settings(None, False)
-            #     self.acq.get_new_data()
-            #     self.task.start()
-            #     print(f"TIME TO SWITCH TASKS {time.perf_counter() - t0}")
-            self.acq.get_new_data()
+        """Interpreter has emitted the index (or name) of the preset to use."""
+        names = list(self.presets)
+        if isinstance(new_interval, str):
+            name = new_interval if new_interval in self.presets else None
+        elif float(new_interval).is_integer() and 0 <= new_interval < len(names):
+            name = names[int(new_interval)]
         else:
+            name = None
+        if name is None:
             log.warning(f"interval {new_interval} does not match Actuator!")
-        log.info(f"=== New interval: {new_interval} ===")
+            return
+        # The acquisition switches with the next chunk written to the DAQ card
+        self.acq.mode = name
+        log.info(f"=== New preset: {name} ===")
 
 
 class DAQPresetsAcquisition(EDAAcquisition):
-    """An acquisition that switches between two DAQ datasets generated for two different MMSettings
+    """An acquisition that switches between the DAQ data of the presets of the actuator.
 
-    Make two daq datastreams for the two settings in the actuator and switch between the two upon
-    demanded by the interpreter.
+    The presets are rendered before the acquisition and switched upon demand by the interpreter.
     """
     def __init__(self, ni:DAQPresetsActuator, settings:MMSettings):
+        # Not through the setter, the QObject is not set up yet
+        self._mode = next(iter(ni.presets))
+        self.segments = {}
         super().__init__(ni, settings, None)
-        self.daq_data_screen = None
-        self.daq_data_image = None
-        self.make_daq_data()
-        self.mode = "screen"
-        self.screen_delays = 0
         self.running = False
 
-    # @QtCore.Slot(str)
-    # def call_action(self, mode):
-    #     """Interpreter has emitted a new interval to use, adapt the acquisition instance."""
-    #     self.mode = mode
-    #     print("CALL ACTION WITH MODE", mode)
-    #     if self.mode == "screen":
-    #         self.ni.task.register_every_n_samples_transferred_from_buffer_event(
-    #         self.daq_data_screen.shape[1], self.get_new_data
-    #         )
-    #     else:
-    #         self.ni.task.register_every_n_samples_transferred_from_buffer_event(
-    #         self.daq_data_image.shape[1], self.get_new_data
-    #         )
-    #     log.info(f"=== Mode switched to {mode} ===")
-
-    def get_new_data(self, *_):
-        """Pass new data to the DAQ card.
-
-        This function was called because the DAQ card is running out of samples to write to the
-        outputs. The additional parameters have information about the event that we don't use here.
-        """
-        log.info(f"Sending new data for mode {self.mode}")
-        if self.mode == "screen":
-            if 0 < self.screen_delays <= self.n_delays_screen:
-                print("SENDING WAIT DATA")
-                self.ni.stream.write_many_sample(self.delay_data_screen)
-                self.screen_delays += 1
-            else:
-                print("SENDING SCREEN DATA")
-                self.ni.stream.write_many_sample(self.daq_data_screen)
-                self.screen_delays = 1
-        elif self.mode == "image":
-            print("SENDING IMAGING DATA")
-            self.ni.stream.write_many_sample(self.daq_data_image)
-            self.screen_delays = 0
-        else:
-            log.warning("Intervals have changes please restart the acquisition")
-        return 0
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    @mode.setter
+    def mode(self, mode: str):
+        self._request()
+        self._mode = mode
+
+    def state(self):
+        """The preset asked for by the interpreter."""
+        return self.mode
+
+    def segment_for(self, state) -> Segment:
+        if state not in self.segments:
+            log.warning(f"No DAQ data for preset {state}, staying with {self.playing}")
+            state = self.playing
+        return self.segments[state]
+
+    def retime(self, state) -> bool:
+        """The next preset starts as soon as the playing timepoint is done."""
+        self.stream.retime(0)
+        return False
 
     def make_daq_data(self):
-        """Prepare the two versions of daq_data to be passed later to the DAQ stream."""
-        self.ni._disconnect_events()
-        originally_active = self.ni.active_settings
-
-        self.ni.active_settings = "image"
-        self.ni.new_settings(self.ni.image_settings)
-        self.ni.update_settings_in_devices()
-        timepoint = self.ni._generate_one_timepoint()
-        print(f"IMAGE SETTINGS INTERVAL {self.ni.image_settings.interval_ms}")
-        self.daq_data_image = self.add_interval(timepoint, self.ni.image_settings.interval_ms)
-
-        self.ni.active_settings = "screen"
-        self.ni.new_settings(self.ni.screen_settings)
-        self.ni.update_settings_in_devices()
-        timepoint = self.ni._generate_one_timepoint()
-        full_length_screen = self.add_interval(timepoint, self.ni.screen_settings.interval_ms)
-        full_length_screen = full_length_screen.shape[1]
-        # Extend to the length of the imaging frame
-        extension = np.tile(timepoint[:, -1][..., None],
-                            self.daq_data_image.shape[1] - timepoint.shape[1])
-        self.daq_data_screen = np.hstack([timepoint, extension])
-        self.delay_data_screen = np.tile(self.daq_data_screen[:, -1][..., None],
-                                         self.daq_data_screen.shape[1])
-        self.n_delays_screen = int(round(full_length_screen/self.daq_data_image.shape[1] - 1))
-
-        self.active_settings = originally_active
-        self.daq_data_shape = self.daq_data_image.shape
-        self.ni._disconnect_events(False)
+        """Render the presets that changed, the others are taken from the cache."""
+        # Replaced as a whole, the DAQ callback might be reading it
+        self.segments = {name: self.ni.render(name) for name in self.ni.presets}
+        self._make_stream(next(iter(self.segments.values())).n_channels)
 
 
 class DAQPresetsActuatorGUI(QWidgetRestore):
-    """GUI with buttons to do the settings in MM"""
+    """GUI with a button per preset to do its settings in MM"""
 
     def __init__(self, actuator: DAQPresetsActuator):
         """Gui widget that will be added to the bigger EDA window."""
         super().__init__()
         self.actuator = actuator
-
-        self.screen_button = QtWidgets.QPushButton("Screen")
-        self.screen_button.clicked.connect(self._activate_screen)
-        self.screen_button.setEnabled(False)
-        self.image_button = QtWidgets.QPushButton("Image")
-        self.image_button.clicked.connect(self._activate_image)
-        self.image_button.setEnabled(True)
-
-        grid = QtWidgets.QFormLayout(self)
-        grid.addRow(self.screen_button)
-        grid.addRow(self.image_button)
-
-    def _activate_screen(self):
-        self.image_button.setEnabled(True)
-        self.screen_button.setEnabled(False)
-        self.actuator.active_settings = "screen"
-        studio.acquisitions().set_acquisition_settings(self.actuator.screen_settings.java_settings)
-        self._set_settings(self.actuator.screen_config_settings)
-
-    def _activate_image(self):
-        self.screen_button.setEnabled(True)
-        self.image_button.setEnabled(False)
-        self.actuator.active_settings = "image"
-        studio.acquisitions().set_acquisition_settings(self.actuator.image_settings.java_settings)
-        self._set_settings(self.actuator.image_config_settings)
+        self.buttons = {}
+        self.grid = QtWidgets.QFormLayout(self)
+        for name in actuator.presets:
+            self.add_preset_button(name)
+        self.buttons[next(iter(self.buttons))].setEnabled(False)
+
+    def add_preset_button(self, name: str):
+        if name in self.buttons:
+            return
+        button = QtWidgets.QPushButton(name.capitalize())
+        button.clicked.connect(lambda: self._activate(name))
+        self.buttons[name] = button
+        self.grid.addRow(button)
+
+    def _activate(self, name: str):
+        for preset, button in self.buttons.items():
+            button.setEnabled(preset != name)
+        self.actuator.active_preset = name
+        preset = self.actuator.presets[name]
+        self.actuator.studio.acquisitions().set_acquisition_settings(preset.settings.java_settings)
+        self._set_settings(preset.config)
 
     def _set_settings(self, settings: dict):
         self.actuator._disconnect_events()
-        print(settings)
         for device, device_dict in settings.items():
             self._set_device_settings(device, device_dict)
-        studio.app().refresh_gui()
+        self.actuator.studio.app().refresh_gui()
         self.actuator.update_settings_in_devices()
         self.actuator._disconnect_events(False)
 
     def _set_device_settings(self, device, device_dict: dict):
         if device == "exposure":
-            core.set_exposure(float(device_dict['time_ms']))
+            self.actuator.mm_core.set_exposure(float(device_dict['time_ms']))
             return
         for setting, value in device_dict.items():
-            core.set_property(device, setting, value)
+            self.actuator.mm_core.set_property(device, setting, value)
 
 if __name__ == "__main__":
     import sys
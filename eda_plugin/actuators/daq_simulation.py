@@ -0,0 +1,493 @@
+"""Simulated nidaqmx task to run and benchmark the DAQ actuators without a DAQ card.
+
+SimulatedTask has the parts of nidaqmx.Task that the DAQActuator and EDAAcquisition use. A clock
+thread takes the samples out of the buffer at the rate of the sample clock, like the card does, and
+the every n samples callbacks are called from a separate thread, like nidaqmx calls them. If the
+buffer is empty when samples are due, that is an underrun. It is counted, and the task stops and
+raises a DaqError on the next write, as the card does with regeneration switched off. With
+stop_on_underrun=False, the outputs hold their last value instead. Everything that was output is
+recorded and can be checked with output(). Regeneration of old samples is not simulated.
+
+The module can be used in place of nidaqmx, e.g. with DAQActuator(event_bus, simulate=True), and
+has Task, constants, errors and stream_writers like nidaqmx. Without isimgui and Micro-Manager, pass
+the devices, core and settings to the DAQActuator as well.
+
+    task = Task("EDA_nidaq")
+    task.ao_channels.add_ao_voltage_chan("Dev1/ao0")
+    task.timing.cfg_samp_clk_timing(rate=10000, sample_mode=constants.AcquisitionType.CONTINUOUS)
+    writer = stream_writers.AnalogMultiChannelWriter(task.out_stream)
+    writer.write_many_sample(data)
+    task.register_every_n_samples_transferred_from_buffer_event(1000, callback)
+    task.start()
+
+Run as a module to benchmark the streaming and the switching between intervals of an
+EDAAcquisition, e.g.
+
+    python -m eda_plugin.actuators.daq_simulation --rate 96000 --slow 2 --fast 0.2 --switches 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import collections
+import logging
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from types import SimpleNamespace
+
+import numpy as np
+
+log = logging.getLogger("EDA")
+
+# nidaqmx status codes
+UNDERFLOW = -200290
+WRITE_TIMEOUT = -200292
+WRONG_CHANNELS = -200524
+
+
+class AcquisitionType(Enum):
+    FINITE = 10178
+    CONTINUOUS = 10123
+
+
+class RegenerationMode(Enum):
+    ALLOW_REGENERATION = 10097
+    DONT_ALLOW_REGENERATION = 10158
+
+
+class EveryNSamplesEventType(Enum):
+    ACQUIRED_INTO_BUFFER = 1
+    TRANSFERRED_FROM_BUFFER = 2
+
+
+class DaqError(Exception):
+    """Same arguments as nidaqmx.errors.DaqError."""
+
+    def __init__(self, message: str, error_code: int, task_name: str = ""):
+        super().__init__(f"{message}\nTask Name: {task_name}\nStatus Code: {error_code}")
+        self.error_code = error_code
+        self.task_name = task_name
+
+
+class AOChannels:
+    """Task.ao_channels, only the names of the channels are kept."""
+
+    def __init__(self):
+        self.channel_names = []
+
+    def add_ao_voltage_chan(self, physical_channel: str, *_, **__):
+        self.channel_names.append(physical_channel)
+
+    def __len__(self) -> int:
+        return len(self.channel_names)
+
+
+class Timing:
+    """Task.timing, the sample clock settings."""
+
+    def __init__(self):
+        self.samp_clk_rate = 1000.
+        self.samp_quant_samp_mode = AcquisitionType.FINITE
+        self.samp_quant_samp_per_chan = 1000
+
+    def cfg_samp_clk_timing(self, rate: float, source: str = "", active_edge=None,
+                            sample_mode=AcquisitionType.FINITE, samps_per_chan: int = 1000):
+        self.samp_clk_rate = float(rate)
+        self.samp_quant_samp_mode = sample_mode
+        self.samp_quant_samp_per_chan = samps_per_chan
+
+
+class OutStream:
+    """Task.out_stream, handed to the writer."""
+
+    def __init__(self, task: SimulatedTask):
+        self.task = task
+        self.regen_mode = RegenerationMode.ALLOW_REGENERATION
+
+    @property
+    def total_samp_per_chan_generated(self) -> int:
+        return self.task.position
+
+
+class SimulatedTask:
+    """Analog output task that plays its buffer at the sample clock rate, see the module doc."""
+
+    def __init__(self, new_task_name: str = "", stop_on_underrun: bool = True,
+                 record: bool = True, tick: float = 0.001):
+        """The clock thread takes the samples that are due every tick seconds."""
+        self.name = new_task_name
+        self.ao_channels = AOChannels()
+        self.timing = Timing()
+        self.out_stream = OutStream(self)
+        self.stop_on_underrun = stop_on_underrun
+        self.record = record
+        self.tick = tick
+
+        self.underruns = 0
+        self.underrun_samples = 0
+        self.callback_times = []
+        self.error = None
+        self.start_time = None
+
+        self._every_n = None
+        self._chunks = collections.deque()
+        self._available = 0
+        self._capacity = 0
+        self._position = 0
+        self._starved = False
+        self._last = None
+        self._recorded = []
+        self._running = False
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._events = queue.Queue()
+        self._threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def n_channels(self) -> int:
+        return len(self.ao_channels)
+
+    @property
+    def position(self) -> int:
+        """Samples output since the start."""
+        with self._condition:
+            return self._position
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def sample_time(self, sample: int) -> float:
+        """perf_counter time at which a sample is output."""
+        return self.start_time + sample / self.timing.samp_clk_rate
+
+    def output(self) -> np.ndarray:
+        """All samples output so far (channels x samples)."""
+        with self._condition:
+            if not self._recorded:
+                return np.zeros((self.n_channels, 0))
+            self._recorded = [np.hstack(self._recorded)]
+            return self._recorded[0].copy()
+
+    def register_every_n_samples_transferred_from_buffer_event(self, sample_interval: int,
+                                                               callback_method):
+        """callback_method(task, event_type, n_samples, callback_data) from the callback thread."""
+        if self._running:
+            raise DaqError("Events can not be registered while the task is running.", -200986,
+                           self.name)
+        self._every_n = None if callback_method is None else (sample_interval, callback_method)
+
+    def start(self):
+        """Start the clock, the buffer is as large as the settings or the data written before."""
+        # The threads of a run that stopped with an underrun might still be finishing
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        with self._condition:
+            if self._running:
+                return
+            # Stop events left over from the last run would end the new callback thread
+            self._events = queue.Queue()
+            if self.out_stream.regen_mode != RegenerationMode.DONT_ALLOW_REGENERATION:
+                log.warning("Regeneration is not simulated, the task will underrun instead")
+            self._capacity = max(self.timing.samp_quant_samp_per_chan, self._available)
+            self._position = 0
+            self._starved = False
+            self.error = None
+            self._running = True
+            self._stopped.clear()
+            self.start_time = time.perf_counter()
+        self._threads = [threading.Thread(target=self._run_clock, name="DAQ clock", daemon=True),
+                         threading.Thread(target=self._run_callbacks, name="DAQ callbacks",
+                                          daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the output, the samples left in the buffer are discarded."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._stopped.set()
+        self._events.put(None)
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+        with self._condition:
+            self._chunks.clear()
+            self._available = 0
+            # Like on the card, the error of the last run does not stay after stopping
+            self.error = None
+
+    def close(self):
+        self.stop()
+
+    def is_task_done(self) -> bool:
+        return not self._running
+
+    def write(self, data: np.ndarray, timeout: float = 10.) -> int:
+        """Add samples to the buffer, wait for space if the task is running and the buffer full."""
+        data = np.array(data, dtype=float, ndmin=2)
+        if self.n_channels and data.shape[0] != self.n_channels:
+            raise DaqError(f"Data for {data.shape[0]} channels, the task has {self.n_channels}.",
+                           WRONG_CHANNELS, self.name)
+        n_samples = data.shape[1]
+        with self._condition:
+            if self.error is not None:
+                raise self.error
+            if self._running:
+                has_space = self._condition.wait_for(
+                    lambda: (self.error is not None or not self._running
+                             or self._available + n_samples <= self._capacity), timeout)
+                if self.error is not None:
+                    raise self.error
+                if not has_space:
+                    raise DaqError("Some or all of the samples to write could not be written to "
+                                   "the buffer yet.", WRITE_TIMEOUT, self.name)
+            self._chunks.append(data)
+            self._available += n_samples
+        return n_samples
+
+    def _run_clock(self):
+        """Take the samples that are due out of the buffer, every tick."""
+        rate = self.timing.samp_clk_rate
+        while not self._stopped.wait(self.tick):
+            with self._condition:
+                if not self._running:
+                    return
+                due = int((time.perf_counter() - self.start_time) * rate) - self._position
+                if due > 0:
+                    self._output(due)
+
+    def _output(self, due: int):
+        """Output due samples, called with the lock held."""
+        before = self._position
+        taken = self._take(min(due, self._available))
+        self._position += taken
+        if taken < due:
+            if not self._starved:
+                self.underruns += 1
+                log.warning(f"DAQ buffer underrun at sample {self._position}")
+            self._starved = True
+            if self.stop_on_underrun:
+                self.error = DaqError("The generation has stopped to prevent the regeneration of "
+                                      "old samples.", UNDERFLOW, self.name)
+                self._running = False
+                self._stopped.set()
+                self._events.put(None)
+            else:
+                missing = due - taken
+                self.underrun_samples += missing
+                if self.record and self._last is not None:
+                    self._recorded.append(np.repeat(self._last, missing, axis=1))
+                self._position += missing
+        else:
+            self._starved = False
+        self._condition.notify_all()
+        if self._every_n is not None and self._running:
+            n_samples = self._every_n[0]
+            # Only samples from the buffer count as transferred
+            for _ in range(before // n_samples, (before + taken) // n_samples):
+                self._events.put(n_samples)
+
+    def _take(self, n_samples: int) -> int:
+        """Remove samples from the buffer and record them."""
+        left = n_samples
+        while left:
+            chunk = self._chunks[0]
+            if chunk.shape[1] <= left:
+                self._chunks.popleft()
+                part = chunk
+            else:
+                part, self._chunks[0] = chunk[:, :left], chunk[:, left:]
+            left -= part.shape[1]
+            if self.record:
+                self._recorded.append(part)
+            self._last = part[:, -1:]
+        self._available -= n_samples
+        return n_samples
+
+    def _run_callbacks(self):
+        """Call the every n samples callback for each event, in order."""
+        while True:
+            n_samples = self._events.get()
+            if n_samples is None:
+                return
+            self.callback_times.append(time.perf_counter())
+            try:
+                self._every_n[1](self, EveryNSamplesEventType.TRANSFERRED_FROM_BUFFER.value,
+                                 n_samples, None)
+            except Exception:
+                log.exception("DAQ callback failed")
+
+
+class AnalogMultiChannelWriter:
+    """nidaqmx.stream_writers.AnalogMultiChannelWriter for a SimulatedTask."""
+
+    def __init__(self, task_out_stream: OutStream, auto_start: bool = False):
+        self._task = task_out_stream.task
+        self.auto_start = auto_start
+
+    def write_many_sample(self, data: np.ndarray, timeout: float = 10.) -> int:
+        n_samples = self._task.write(data, timeout)
+        if self.auto_start and not self._task.running:
+            self._task.start()
+        return n_samples
+
+
+# The module stands in for nidaqmx
+Task = SimulatedTask
+constants = SimpleNamespace(AcquisitionType=AcquisitionType, RegenerationMode=RegenerationMode,
+                            EveryNSamplesEventType=EveryNSamplesEventType)
+errors = SimpleNamespace(DaqError=DaqError)
+stream_writers = SimpleNamespace(AnalogMultiChannelWriter=AnalogMultiChannelWriter)
+
+
+class SimulatedDAQ:
+    """The parts of the DAQActuator that an EDAAcquisition uses, with a synthetic timepoint.
+
+    The timepoint is a ramp from 1 to 2 on every channel, so its first sample marks the start of a
+    timepoint in the output.
+    """
+
+    nidaqmx = sys.modules[__name__]
+
+    def __init__(self, smpl_rate: float = 96000, n_channels: int = 7, timepoint_ms: float = 100,
+                 stop_on_underrun: bool = False):
+        self.smpl_rate = smpl_rate
+        self.n_channels = n_channels
+        self.timepoint_ms = timepoint_ms
+        self.stop_on_underrun = stop_on_underrun
+        self.task = None
+        self.stream = None
+
+    def _init_task(self):
+        if self.task is not None:
+            self.task.close()
+        self.task = SimulatedTask("EDA_nidaq", stop_on_underrun=self.stop_on_underrun)
+        for channel in range(self.n_channels):
+            self.task.ao_channels.add_ao_voltage_chan(f"Dev1/ao{channel}")
+
+    def _generate_one_timepoint(self) -> np.ndarray:
+        n_samples = round(self.smpl_rate * self.timepoint_ms / 1000)
+        return np.tile(np.linspace(1, 2, n_samples), (self.n_channels, 1))
+
+
+def timepoint_starts(output: np.ndarray) -> np.ndarray:
+    """Samples at which a timepoint of the SimulatedDAQ starts."""
+    return np.flatnonzero(output[0] == 1)
+
+
+@dataclass
+class SwitchingResult:
+    """Numbers measured in one run of benchmark_switching."""
+
+    duration_s: float = 0.
+    samples: int = 0
+    chunk_samples: int = 0
+    buffer_kb: float = 0.
+    callbacks: int = 0
+    callback_jitter_ms: dict = field(default_factory=dict)
+    underruns: int = 0
+    switch_latency_ms: list = field(default_factory=list)
+    first_fast_ms: list = field(default_factory=list)
+    fast_intervals_ms: list = field(default_factory=list)
+
+    def report(self) -> str:
+        """Human readable summary."""
+        jitter = ", ".join(f"{key} {value:.2f}" for key, value in self.callback_jitter_ms.items())
+        return "\n".join([
+            f"samples output:        {self.samples} in {self.duration_s:.1f} s",
+            f"chunk:                 {self.chunk_samples} samples, buffer {self.buffer_kb:.0f} kB",
+            f"callbacks:             {self.callbacks}, jitter [ms]: {jitter}",
+            f"underruns:             {self.underruns}",
+            f"switch latency [ms]:   {_summary(self.switch_latency_ms)}",
+            f"first fast start [ms]: {_summary(self.first_fast_ms)}",
+            f"fast intervals [ms]:   {_summary(self.fast_intervals_ms)}",
+        ])
+
+
+def _summary(values: list) -> str:
+    if not values:
+        return "-"
+    return f"mean {np.mean(values):.1f}, max {np.max(values):.1f} (n={len(values)})"
+
+
+def benchmark_switching(rate: float = 96000, slow: float = 2., fast: float = 0.2,
+                        n_switches: int = 5, chunk_ms: float = None, seed: int = 0
+                        ) -> SwitchingResult:
+    """Run an EDAAcquisition on a SimulatedDAQ and switch between the slow and fast interval.
+
+    The switches to fast happen at random times in the slow timepoints. Measured are the latency
+    the acquisition reports, the time until the first timepoint at the fast interval starts in the
+    output and the intervals between the fast timepoints.
+    """
+    from eda_plugin.actuators.daq import EDAAcquisition
+
+    rng = np.random.default_rng(seed)
+    ni = SimulatedDAQ(rate)
+    params = SimpleNamespace(slow_interval=slow, fast_interval=fast)
+    acq = EDAAcquisition(ni, None, params)
+    if chunk_ms is not None:
+        acq.chunk_ms = chunk_ms
+        acq.make_daq_data()
+        acq.update_settings(None)
+    task = ni.task
+
+    switches = []
+    task.start()
+    for _ in range(n_switches):
+        acq.interval = slow
+        time.sleep(slow * rng.uniform(1, 2))
+        switches.append(task.position)
+        acq.interval = fast
+        time.sleep(fast * 3.5)
+    task.stop()
+
+    output = task.output()
+    starts = timepoint_starts(output)
+    result = SwitchingResult(
+        duration_s=output.shape[1] / rate, samples=output.shape[1],
+        chunk_samples=acq.stream.chunk_size, buffer_kb=acq.stream.buffer.nbytes / 1e3,
+        callbacks=len(task.callback_times), underruns=task.underruns,
+        switch_latency_ms=acq.switch_latencies)
+    periods = np.diff(task.callback_times) * 1000 - acq.stream.chunk_size / rate * 1000
+    if len(periods):
+        result.callback_jitter_ms = {"std": float(np.std(periods)),
+                                     "max": float(np.abs(periods).max())}
+    for switch in switches:
+        fast_starts = starts[starts >= switch][:3]
+        if len(fast_starts):
+            result.first_fast_ms.append((fast_starts[0] - switch) / rate * 1000)
+            result.fast_intervals_ms.extend(np.diff(fast_starts) / rate * 1000)
+    return result
+
+
+def main(argv=None):
+    """Run the switching benchmark with the settings from the command line and print the results."""
+    parser = argparse.ArgumentParser(description="Simulated DAQ streaming benchmark")
+    parser.add_argument("--rate", type=float, default=96000, help="Sample clock in Hz")
+    parser.add_argument("--slow", type=float, default=2., help="Slow interval in s")
+    parser.add_argument("--fast", type=float, default=0.2, help="Fast interval in s")
+    parser.add_argument("--switches", type=int, default=5)
+    parser.add_argument("--chunk", type=float, default=None, help="Chunk length in ms")
+    args = parser.parse_args(argv)
+
+    result = benchmark_switching(args.rate, args.slow, args.fast, args.switches, args.chunk)
+    print(result.report())
+    return result
+
+
+if __name__ == "__main__":
+    main()
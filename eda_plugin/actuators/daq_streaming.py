@@ -0,0 +1,111 @@
+"""Stream DAQ data as segments, written in chunks of fixed size.
+
+A timepoint for the DAQ card is the active pattern of the devices followed by a long stretch where
+the outputs hold their last value until the next timepoint starts. Instead of writing out the held
+samples, a Segment only keeps the active pattern and the number of samples to hold. The
+SegmentStream plays segments one after the other into a small buffer that is reused for every
+chunk, so the memory needed does not depend on the interval and the DAQ card asks for new data at
+a regular rate. The next segment is only chosen when the current one has played out, and the hold
+of the playing segment can be changed with retime, so a new interval or mode takes effect within a
+chunk if the outputs are holding:
+
+    stream = SegmentStream(n_channels=7, chunk_size=1920)
+    segment = Segment(timepoint, hold=hold_samples(rate, interval_ms, timepoint))
+    daq_writer.write_many_sample(stream.next_chunk(lambda: segment))
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+
+
+class Segment:
+    """Active samples (channels x samples) followed by hold samples of a constant value."""
+
+    def __init__(self, active: np.ndarray, hold: int = 0, value: np.ndarray = None):
+        """value is held after the active samples, by default the last active sample."""
+        self.active = active
+        self.hold = max(int(hold), 0)
+        self.value = active[:, -1] if value is None else np.asarray(value)
+        self.n_channels = active.shape[0]
+
+    def __len__(self) -> int:
+        return self.active.shape[1] + self.hold
+
+    @property
+    def shape(self) -> tuple:
+        return (self.n_channels, len(self))
+
+    def fill(self, out: np.ndarray, position: int) -> int:
+        """Copy the samples from position on into out, return how many there were space for."""
+        n_samples = min(out.shape[1], len(self) - position)
+        n_active = min(max(self.active.shape[1] - position, 0), n_samples)
+        if n_active:
+            out[:, :n_active] = self.active[:, position:position + n_active]
+        if n_samples > n_active:
+            out[:, n_active:n_samples] = self.value[:, None]
+        return n_samples
+
+    def samples(self) -> np.ndarray:
+        """All samples of the segment, only for inspection, the stream does not need them."""
+        out = np.empty(self.shape)
+        self.fill(out, 0)
+        return out
+
+
+def hold_samples(sampling_rate: float, interval_ms: float, active: np.ndarray) -> int:
+    """Samples to hold after the active pattern for a timepoint to last interval_ms."""
+    return max(round(sampling_rate * interval_ms / 1000 - active.shape[1]), 0)
+
+
+class SegmentStream:
+    """Plays segments into a reused buffer, one chunk of chunk_size samples at a time."""
+
+    def __init__(self, n_channels: int, chunk_size: int):
+        self.buffer = np.empty((n_channels, chunk_size))
+        self.chunk_size = chunk_size
+        self.segment = None
+        self.position = 0
+        self.start = 0
+        self.chunks = 0
+
+    @property
+    def samples(self) -> int:
+        """Samples in all chunks so far."""
+        return self.chunks * self.chunk_size
+
+    def reset(self):
+        """Start with a new segment at the next chunk."""
+        self.segment = None
+        self.position = 0
+
+    def retime(self, hold: int):
+        """Change the hold of the playing segment.
+
+        If the segment has played longer than the new length already, the next segment starts
+        with the next chunk. The active samples are always played to the end.
+        """
+        if self.segment is not None and hold != self.segment.hold:
+            self.segment = Segment(self.segment.active, hold, self.segment.value)
+
+    def next_chunk(self, next_segment: Callable[[], Segment]) -> np.ndarray:
+        """Fill the buffer, next_segment is called whenever the current segment has played out.
+
+        The buffer is overwritten by the next call, it has to be written to the DAQ before.
+        """
+        filled = 0
+        while filled < self.chunk_size:
+            if self.segment is None or self.position >= len(self.segment):
+                # Sample at which the next segment starts, for next_segment to see
+                self.start = self.samples + filled
+                self.segment = next_segment()
+                self.position = 0
+                if len(self.segment) == 0:
+                    raise ValueError("Segment without samples")
+            n_samples = self.segment.fill(self.buffer[:, filled:], self.position)
+            self.position += n_samples
+            filled += n_samples
+        self.chunks += 1
+        return self.buffer
@@ -23,9 +23,8 @@ import time
 import numpy as np
 from qtpy.QtCore import QObject, QThread, QTimer, Signal, Slot
 from qtpy import QtWidgets
-import qdarkstyle
 from eda_plugin.utility.event_bus import EventBus
-from eda_plugin.utility.qt_classes import QWidgetRestore
+from eda_plugin.utility.qt_classes import QWidgetRestore, dark_stylesheet
 from eda_plugin.utility import settings
 
 
@@ -617,7 +616,7 @@ class MMActuatorGUI(QWidgetRestore):
             grid.addRow("Calibration [ms]", self.calib_edit)
             grid.addRow("Auto-adjust", self.calib_check)
 
-        self.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
+        self.setStyleSheet(dark_stylesheet())
         self.setWindowTitle("EDA Actuator Plugin")
 
         self.actuator.event_bus.acquisition_ended_event.connect(self._stop_acq)
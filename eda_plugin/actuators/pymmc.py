@@ -11,15 +11,16 @@ class CoreActuator(QtCore.QObject):
     start_acq_signal = QtCore.Signal(object)
     new_interval = QtCore.Signal(float)
 
-    def __init__(self, event_bus: CoreEventBus):
+    def __init__(self, event_bus: CoreEventBus, gui: bool = True):
         super().__init__()
 
         self.event_bus = event_bus
 
         self.start_acq_signal.connect(self.event_bus.acquisition_started_event)
 
-        self.acquisition = CoreAcquisition(event_bus, CMMCorePlus.instance())
-        self.gui = CoreActuatorGUI(self)
+        # The core of the event bus, this can also be a SyntheticCore
+        self.acquisition = CoreAcquisition(event_bus, event_bus.mmcore)
+        self.gui = CoreActuatorGUI(self) if gui else None
 
 
 class CoreAcquisition(QtCore.QThread):
@@ -50,7 +51,8 @@ class CoreAcquisition(QtCore.QThread):
         self._queue.put(event)
         event = MDAEvent(exposure=10, index={"t": 0, "z": 0, "c": 1})
         self._queue.put(event)
-        self.timer.start()
+        # The timer belongs to the thread that created the acquisition, run might be in another
+        QtCore.QMetaObject.invokeMethod(self.timer, "start", QtCore.Qt.QueuedConnection)
 
     def acquire_on_timeout(self):
         self.timepoint += 1
@@ -62,6 +64,7 @@ class CoreAcquisition(QtCore.QThread):
         self.timer.setInterval(int(new_interval * 1000))
 
     def stop_acq(self):
+        self.timer.stop()
         self._queue.put(self.STOP_EVENT)
 
 
@@ -93,7 +96,7 @@ if __name__ == "__main__":
     # eda_plugin.utility.settings.setup_logging()
     app = QtWidgets.QApplication(sys.argv)
 
-    event_bus = CoreEventBus()
+    event_bus = CoreEventBus(CMMCorePlus.instance())
     actuator = CoreActuator(event_bus)
     analyser = ImageAnalyser(event_bus)
     interpreter = BinaryFrameRateInterpreter(event_bus)
@@ -29,9 +29,14 @@ class ImageAnalyser(QObject):
     """
 
     new_decision_parameter = Signal(float, float, int)
+    new_stage_times = Signal(int, object)
 
-    def __init__(self, event_bus: EventBus|CoreEventBus):
-        """Get settings from settings.json, set up the threadpool and connect signals."""
+    def __init__(self, event_bus: EventBus|CoreEventBus, gui: bool = True,
+                 analyser_settings: dict = None):
+        """Get settings from settings.json, set up the threadpool and connect signals.
+
+        Without a gui, the analyser_settings (e.g. {"n_timepoints": 1}) are used instead.
+        """
         super().__init__()
 
         self.shape = None
@@ -42,8 +47,12 @@ class ImageAnalyser(QObject):
         self.current_n_timepoints = 0
         self.timepoint = 0
         self.last_timepoint = 0
-        self.gui = AnalyserGUI()
-        self.n_timepoints = self.gui.settings["n_timepoints"]
+        self.dropped = 0
+        self.gui = AnalyserGUI() if gui else None
+        self.analyser_settings = self.gui.settings if gui else {"n_timepoints": 1}
+        if analyser_settings is not None:
+            self.analyser_settings.update(analyser_settings)
+        self.n_timepoints = self.analyser_settings["n_timepoints"]
         self.channels = None
 
         try:
@@ -64,6 +73,7 @@ class ImageAnalyser(QObject):
 
         # Emitted events
         self.new_decision_parameter.connect(event_bus.new_decision_parameter)
+        self.new_stage_times.connect(event_bus.new_stage_times)
 
         # Connect incoming events
         self.connect_incoming_events(event_bus)
@@ -71,10 +81,16 @@ class ImageAnalyser(QObject):
     def connect_incoming_events(self, event_bus: EventBus) -> None:
         """Connect the events here, so subclasses can choose to not do so."""
         event_bus.acquisition_started_event.connect(self._reset_time)
-        event_bus.new_image_event.connect(self.start_analysis)
+        self.frame_ring = getattr(event_bus, "frame_ring", None)
+        if self.frame_ring is not None:
+            self.frame_ring.register_consumer()
+            event_bus.new_frame_event.connect(self.start_frame_analysis)
+        else:
+            event_bus.new_image_event.connect(self.start_analysis)
         event_bus.mda_settings_event.connect(self.new_mda_settings)
         event_bus.new_mask_event.connect(self.on_new_mask)
-        self.gui.new_settings.connect(self.new_gui_settings)
+        if self.gui is not None:
+            self.gui.new_settings.connect(self.new_gui_settings)
 
 
     @Slot(PyImage)
@@ -82,6 +98,7 @@ class ImageAnalyser(QObject):
         """Image arrived, see if all images were gathered and if so, start analysis."""
         if self.channels is None:
             return
+        received = time.perf_counter()
         ready = self.gather_images(evt)
         if not ready:
             return
@@ -95,13 +112,24 @@ class ImageAnalyser(QObject):
         worker = self.worker(
             local_images, evt.timepoint, self.start_time, self.mask, **worker_args
         )
+        worker.received = received
         # Connect the signals to push through
         self.connect_worker_signals(worker)
         started = self.threadpool.tryStart(worker)
+        if not started:
+            # All threads busy, this timepoint is skipped
+            self.dropped += 1
         log.info(f"timepoint {evt.timepoint} -> {worker.__class__.__name__}: {started}")
 
+    @Slot(int, object)
+    def start_frame_analysis(self, slot: int, evt: PyImage):
+        """Frame in the frame ring, it is copied into the gathered images and released."""
+        with self.frame_ring.image(slot, evt) as py_image:
+            self.start_analysis(py_image)
+
     def connect_worker_signals(self, worker: QRunnable):
         """Connect worker signals in extra method, so that this can be overwritten independently."""
+        worker.signals.new_stage_times.connect(self.new_stage_times)
         worker.signals.new_decision_parameter.connect(self.new_decision_parameter)
 
     def new_gui_settings(self, new_settings: dict):
@@ -152,6 +180,7 @@ class ImageAnalyser(QObject):
         self.start_time = round(time.time() * 1000)
         self.timepoint = 0
         self.last_timepoint = 0
+        self.dropped = 0
 
 
 class ImageAnalyserWorker(QRunnable):
@@ -165,16 +194,28 @@ class ImageAnalyserWorker(QRunnable):
         self.timepoint = timepoint
         self.start_time = start_time
         self.mask = mask
+        # perf_counter time at which the last image of the timepoint arrived in the analyser
+        self.received = None
         self.autoDelete = True
 
     def run(self):
         """Get the first pixel value of the passed images and return."""
+        stage_times = {"started": time.perf_counter()}
         decision_parameter = self.extract_decision_parameter(self.local_images)
+        stage_times["analysed"] = time.perf_counter()
         elapsed_time = round(time.time() * 1000) - self.start_time
+        self.emit_stage_times(stage_times)
         self.signals.new_decision_parameter.emit(
             decision_parameter, elapsed_time / 1000, self.timepoint
         )
 
+    def emit_stage_times(self, stage_times: dict):
+        """Send the perf_counter times of the stages of the analysis, right before the decision."""
+        stage_times["decided"] = time.perf_counter()
+        if self.received is not None:
+            stage_times["image"] = self.received
+        self.signals.new_stage_times.emit(self.timepoint, stage_times)
+
     def extract_decision_parameter(self, network_output: np.ndarray):
         """Return the a value of the ndarray."""
         if self.mask is not None:
@@ -185,11 +226,12 @@ class ImageAnalyserWorker(QRunnable):
         """Signals have to be separate because QRunnable can't have its own."""
 
         new_decision_parameter = Signal(float, float, int)
+        new_stage_times = Signal(int, object)
 
 
 class PycroImageAnalyser(ImageAnalyser):
-    def __init__(self, event_bus):
-        super().__init__(event_bus)
+    def __init__(self, event_bus, gui: bool = True, analyser_settings: dict = None):
+        super().__init__(event_bus, gui, analyser_settings)
 
     def connect_incoming_events(self, event_bus: EventBus) -> None:
         """Do not connect the MDA and acquisition events, we need the info from magellan"""
@@ -18,13 +18,11 @@ from collections import defaultdict
 
 from qtpy import QtWidgets
 from qtpy.QtCore import QObject, QRunnable, Signal
-import qdarkstyle
 
 from pymm_eventserver.data_structures import PyImage
-from tensorflow import keras
 from eda_plugin.analysers.image import ImageAnalyser, ImageAnalyserWorker
 
-from eda_plugin.utility.qt_classes import QWidgetRestore
+from eda_plugin.utility.qt_classes import QWidgetRestore, dark_stylesheet
 from eda_plugin.utility.event_bus import EventBus
 from eda_plugin.utility import settings
 from eda_plugin.analysers.image import ImageAnalyser
@@ -44,17 +42,27 @@ class KerasAnalyser(ImageAnalyser):
     new_output_shape = Signal(tuple)
     settings_changed = Signal(dict)
 
-    def __init__(self, event_bus: EventBus):
-        """Load and connect the GUI. Initialise settings from the GUI."""
-        super().__init__(event_bus=event_bus)
+    def __init__(self, event_bus: EventBus, gui: bool = True, keras_settings: dict = None):
+        """Load and connect the GUI. Initialise settings from the GUI.
+
+        Without a gui, the keras_settings or the settings file are used and the model is loaded
+        directly. The worker can then also be given as an import path.
+        """
+        super().__init__(event_bus=event_bus, gui=gui)
         self.event_bus = event_bus
         self.model_path = None
         self.mda_settings = MMSettings()
 
-        self.gui = KerasSettingsGUI()
-        self.gui.new_settings.connect(self.new_settings)
-        self.settings_changed.connect(self.gui._set_state)
-        self.new_settings(self.gui.keras_settings, init_model=False)
+        if gui:
+            self.gui = KerasSettingsGUI()
+            self.gui.new_settings.connect(self.new_settings)
+            self.settings_changed.connect(self.gui._set_state)
+            self.new_settings(self.gui.keras_settings, init_model=False)
+        else:
+            if keras_settings is None:
+                keras_settings = settings.get_settings(KerasSettingsGUI)
+            keras_settings["worker"] = self._resolve_worker(keras_settings.get("worker"))
+            self.new_settings(keras_settings)
 
     def connect_worker_signals(self, worker: QRunnable):
         """Connect the additional worker signals."""
@@ -84,6 +92,9 @@ class KerasAnalyser(ImageAnalyser):
         if self.model_path == new_settings["model"] or not init_model:
             return
         self.model_path = new_settings["model"]
+        # TensorFlow takes seconds to import, only do so when a model is actually loaded
+        from tensorflow import keras
+
         try:
             # self.model = keras.models.load_model(self.model_path, compile=True)
             self.model = keras.models.load_model(self.model_path)
@@ -94,6 +105,15 @@ class KerasAnalyser(ImageAnalyser):
             log.warning("Model not found at this location")
             log.info(self.model_path)
 
+    def _resolve_worker(self, worker):
+        """Get the worker class from an import path like eda_plugin.examples.analysers.KerasTester."""
+        if isinstance(worker, str) and "." in worker and " " not in worker:
+            module, name = worker.rsplit(".", 1)
+            return getattr(importlib.import_module(module), name)
+        if inspect.isclass(worker):
+            return worker
+        return KerasWorker
+
     def _init_model(self):
         if self.model.layers[0].input_shape[0][1] is None:
             size = 512
@@ -139,7 +159,8 @@ class KerasAnalyser(ImageAnalyser):
                 self.keras_settings["timepoints"] = False
             self.settings_changed.emit(self.keras_settings)
         if self.model_channels <= self.mda_settings.n_channels:
-            self.gui.add_channel_chooser(self.model_channels, self.mda_settings.channels)
+            if self.gui is not None:
+                self.gui.add_channel_chooser(self.model_channels, self.mda_settings.channels)
             self.channels = self.model_channels
             self.slices = model_slices
             self.images = None
@@ -149,6 +170,8 @@ class KerasAnalyser(ImageAnalyser):
                 Model:          {self.model_channels},   {model_slices} <br>\
                 MDA  :          {self.channels},    {self.slices}<br>"
             log.warning(warning_text)
+            if self.gui is None:
+                return
             msg = QtWidgets.QMessageBox()
             msg.setIcon(2)
             msg.setText(warning_text)
@@ -172,12 +195,16 @@ class KerasWorker(ImageAnalyserWorker):
         can be implemented by subclasses as necessary for the specific model.
         Specific implementations can be found in examples.analysers.keras
         """
+        stage_times = {"started": time.perf_counter()}
         network_input = self.prepare_images(self.local_images)
+        stage_times["prepared"] = time.perf_counter()
         network_output = self.model.predict(network_input["pixels"])
         # The simple maximum decision parameter can be calculated without stiching
         decision_parameter = self.extract_decision_parameter(network_output)
+        stage_times["analysed"] = time.perf_counter()
         elapsed_time = round(time.time() * 1000) - self.start_time
         log.info(f"timepoint {self.timepoint} KerasWorker -> Interpreter")
+        self.emit_stage_times(stage_times)
         self.signals.new_decision_parameter.emit(
             decision_parameter, elapsed_time / 1000, self.timepoint
         )
@@ -201,6 +228,7 @@ class KerasWorker(ImageAnalyserWorker):
         new_network_image = Signal(np.ndarray, tuple)
         new_decision_parameter = Signal(float, float, int)
         new_prepared_image = Signal(np.ndarray, int)
+        new_stage_times = Signal(int, object)
 
 class KerasSettingsGUI(QWidgetRestore):
     """Specific GUI for the KerasAnalyser."""
@@ -245,7 +273,7 @@ class KerasSettingsGUI(QWidgetRestore):
         self.layout().addWidget(self.model)
         self.layout().addWidget(self.model_select)
         self.layout().addWidget(self.timepoints_chbx)
-        self.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
+        self.setStyleSheet(dark_stylesheet())
 
         self.channel_choosers_title = QtWidgets.QLabel("Choose Channels to use:")
         self.channel_choosers = {}
@@ -332,14 +360,14 @@ class NetworkImageTester(ImageAnalyser):
     new_network_image = Signal(np.ndarray, tuple)
     new_output_shape = Signal(tuple)
 
-    def __init__(self, event_bus: EventBus):
+    def __init__(self, event_bus: EventBus, gui: bool = True):
         """Load and connect the GUI. Initialise settings from the GUI."""
-        super().__init__(event_bus=event_bus)
+        super().__init__(event_bus=event_bus, gui=gui)
         self.event_bus = event_bus
         self.model_path = None
         self.worker = NetworkImageTesterWorker
 
-        self.gui = QWidgetRestore()
+        self.gui = QWidgetRestore() if gui else None
 
     def connect_worker_signals(self, worker: QRunnable):
         """Connect the additional worker signals."""
@@ -364,6 +392,7 @@ class NetworkImageTesterWorker(ImageAnalyserWorker):
         new_network_image = Signal(np.ndarray, tuple)
         new_decision_parameter = Signal(float, float, int)
         new_prepared_image = Signal(np.ndarray, int)
+        new_stage_times = Signal(int, object)
 
 def main():
     """Nothing here yet."""
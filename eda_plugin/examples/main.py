@@ -1,21 +1,21 @@
 """Main functions that assemble a full EDA pipeline."""
 
 import sys
-from eda_plugin.interpreters.presets import PresetsInterpreter
 
 import eda_plugin.utility.settings
-from eda_plugin.actuators.micro_manager import TimerMMAcquisition
-from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
-from eda_plugin.utility.eda_gui import EDAMainGUI
-from eda_plugin.utility.event_bus import EventBus
-from eda_plugin.utility.writers import Writer
 from qtpy import QtWidgets
 
+# The components are imported in the flavours, so that only the dependencies of the flavour that is
+# started are loaded (e.g. no tensorflow, zarr or pymmcore-widgets for basic).
+
 
 def basic():
     """EDA loop that can be used to test without a microscope and without CUDA installation."""
     from eda_plugin.actuators.micro_manager import MMActuator, TimerMMAcquisition
     from eda_plugin.analysers.image import ImageAnalyser
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
     eda_plugin.utility.settings.setup_logging()
 
@@ -52,6 +52,9 @@ def pyro():
     from eda_plugin.actuators.micro_manager import MMActuator
     from eda_plugin.actuators.pycro import PycroAcquisition
     from eda_plugin.analysers.image import PycroImageAnalyser
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
     eda_plugin.utility.settings.setup_logging()
 
@@ -72,6 +75,9 @@ def pyro():
 
 def writer():
     """Just run the ome_ngff writer"""
+    from eda_plugin.utility.event_bus import EventBus
+    from eda_plugin.utility.writers import Writer
+
     app = QtWidgets.QApplication(sys.argv)
     event_bus = EventBus()
     writer = Writer(event_bus)
@@ -83,6 +89,9 @@ def keras():
     from eda_plugin.actuators.micro_manager import MMActuator
     from eda_plugin.analysers.keras import KerasAnalyser
     from eda_plugin.utility.writers import Writer
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
 
     eda_plugin.utility.settings.setup_logging()
@@ -112,6 +121,9 @@ def pyro_keras():
     from eda_plugin.analysers.keras import KerasAnalyser
 
     from .actuators import InjectedPycroAcquisition
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
     eda_plugin.utility.settings.setup_logging()
 
@@ -136,6 +148,9 @@ def main_isim():
     from eda_plugin.utility.writers import Writer
     from eda_plugin.actuators.daq import DAQActuator
     from eda_plugin.analysers.keras import KerasAnalyser
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
     eda_plugin.utility.settings.setup_logging()
     app = QtWidgets.QApplication(sys.argv)
@@ -163,6 +178,9 @@ def presets():
     from eda_plugin.actuators.daq_presets import DAQPresetsActuator
     from eda_plugin.analysers.keras import KerasAnalyser
     from eda_plugin.analysers.image import ImageAnalyser
+    from eda_plugin.interpreters.presets import PresetsInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.event_bus import EventBus
 
     eda_plugin.utility.settings.setup_logging()
 
@@ -201,6 +219,9 @@ def core():
     from eda_plugin.utility.core_event_bus import CoreEventBus
     from eda_plugin.actuators.pymmc import CoreActuator
     from eda_plugin.utility.core_gui import CoreMDAWidget
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from pymmcore_plus import CMMCorePlus
 
     eda_plugin.utility.settings.setup_logging()
 
@@ -209,7 +230,7 @@ def core():
     mda = CoreMDAWidget()
     mda.show()
 
-    event_bus = CoreEventBus(mda)
+    event_bus = CoreEventBus(CMMCorePlus.instance(), mda)
     actuator = CoreActuator(event_bus)
     analyser = ImageAnalyser(event_bus)
     interpreter = BinaryFrameRateInterpreter(event_bus)
@@ -223,8 +244,78 @@ def core():
     sys.exit(app.exec_())
 
 
+def synthetic():
+    """Like core, but the frames come from a SyntheticCore to stress test the loop.
+
+    The two channels that the CoreActuator acquires show blobs with events every 30 timepoints.
+    Raise fps to find the highest frame rate that the loop can sustain.
+    """
+    from eda_plugin.analysers.image import ImageAnalyser
+    from eda_plugin.utility.core_event_bus import CoreEventBus
+    from eda_plugin.actuators.pymmc import CoreActuator
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+    from eda_plugin.utility.eda_gui import EDAMainGUI
+    from eda_plugin.utility.headless import set_mda_settings
+    from eda_plugin.utility.synthetic_camera import BlobFrames, SyntheticCore
+
+    eda_plugin.utility.settings.setup_logging()
+
+    app = QtWidgets.QApplication(sys.argv)
+
+    core = SyntheticCore(BlobFrames((512, 512), event_times=range(10, 10000, 30)), fps=100)
+    event_bus = CoreEventBus(core)
+    actuator = CoreActuator(event_bus)
+    analyser = ImageAnalyser(event_bus)
+    interpreter = BinaryFrameRateInterpreter(event_bus)
+    set_mda_settings(event_bus, {"channels": ["Channel_0", "Channel_1"]})
+
+    gui = EDAMainGUI(event_bus, viewer=True)
+    gui.add_dock_widget(actuator.gui, "Actuator")
+    gui.add_dock_widget(interpreter.gui, "Interpreter")
+    gui.add_dock_widget(analyser.gui, "Analyser")
+    gui.show()
+
+    sys.exit(app.exec_())
+
+
+def headless(config_file: str = None):
+    """EDA loop without any widgets, configured from a json file (see utility.headless).
+
+    Only a QCoreApplication is started, so this also runs without a display. If an actuator is
+    configured, its acquisition is started directly, otherwise the MDA from the config is run. The
+    loop ends with the acquisition, after the Writer has written what it still has queued.
+    """
+    from qtpy.QtCore import QCoreApplication, QTimer
+    from eda_plugin.utility.headless import build_pipeline, load_config
+
+    eda_plugin.utility.settings.setup_logging()
+
+    if config_file is None:
+        config_file = sys.argv[2]
+    config = load_config(config_file)
+
+    app = QCoreApplication(sys.argv)
+    pipeline = build_pipeline(config)
+
+    if "actuator" in pipeline:
+        QTimer.singleShot(0, pipeline["actuator"].acquisition.start)
+    elif "mda" in config:
+        from useq import MDASequence
+
+        sequence = MDASequence(**config["mda"])
+        mmcore = pipeline["event_bus"].mmcore
+        QTimer.singleShot(0, lambda: mmcore.run_mda(sequence))
+    pipeline["event_bus"].acquisition_ended_event.connect(app.quit)
+
+    exit_code = app.exec_()
+    if "writer" in pipeline:
+        # Write what is still queued before the process ends
+        pipeline["writer"].close()
+    sys.exit(exit_code)
+
+
 flavours = {"basic": basic, "pyro": pyro, "keras": keras, "pyro_keras": pyro_keras,
-            "main_isim": main_isim, "core": core}
+            "main_isim": main_isim, "core": core, "synthetic": synthetic, "headless": headless}
 try:
     flavour = flavours[sys.argv[1]]
 except (IndexError, KeyError) as e:
@@ -3,20 +3,29 @@
 BinaryFrame rate interpreter that receives information from an analyser and computes the decision
 about which frame rate to use for further imaging. This information is sent on the the actuator to
 modify furhter imaging.
+
+PredictiveFrameRateInterpreter additionally keeps a running trend of the decision parameter and
+switches to fast imaging ahead of time, if the trend will cross the upper threshold within the
+time that the analysis takes.
 """
 
+from __future__ import annotations
+
 import logging
+import time
+from typing import TYPE_CHECKING
 
 from qtpy.QtCore import QObject, Signal, Slot
 from qtpy import QtWidgets
-import qdarkstyle
 
-from pymm_eventserver.data_structures import ParameterSet
-from eda_plugin.utility.event_bus import EventBus
-from eda_plugin.utility.core_event_bus import CoreEventBus
-from eda_plugin.utility.qt_classes import QWidgetRestore
+from pymm_eventserver.data_structures import ParameterSet, PyImage
+from eda_plugin.utility.qt_classes import QWidgetRestore, dark_stylesheet
 from eda_plugin.utility import settings
 
+if TYPE_CHECKING:
+    from eda_plugin.utility.event_bus import EventBus
+    from eda_plugin.utility.core_event_bus import CoreEventBus
+
 log = logging.getLogger("EDA")
 
 
@@ -26,14 +35,18 @@ class BinaryFrameRateInterpreter(QObject):
     new_interpretation = Signal(float)
     new_parameters = Signal(ParameterSet)
 
-    def __init__(self, event_bus: EventBus|CoreEventBus, gui: bool = True):
-        """Load the default values, start the GUI and connect the events."""
+    def __init__(self, event_bus: EventBus|CoreEventBus, gui: bool = True, params: dict = None):
+        """Load the default values, start the GUI and connect the events.
+
+        params can be passed to run without the settings file, e.g. for a headless pipeline.
+        """
         super().__init__()
         self.gui = BinaryFrameRateParameterForm() if gui else None
-        self.gui.show()
-        self.gui.new_parameters.connect(self.update_parameters)
+        if gui:
+            self.gui.show()
+            self.gui.new_parameters.connect(self.update_parameters)
 
-        self.params = ParameterSet(settings.get_settings(self))
+        self.params = ParameterSet(settings.get_settings(self) if params is None else params)
         self.interval = self.params.slow_interval
 
         self.num_fast_frames = 0
@@ -98,6 +111,104 @@ class BinaryFrameRateInterpreter(QObject):
             self.num_fast_frames = 0
 
 
+class PredictiveFrameRateInterpreter(BinaryFrameRateInterpreter):
+    """BinaryFrameRateInterpreter that compensates for the latency of the analysis.
+
+    The decision parameter arrives at the interpreter some time after the image was recorded. The
+    interpreter measures this latency from the arrival of the images on the EventBus and keeps a
+    TrendModel of the decision parameter. If the extrapolated value will cross the upper threshold
+    within the measured latency, fast imaging is started right away.
+    """
+
+    def __init__(self, event_bus: EventBus|CoreEventBus, gui: bool = True, params: dict = None,
+                 n_points: int = 5):
+        """Set up the trend model and listen to the images to measure the analysis latency."""
+        self.trend = TrendModel(n_points)
+        self.latency = 0.
+        self.image_times = {}
+        super().__init__(event_bus, gui, params)
+
+        event_bus.new_image_event.connect(self._register_image)
+        event_bus.acquisition_started_event.connect(self._reset_trend)
+
+    @Slot(float, float, int)
+    def calculate_interpretation(self, new_value: float, elapsed: float, timepoint: int):
+        """Update latency and trend before the interval is calculated."""
+        self._update_latency(timepoint)
+        self.trend.update(new_value, elapsed)
+        super().calculate_interpretation(new_value, elapsed, timepoint)
+
+    def _define_imaging_speed(self, new_value: float):
+        if self.interval == self.params.slow_interval and self.trend.level is not None:
+            predicted = self.trend.extrapolate(self.latency)
+            if predicted > self.params.upper_threshold:
+                log.info(f"Predicted {predicted:.2f} in {self.latency:.3f} s, switching early")
+                return self.params.fast_interval
+        return super()._define_imaging_speed(new_value)
+
+    def _register_image(self, py_image: PyImage):
+        # Only the first image of a timepoint counts, the analysis can only start after that.
+        if py_image.timepoint not in self.image_times:
+            self.image_times[py_image.timepoint] = time.perf_counter()
+
+    def _update_latency(self, timepoint: int):
+        arrival = self.image_times.pop(timepoint, None)
+        # Timepoints that were skipped by the analyser will never get a decision
+        for old_timepoint in [t for t in self.image_times if t < timepoint]:
+            del self.image_times[old_timepoint]
+        if arrival is None:
+            return
+        measured = time.perf_counter() - arrival
+        self.latency = self.trend.smooth(self.latency, measured) if self.latency else measured
+
+    def _reset_trend(self, *_):
+        self.trend.reset()
+        self.image_times = {}
+
+
+class TrendModel:
+    """Exponential moving average of the level and the slope of a series (Holt's method).
+
+    Each update is O(1), the weight of the history corresponds to an EMA over the last n_points.
+    The slope is given in units per second of the time passed to update.
+    """
+
+    def __init__(self, n_points: int = 5):
+        """Set the smoothing factor for an EMA over n_points."""
+        self.alpha = 2 / (n_points + 1)
+        self.reset()
+
+    def reset(self):
+        """Forget the history, e.g. for a new acquisition."""
+        self.level = None
+        self.slope = 0.
+        self.last_time = None
+
+    def update(self, value: float, timestamp: float):
+        """Add a new value at timestamp [s] to the trend."""
+        if self.level is None:
+            self.level = value
+            self.last_time = timestamp
+            return
+        dt = timestamp - self.last_time
+        if dt <= 0:
+            self.level = self.smooth(self.level, value)
+            return
+        forecast = self.level + self.slope * dt
+        new_level = self.smooth(forecast, value)
+        self.slope = self.smooth(self.slope, (new_level - self.level) / dt)
+        self.level = new_level
+        self.last_time = timestamp
+
+    def extrapolate(self, horizon: float) -> float:
+        """Value that is expected horizon seconds after the last update."""
+        return self.level + self.slope * horizon
+
+    def smooth(self, old: float, new: float) -> float:
+        """One step of the exponential moving average."""
+        return old + self.alpha * (new - old)
+
+
 class BinaryFrameRateParameterForm(QWidgetRestore):
     """GUI for input/update of the parameters used for a change between two frame rates."""
 
@@ -134,7 +245,7 @@ class BinaryFrameRateParameterForm(QWidgetRestore):
         param_layout.addRow("Lower Threshold", self.lower_threshold_input)
         param_layout.addRow("Upper Threshold", self.upper_threshold_input)
 
-        self.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
+        self.setStyleSheet(dark_stylesheet())
         self.param_set = ParameterSet(**DEFAULT_VALUES)
 
     def _update_parameters(self):
@@ -1,12 +1,15 @@
+from __future__ import annotations
+
 from collections import defaultdict, OrderedDict
 import logging
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
 from qtpy import QtCore, QtWidgets
-import qdarkstyle
 from eda_plugin.utility.qt_classes import QWidgetRestore
 from eda_plugin.utility.data_structures import ParameterSet
-from eda_plugin.utility.event_bus import EventBus
+
+if TYPE_CHECKING:
+    from eda_plugin.utility.event_bus import EventBus
 
 log = logging.getLogger("EDA")
 
@@ -17,17 +20,19 @@ class PresetsInterpreter(QtCore.QObject):
     new_interpretation = QtCore.Signal(float)
     new_parameters = QtCore.Signal(dict)
 
-    def __init__(self, event_bus: EventBus, gui: bool = True):
+    def __init__(self, event_bus: EventBus, gui: bool = True, params: dict = None):
         """Load the default values, start the GUI and connect the events."""
         super().__init__()
-        params = ParameterSet().to_dict()
-        params['min_image_frames'] =  20
-        self.gui = ParameterForm("PresetsInterpreter", params=params) if gui else None
+        default_params = ParameterSet().to_dict()
+        default_params['min_image_frames'] =  20
+        if params is not None:
+            default_params.update(params)
+        self.gui = ParameterForm("PresetsInterpreter", params=default_params) if gui else None
         if gui:
             self.gui.new_parameters.connect(self.update_parameters)
             self.params = self.gui.params
         else:
-            self.params = {}
+            self.params = default_params
 
         # To keep the paramater sent numerical, 0: screen, 1:image
         self.mode = 0
@@ -116,7 +121,7 @@ class ParameterForm(QWidgetRestore):
             self.rows[idx]['input'].editingFinished.connect(self._update_parameters)
 
         self.new_parameters.emit(self.params)
-        # self.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
+        # self.setStyleSheet(dark_stylesheet())
 
     def closeEvent(self, e):
         self.settings.setValue(self.form_name, self.params)
@@ -0,0 +1,366 @@
+"""Throughput and latency benchmark for the EDA loop.
+
+Synthetic frames are sent into a CoreEventBus (or an EventBus with a mocked EventThread, as in the
+tests) from a separate thread, like the frames from the camera/MDA thread. The frames are consumed
+by an ImageAnalyser, BinaryFrameRateInterpreter, Writer and the EDAMainGUI with its viewer, which
+can all be switched off. Measured are:
+
+    delivered_fps: frames per second that arrive at new_image_event subscribers
+    latency_ms: time from emitting a frame until it is delivered in the GUI thread
+    analyser_dropped: timepoints the ImageAnalyser skipped because all its threads were busy
+    gui_busy_s: time the GUI thread was not available to process events
+    ring_dropped: frames passed on as copies because all slots of the frame ring were in use
+
+Run from the command line, e.g.
+
+    python -m eda_plugin.utility.benchmark --bus core --fps 100 --frames 500 --channels 2
+
+Use --frame-ring 8 to pass the frames to the analyser and the writer through a FrameRing with
+8 slots, to compare with the copies of new_image_event.
+
+Use --fps 0 to send the frames as fast as possible.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from pymm_eventserver.data_structures import MMSettings, PyImage
+from qtpy import QtCore, QtWidgets
+
+log = logging.getLogger("EDA")
+
+
+@dataclass
+class BenchmarkSettings:
+    """What to send into the event bus and which components to attach."""
+
+    bus: str = "core"
+    fps: float = 100.
+    n_frames: int = 300
+    shape: tuple = (512, 512)
+    n_channels: int = 1
+    n_slices: int = 1
+    analyser: bool = True
+    interpreter: bool = True
+    writer: bool = True
+    viewer: bool = True
+    path: str = None
+    timeout: float = 60.
+    # Slots of the FrameRing of the event bus, 0 for no ring
+    frame_ring_slots: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    """Numbers measured in one benchmark run."""
+
+    frames_sent: int = 0
+    frames_delivered: int = 0
+    send_fps: float = 0.
+    delivered_fps: float = 0.
+    latency_ms: dict = field(default_factory=dict)
+    analyser_dropped: int = 0
+    ring_dropped: int = 0
+    interpretations: int = 0
+    gui_busy_s: float = 0.
+    gui_busy_fraction: float = 0.
+    duration_s: float = 0.
+    writer: dict = field(default_factory=dict)
+
+    def report(self) -> str:
+        """Human readable summary."""
+        latency = ", ".join(f"{key} {value:.2f}" for key, value in self.latency_ms.items())
+        return "\n".join([
+            f"frames sent/delivered: {self.frames_sent}/{self.frames_delivered}",
+            f"send fps:              {self.send_fps:.1f}",
+            f"delivered fps:         {self.delivered_fps:.1f}",
+            f"latency [ms]:          {latency}",
+            f"analyser dropped:      {self.analyser_dropped}",
+            f"frame ring dropped:    {self.ring_dropped}",
+            f"interpretations:       {self.interpretations}",
+            f"GUI thread busy:       {self.gui_busy_s:.2f} s ({self.gui_busy_fraction:.0%})",
+            f"writer:                {self.writer}",
+        ])
+
+
+class FrameProbe(QtCore.QObject):
+    """Lives in the GUI thread and timestamps every frame it receives from the event bus."""
+
+    done = QtCore.Signal()
+
+    def __init__(self, n_frames: int):
+        """Frames are identified by their (timepoint, channel, z_slice)."""
+        super().__init__()
+        self.n_frames = n_frames
+        self.sent = {}
+        self.received = {}
+
+    @QtCore.Slot(PyImage)
+    def new_image(self, image: PyImage):
+        """Note the arrival time, tell the benchmark when all frames are there."""
+        self.received[(image.timepoint, image.channel, image.z_slice)] = time.perf_counter()
+        if len(self.received) == self.n_frames:
+            self.done.emit()
+
+
+class GUIHeartbeat(QtCore.QObject):
+    """Precise timer in the GUI thread, time it fires late is time the event loop was busy."""
+
+    def __init__(self, interval_ms: int = 1):
+        """Set up the timer, start with start()."""
+        super().__init__()
+        self.interval = interval_ms / 1000
+        self.busy = 0.
+        self.last = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._beat)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._beat()
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.busy += max(0., now - self.last - self.interval)
+        self.last = now
+
+
+def java_acquisition_event(settings: BenchmarkSettings, save_path: str = "benchmark/FOV"):
+    """Mock of the acquisition started event with the settings that Micro-Manager would send."""
+    java_settings = mock.MagicMock()
+    java_settings.interval_ms.return_value = 0 if not settings.fps else 1000 / settings.fps
+    java_settings.num_frames.return_value = settings.n_frames
+    java_settings.acq_order_mode.return_value = 0
+    java_settings.use_channels.return_value = True
+    java_settings.channel_group.return_value = "Channels"
+    java_settings.use_slices.return_value = settings.n_slices > 1
+    channels = []
+    for idx in range(settings.n_channels):
+        channel = mock.MagicMock()
+        channel.config.return_value = f"Channel_{idx}"
+        channel.use_channel.return_value = True
+        channel.do_z_stack.return_value = settings.n_slices > 1
+        channel.exposure.return_value = 10
+        channel.color.return_value.get_red.return_value = 255
+        channel.color.return_value.get_green.return_value = 255
+        channel.color.return_value.get_blue.return_value = 255
+        channels.append(channel)
+    java_settings.channels.return_value.size.return_value = len(channels)
+    java_settings.channels.return_value.get.side_effect = channels.__getitem__
+    slices = [float(z) for z in range(settings.n_slices)] if settings.n_slices > 1 else []
+    java_settings.slices.return_value.size.return_value = len(slices)
+    java_settings.slices.return_value.get.side_effect = slices.__getitem__
+
+    event = mock.MagicMock()
+    event.get_settings.return_value = java_settings
+    event.get_datastore.return_value.get_save_path.return_value = save_path
+    return event
+
+
+def make_event_bus(settings: BenchmarkSettings):
+    """Event bus without a connection to Micro-Manager and a function to send frames into it."""
+    if settings.bus == "micro_manager":
+        from eda_plugin.utility.event_bus import EventBus
+
+        event_bus = EventBus(mock.MagicMock(), frame_ring_slots=settings.frame_ring_slots)
+
+        def send(image, t, c, z):
+            event_bus.new_image_event.emit(PyImage(image, {}, t, c, z, 0))
+
+    else:
+        from eda_plugin.utility.core_event_bus import CoreEventBus
+
+        event_bus = CoreEventBus(mock.MagicMock(), frame_ring_slots=settings.frame_ring_slots)
+        # The Writer saves the Micro-Manager state through the studio
+        event_bus.studio = mock.MagicMock()
+
+        def send(image, t, c, z):
+            # Stands in for the MDAEvent from pymmcore-plus, only the index is used
+            event_bus.translate_image(image, SimpleNamespace(index={"t": t, "c": c, "z": z}))
+
+    return event_bus, send
+
+
+def attach_components(event_bus, settings: BenchmarkSettings) -> dict:
+    """Start the EDA components that should be part of the benchmark."""
+    components = {}
+    if settings.analyser:
+        from eda_plugin.analysers.image import ImageAnalyser
+
+        components["analyser"] = ImageAnalyser(event_bus, gui=False)
+    if settings.interpreter:
+        from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+
+        params = {"slow_interval": 1., "fast_interval": 0.1, "lower_threshold": 80,
+                  "upper_threshold": 100}
+        components["interpreter"] = BinaryFrameRateInterpreter(event_bus, gui=False,
+                                                               params=params)
+    if settings.writer:
+        from eda_plugin.utility.writers import Writer
+
+        options = {"path": settings.path, "network_images": settings.viewer}
+        components["writer"] = Writer(event_bus, gui=False, options=options)
+    if settings.viewer:
+        from eda_plugin.utility.eda_gui import EDAMainGUI
+
+        components["gui"] = EDAMainGUI(event_bus, viewer=True)
+        # Pass the frames on like an analyser that prepares images and outputs network images
+        last_channel, last_slice = settings.n_channels - 1, settings.n_slices - 1
+
+        def relay(image: PyImage):
+            if image.channel == last_channel and image.z_slice == last_slice:
+                event_bus.new_prepared_image.emit(image.raw_image, image.timepoint)
+                event_bus.new_network_image.emit(image.raw_image, (image.timepoint,))
+
+        components["relay"] = relay
+        event_bus.new_image_event.connect(relay)
+    return components
+
+
+def send_frames(send, settings: BenchmarkSettings, frames: list, sent: dict):
+    """Send all frames at the target rate, note the time each of them was sent."""
+    period = 1 / settings.fps if settings.fps else 0
+    next_time = time.perf_counter()
+    n_timepoints = int(np.ceil(settings.n_frames / (settings.n_channels * settings.n_slices)))
+    n_sent = 0
+    for t in range(n_timepoints):
+        for z in range(settings.n_slices):
+            for c in range(settings.n_channels):
+                if n_sent == settings.n_frames:
+                    return
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                next_time += period
+                sent[(t, c, z)] = time.perf_counter()
+                send(frames[n_sent % len(frames)], t, c, z)
+                n_sent += 1
+
+
+def run_benchmark(settings: BenchmarkSettings = None) -> BenchmarkResult:
+    """Send synthetic frames through the event bus with the components attached and measure."""
+    # A copy, the number of frames and the path are adjusted for this run only
+    settings = BenchmarkSettings() if settings is None else replace(settings)
+    # Full sets of channels and slices, so that the analyser sees complete timepoints
+    set_size = settings.n_channels * settings.n_slices
+    settings.n_frames = max(set_size, settings.n_frames - settings.n_frames % set_size)
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    temp_dir = None
+    if settings.writer and settings.path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        settings.path = temp_dir.name
+
+    event_bus, send = make_event_bus(settings)
+    components = attach_components(event_bus, settings)
+    interpretations = []
+    event_bus.new_interpretation.connect(interpretations.append)
+
+    probe = FrameProbe(settings.n_frames)
+    event_bus.new_image_event.connect(probe.new_image)
+    heartbeat = GUIHeartbeat()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 200, settings.shape, dtype=np.uint16) for _ in range(4)]
+
+    start_event = java_acquisition_event(settings)
+    event_bus.mda_settings_event.emit(MMSettings(start_event.get_settings()))
+    event_bus.acquisition_started_event.emit(start_event)
+
+    loop = QtCore.QEventLoop()
+    probe.done.connect(loop.quit)
+    QtCore.QTimer.singleShot(int(settings.timeout * 1000), loop.quit)
+    sender = threading.Thread(target=send_frames, args=(send, settings, frames, probe.sent),
+                              daemon=True)
+
+    heartbeat.start()
+    t0 = time.perf_counter()
+    sender.start()
+    loop.exec()
+    duration = time.perf_counter() - t0
+    heartbeat.stop()
+    sender.join(settings.timeout)
+
+    if "analyser" in components:
+        components["analyser"].threadpool.waitForDone(int(settings.timeout * 1000))
+    app.processEvents()
+    event_bus.acquisition_ended_event.emit(None)
+    if "writer" in components:
+        components["writer"].close(settings.timeout)
+
+    result = _evaluate(probe, heartbeat, duration)
+    result.interpretations = len(interpretations)
+    if "analyser" in components:
+        result.analyser_dropped = components["analyser"].dropped
+    if "writer" in components:
+        result.writer = components["writer"].metrics()
+    if event_bus.frame_ring is not None:
+        result.ring_dropped = event_bus.frame_ring.dropped
+        event_bus.close()
+    if "gui" in components:
+        components["gui"].close()
+    if temp_dir is not None:
+        temp_dir.cleanup()
+    return result
+
+
+def _evaluate(probe: FrameProbe, heartbeat: GUIHeartbeat, duration: float) -> BenchmarkResult:
+    result = BenchmarkResult(frames_sent=len(probe.sent), frames_delivered=len(probe.received),
+                             duration_s=duration, gui_busy_s=heartbeat.busy,
+                             gui_busy_fraction=heartbeat.busy / duration if duration else 0.)
+    sent = np.array(sorted(probe.sent.values()))
+    if len(sent) > 1:
+        result.send_fps = (len(sent) - 1) / (sent[-1] - sent[0])
+    if probe.received:
+        received = np.array(sorted(probe.received.values()))
+        if len(received) > 1:
+            result.delivered_fps = (len(received) - 1) / (received[-1] - sent[0])
+        latency = np.array([probe.received[key] - probe.sent[key] for key in probe.received]) * 1000
+        result.latency_ms = {"mean": latency.mean(), "p50": np.percentile(latency, 50),
+                             "p99": np.percentile(latency, 99), "max": latency.max()}
+    return result
+
+
+def main(argv=None):
+    """Run the benchmark with the settings from the command line and print the results."""
+    parser = argparse.ArgumentParser(description="EDA event bus benchmark")
+    parser.add_argument("--bus", choices=["core", "micro_manager"], default="core")
+    parser.add_argument("--fps", type=float, default=100., help="0 for as fast as possible")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--shape", type=int, nargs=2, default=[512, 512])
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--slices", type=int, default=1)
+    parser.add_argument("--path", default=None, help="Writer output, temporary if not given")
+    parser.add_argument("--frame-ring", type=int, default=0, help="Slots of the frame ring")
+    for component in ["analyser", "interpreter", "writer", "viewer"]:
+        parser.add_argument(f"--no-{component}", action="store_true")
+    args = parser.parse_args(argv)
+
+    settings = BenchmarkSettings(bus=args.bus, fps=args.fps, n_frames=args.frames,
+                                 shape=tuple(args.shape), n_channels=args.channels,
+                                 n_slices=args.slices, analyser=not args.no_analyser,
+                                 interpreter=not args.no_interpreter, writer=not args.no_writer,
+                                 viewer=not args.no_viewer, path=args.path,
+                                 frame_ring_slots=args.frame_ring)
+    result = run_benchmark(settings)
+    print(result.report())
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Column-wise log of small per-event values that is written to zarr in blocks.
+
+Rows are collected in preallocated NumPy columns. Once block_size rows are there, the block is
+handed out to be written, one zarr array per column with one chunk per block. Nothing is written
+for single rows, so logging a value costs no disk access and the files stay small and quick to
+load:
+
+    log = ColumnarLog({"timepoint": "i8", "decision": "f8"})
+    block = log.append(timepoint=0, decision=0.5)
+    if block is not None:
+        write_block(group, block)
+    ...
+    write_block(group, log.take())
+    table = read_log(group)  # structured array, table["decision"]
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import zarr
+
+
+class ColumnarLog:
+    """Fixed set of columns, buffered in blocks of block_size rows."""
+
+    def __init__(self, columns: dict, block_size: int = 1024):
+        """columns maps the column names to their numpy dtype. Missing values are NaN or -1."""
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        self.block_size = block_size
+        self.rows = 0
+        self.columns = self._empty_block()
+
+    def _empty_block(self) -> dict:
+        block = {}
+        for name, dtype in self.dtypes.items():
+            block[name] = np.full(self.block_size, np.nan if dtype.kind == "f" else -1, dtype)
+        return block
+
+    def append(self, **values) -> dict | None:
+        """Add a row, return the block of columns if it is full and should be written."""
+        for name, value in values.items():
+            self.columns[name][self.rows] = value
+        self.rows += 1
+        if self.rows == self.block_size:
+            return self.take()
+        return None
+
+    def take(self) -> dict | None:
+        """The rows collected so far, the log starts a new block."""
+        if self.rows == 0:
+            return None
+        block = {name: column[:self.rows] for name, column in self.columns.items()}
+        self.columns = self._empty_block()
+        self.rows = 0
+        return block
+
+
+def write_block(group: zarr.Group, block: dict, chunk_size: int = 1024, compressor=None):
+    """Append the columns of a block to their arrays in the group, create them if needed."""
+    if block is None:
+        return
+    for name, column in block.items():
+        if name not in group:
+            group.create_dataset(name, shape=(0,), chunks=(chunk_size,), dtype=column.dtype,
+                                 compressor=compressor)
+        group[name].append(column)
+    group.attrs["columns"] = list(block)
+
+
+def read_log(group: zarr.Group) -> np.ndarray:
+    """All columns of a log as a structured array."""
+    names = group.attrs.get("columns", [])
+    if not names:
+        return np.zeros(0)
+    return np.rec.fromarrays([group[name][:] for name in names], names=names)
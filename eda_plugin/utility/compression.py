@@ -0,0 +1,121 @@
+"""Blosc compression settings for the datasets of the Writer and a benchmark to choose one.
+
+A compression setting is either the name of a preset in PRESETS, a dict with the Blosc settings
+(e.g. {"cname": "zstd", "clevel": 3, "shuffle": "bit"}), None for no compression or "auto". For
+"auto" the codecs in PRESETS are benchmarked on the first frame of the dataset and the one with the
+best compression ratio that is still fast enough for the expected data rate is used.
+
+Blosc compresses with several threads, set_threads sets how many (for all datasets).
+
+Run as a module to compare the presets for a TIFF file or synthetic frames:
+
+    python -m eda_plugin.utility.compression data.tif
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import time
+
+import numcodecs
+import numpy as np
+from numcodecs import Blosc
+
+log = logging.getLogger("EDA")
+
+SHUFFLES = {"none": Blosc.NOSHUFFLE, "byte": Blosc.SHUFFLE, "bit": Blosc.BITSHUFFLE}
+
+PRESETS = {
+    "none": None,
+    "lz4": {"cname": "lz4", "clevel": 5, "shuffle": "byte"},
+    "lz4_bit": {"cname": "lz4", "clevel": 5, "shuffle": "bit"},
+    "zstd": {"cname": "zstd", "clevel": 3, "shuffle": "bit"},
+    "zstd_high": {"cname": "zstd", "clevel": 7, "shuffle": "bit"},
+}
+
+# Compressing has to be this many times faster than the data comes in for "auto"
+HEADROOM = 4
+
+
+def make_compressor(setting) -> Blosc | None:
+    """Blosc instance for a preset name or a dict with cname, clevel and shuffle."""
+    if isinstance(setting, str):
+        if setting not in PRESETS:
+            raise ValueError(f"Unknown compression {setting}, use one of {list(PRESETS)}")
+        setting = PRESETS[setting]
+    if setting is None:
+        return None
+    return Blosc(cname=setting.get("cname", "zstd"), clevel=setting.get("clevel", 3),
+                 shuffle=SHUFFLES[setting.get("shuffle", "bit")])
+
+
+def set_threads(n_threads: int):
+    """Number of threads Blosc compresses with."""
+    numcodecs.blosc.set_nthreads(n_threads)
+
+
+def benchmark_codecs(frame: np.ndarray, presets: list = None, repeats: int = 3) -> list:
+    """Compression ratio and encode/decode throughput in MB/s of the presets on a frame."""
+    frame = np.ascontiguousarray(frame)
+    results = []
+    for name in PRESETS if presets is None else presets:
+        compressor = make_compressor(name)
+        if compressor is None:
+            continue
+        encode, decode = np.inf, np.inf
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            encoded = compressor.encode(frame)
+            t1 = time.perf_counter()
+            compressor.decode(encoded)
+            t2 = time.perf_counter()
+            encode, decode = min(encode, t1 - t0), min(decode, t2 - t1)
+        results.append({"preset": name, "ratio": frame.nbytes / len(encoded),
+                        "encode_mb_s": frame.nbytes / encode / 1e6,
+                        "decode_mb_s": frame.nbytes / decode / 1e6})
+    return results
+
+
+def choose_codec(frame: np.ndarray, data_rate_mb_s: float = None) -> str:
+    """Preset with the best ratio that encodes HEADROOM times faster than the data rate.
+
+    Without a data rate (unknown interval), the fastest preset that compresses at all is used.
+    """
+    results = benchmark_codecs(frame)
+    useful = [result for result in results if result["ratio"] > 1.05]
+    if not useful:
+        return "none"
+    if data_rate_mb_s is None:
+        choice = max(useful, key=lambda result: result["encode_mb_s"])
+    else:
+        fast_enough = [result for result in useful
+                       if result["encode_mb_s"] > HEADROOM * data_rate_mb_s]
+        if not fast_enough:
+            log.warning(f"No codec is fast enough for {data_rate_mb_s:.0f} MB/s")
+            return "none"
+        choice = max(fast_enough, key=lambda result: result["ratio"])
+    log.info(f"Codec chosen: {choice}")
+    return choice["preset"]
+
+
+def main(argv=None):
+    """Print the benchmark for the first frame of a TIFF file, or for synthetic frames."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        import tifffile
+
+        data = tifffile.imread(argv[0])
+        frame = data.reshape(-1, *data.shape[-2:])[0]
+    else:
+        from eda_plugin.utility.synthetic_camera import BlobFrames
+
+        frame = BlobFrames((1024, 1024))(0)
+    print(f"{'preset':<10} {'ratio':>6} {'enc MB/s':>9} {'dec MB/s':>9}")
+    for result in benchmark_codecs(frame):
+        print(f"{result['preset']:<10} {result['ratio']:6.2f} {result['encode_mb_s']:9.0f} "
+              f"{result['decode_mb_s']:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,39 @@
 
-from qtpy.QtCore import QObject, Signal
-from pymmcore_plus import CMMCorePlus
+from __future__ import annotations
+
+from qtpy.QtCore import QCoreApplication, QObject, Signal
 from pymm_eventserver.data_structures import ParameterSet, PyImage, MMSettings
-from eda_plugin.utility.core_gui import CoreMDAWidget
+from eda_plugin.utility.frame_ring import FrameRing
 import numpy as np
-from useq import MDASequence, MDAEvent
 import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pymmcore_plus import CMMCorePlus
+    from useq import MDASequence, MDAEvent
+    from eda_plugin.utility.core_gui import CoreMDAWidget
 
 log = logging.getLogger("EDA")
+
+
+def settings_from_sequence(sequence: MDASequence) -> MMSettings:
+    """MMSettings with the channels, slices and time plan of a useq MDASequence."""
+    settings = MMSettings()
+    settings.n_channels = max(1, sequence.sizes['c'])
+    settings.n_slices = max(1, sequence.sizes['z'])
+    settings.timepoints = sequence.sizes['t'] or settings.timepoints
+    interval = getattr(sequence.time_plan, "interval", None)
+    if interval is not None:
+        settings.interval_ms = interval.total_seconds() * 1000
+    channels = {}
+    for channel in sequence.channels:
+        channels[channel.config] = {"name": channel.config, "color": [255, 255, 255],
+                                    "use": True, "exposure": channel.exposure or 100,
+                                    "z_stack": channel.do_stack}
+    settings.channels = channels
+    return settings
+
+
 class CoreEventBus(QObject):
     """A hub for events that does not use the events from the Micro-Manager Java GUI, but from
     pymmcore-plus direclty."""
@@ -17,6 +43,7 @@ class CoreEventBus(QObject):
 
     # Analyser Events
     new_decision_parameter = Signal(float, float, int)
+    new_stage_times = Signal(int, object)
     new_output_shape = Signal(tuple)
     new_network_image = Signal(np.ndarray, tuple)
     new_prepared_image = Signal(np.ndarray, int)
@@ -29,6 +56,7 @@ class CoreEventBus(QObject):
     acquisition_started_event = Signal(object)
     acquisition_ended_event = Signal(object)
     new_image_event = Signal(PyImage)
+    new_frame_event = Signal(int, object)
     mda_settings_event = Signal(object)
     useq_settings_event = Signal(object)
     eda_useq_event = Signal(object)
@@ -36,18 +64,31 @@ class CoreEventBus(QObject):
     new_mask_event = Signal(np.ndarray)
 
 
-    def __init__(self, mmcore:CMMCorePlus, mda_gui: CoreMDAWidget, eda_gui, preview=None):
-        """Connect to Micro-Manager using the EventThread. Pass these signals through to subs."""
+    def __init__(self, mmcore:CMMCorePlus, mda_gui: CoreMDAWidget = None, eda_gui = None,
+                 preview=None, frame_ring_slots: int = 0):
+        """Connect to Micro-Manager using the EventThread. Pass these signals through to subs.
+
+        Without an mda_gui (headless), the MDA settings have to be passed to
+        translate_mda_settings directly. With frame_ring_slots > 0, images are also put into a
+        shared FrameRing and announced by slot index in new_frame_event.
+        """
         super().__init__()
+        self.mmcore = mmcore
+        self.frame_ring = FrameRing(frame_ring_slots) if frame_ring_slots else None
+        if self.frame_ring is not None and QCoreApplication.instance() is not None:
+            QCoreApplication.instance().aboutToQuit.connect(self.close)
+        # For components that are created after the interpreter has sent its first interval
+        self.last_interpretation = None
+        self.new_interpretation.connect(self._remember_interpretation)
         mmcore.mda.events.frameReady.connect(self.translate_image)
         mmcore.mda.events.sequenceStarted.connect(self.acquisition_started_event.emit)
         mmcore.mda.events.sequenceFinished.connect(self.acquisition_ended_event.emit)
         mmcore.events.propertyChanged.connect(self.configuration_settings_event.emit)
 
         #TODO: This will have to be connected to the MDA GUI that will be used.
-        mda_gui.mda_settings_event.connect(self.translate_mda_settings)
-        mda_gui.mda_settings_event.connect(self.useq_settings_event.emit)
-        
+        if mda_gui is not None:
+            mda_gui.mda_settings_event.connect(self.translate_mda_settings)
+            mda_gui.mda_settings_event.connect(self.useq_settings_event.emit)
 
         try:
             eda_gui.mda_settings_event.connect(self.eda_useq_event.emit)
@@ -60,17 +101,21 @@ class CoreEventBus(QObject):
         self.initialized = True
         print("EventBus ready")
 
+    def _remember_interpretation(self, interpretation: float):
+        self.last_interpretation = interpretation
+
     def translate_mda_settings(self, settings:MDASequence):
-        new_settings = MMSettings()
-        new_settings.n_channels = max(1, settings.sizes['c'])
-        new_settings.n_slices = max(1, settings.sizes['z'])
-        channels = {}
-        for channel in settings.channels:
-            channels[channel.config] = 100
-        new_settings.channels = channels
-        self.mda_settings_event.emit(new_settings)
+        self.mda_settings_event.emit(settings_from_sequence(settings))
 
     def translate_image(self, image:np.ndarray, event:MDAEvent):
         """Translate the image from the MDAEvent into a PyImage."""
         index = event.index
-        self.new_image_event.emit(PyImage(image, {}, index.get('t', 0), index.get('c', 0), index.get('z', 0), 0))
\ No newline at end of file
+        py_image = PyImage(image, {}, index.get('t', 0), index.get('c', 0), index.get('z', 0), 0)
+        self.new_image_event.emit(py_image)
+        if self.frame_ring is not None:
+            self.new_frame_event.emit(*self.frame_ring.publish(py_image))
+
+    def close(self):
+        """Free the shared memory of the frame ring."""
+        if self.frame_ring is not None:
+            self.frame_ring.close()
\ No newline at end of file
@@ -0,0 +1,174 @@
+"""Read back what the Writer saved, without loading the whole acquisition into memory.
+
+The zarr arrays are opened read-only and only the chunks that are indexed are read. The small
+decision log is loaded when opening and aligned to the timepoints, so that raw images, network
+images, decision parameters and intervals can be accessed by timepoint:
+
+    dataset = EDADataset("D:/data/FOV_000.ome.zarr")
+    dataset.decisions[10], dataset.intervals[10]
+    frame = dataset.images[10, 0, 0]
+    fast = dataset.view(dataset.fast_timepoints())
+    for timepoint in fast:
+        train(timepoint["image"], timepoint["network"])
+    stack = fast.images()  # Only the fast timepoints are read
+"""
+
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+import zarr
+
+from eda_plugin.utility.columnar_log import read_log
+
+
+class EDADataset:
+    """An .ome.zarr folder written by the Writer."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.root = zarr.open(path, mode="r")
+        self.images = self._array("Images/0")
+        self.nn_images = self._array("EDA/nn_images")
+        self.log = self._read_log()
+        self.planes = read_log(self.root["OME/planes"]) if "OME/planes" in self.root else None
+        self.parameters = self._read_parameters()
+        self.settings = self._read_json("Metadata/MMSettings.json")
+        self.decisions = self._aligned("decision")
+        self.intervals = self._aligned("interval", fill_forward=True)
+
+    def __len__(self) -> int:
+        return self.n_timepoints
+
+    @property
+    def n_timepoints(self) -> int:
+        lengths = [0 if self.images is None else self.images.shape[0]]
+        if self.nn_images is not None:
+            lengths.append(self.nn_images.shape[0])
+        if len(self.log):
+            lengths.append(int(self.log["timepoint"].max()) + 1)
+        return max(lengths)
+
+    def _array(self, name: str) -> zarr.Array | None:
+        return self.root[name] if name in self.root else None
+
+    def _read_log(self) -> np.ndarray:
+        if "EDA/analyser_output" not in self.root:
+            return np.rec.fromarrays([np.zeros(0, int), np.zeros(0)],
+                                     names=["timepoint", "decision"])
+        output = self.root["EDA/analyser_output"]
+        if isinstance(output, zarr.Array):
+            # Older files: one (timepoint, decision parameter) row per decision
+            output = output[:]
+            return np.rec.fromarrays([output[:, 0].astype(int), output[:, 1]],
+                                     names=["timepoint", "decision"])
+        return read_log(output)
+
+    def _read_parameters(self) -> dict | None:
+        if "EDA/parameters" not in self.root:
+            return None
+        parameters = np.asarray(self.root["EDA/parameters"][...]).flat[0]
+        return json.loads(parameters) if isinstance(parameters, str) else parameters
+
+    def _read_json(self, name: str) -> dict | None:
+        path = os.path.join(self.path, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _aligned(self, column: str, fill_forward: bool = False) -> np.ndarray:
+        """Values of a log column by timepoint, NaN where there was none.
+
+        With fill_forward, timepoints without a value get the last one before. The interval is
+        logged with every decision, but timepoints the analyser skipped have no row.
+        """
+        values = np.full(self.n_timepoints, np.nan)
+        if column not in (self.log.dtype.names or ()):
+            return values
+        timepoints = self.log["timepoint"]
+        valid = (timepoints >= 0) & ~np.isnan(self.log[column])
+        values[timepoints[valid]] = self.log[column][valid]
+        if fill_forward:
+            known = np.where(~np.isnan(values), np.arange(len(values)), 0)
+            np.maximum.accumulate(known, out=known)
+            values = values[known]
+        return values
+
+    def fast_timepoints(self, threshold: float = None) -> np.ndarray:
+        """Timepoints with an interval below threshold, by default the shortest interval used."""
+        intervals = self.intervals
+        if np.isnan(intervals).all():
+            return np.zeros(0, int)
+        if threshold is None:
+            return np.flatnonzero(intervals == np.nanmin(intervals))
+        return np.flatnonzero(intervals < threshold)
+
+    def timepoint(self, timepoint: int) -> dict:
+        """All data of one timepoint, the images are read now."""
+        return {
+            "timepoint": timepoint,
+            "image": None if self.images is None else self.images[timepoint],
+            "network": (None if self.nn_images is None or timepoint >= self.nn_images.shape[0]
+                        else self.decode_network(self.nn_images[timepoint])),
+            "decision": self.decisions[timepoint],
+            "interval": self.intervals[timepoint],
+        }
+
+    def decode_network(self, stored: np.ndarray) -> np.ndarray:
+        """Network images that were quantized by the Writer back to float, missing ones are NaN."""
+        attrs = self.nn_images.attrs
+        if "scale_factor" not in attrs:
+            return stored
+        values = stored * np.float32(attrs["scale_factor"]) + np.float32(attrs["add_offset"])
+        values[stored == attrs.get("missing_value", 0)] = np.nan
+        return values
+
+    def view(self, timepoints) -> TimepointView:
+        """Lazy selection of timepoints, e.g. fast_timepoints()."""
+        return TimepointView(self, timepoints)
+
+
+class TimepointView:
+    """Selection of timepoints of an EDADataset, nothing is read until indexed."""
+
+    def __init__(self, dataset: EDADataset, timepoints):
+        self.dataset = dataset
+        self.timepoints = np.asarray(timepoints, dtype=int)
+
+    def __len__(self) -> int:
+        return len(self.timepoints)
+
+    def __getitem__(self, index: int) -> dict:
+        return self.dataset.timepoint(int(self.timepoints[index]))
+
+    def __iter__(self):
+        for timepoint in self.timepoints:
+            yield self.dataset.timepoint(int(timepoint))
+
+    @property
+    def decisions(self) -> np.ndarray:
+        return self.dataset.decisions[self.timepoints]
+
+    @property
+    def intervals(self) -> np.ndarray:
+        return self.dataset.intervals[self.timepoints]
+
+    def images(self, channel=slice(None), z_slice=slice(None)) -> np.ndarray | None:
+        """Raw images of the selected timepoints, only their chunks are read.
+
+        None if the images were not saved, like in EDADataset.timepoint.
+        """
+        if self.dataset.images is None:
+            return None
+        return self.dataset.images.get_orthogonal_selection(
+            (self.timepoints, channel, z_slice))
+
+    def network_images(self) -> np.ndarray | None:
+        """Network images of the selected timepoints, only their chunks are read, or None."""
+        if self.dataset.nn_images is None:
+            return None
+        return self.dataset.decode_network(
+            self.dataset.nn_images.get_orthogonal_selection((self.timepoints,)))
@@ -1,20 +1,24 @@
 """QtWidgets that can be used as main GUI components for the EDA loop."""
 
-from typing import Tuple, Union
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Tuple, Union
 from qtpy import QtWidgets, QtCore, QtGui
 import pyqtgraph as pg
 import numpy as np
 from pyqtgraph.graphicsItems.PlotCurveItem import PlotCurveItem
-from qimage2ndarray import array2qimage, gray2qimage
-import time
+from qimage2ndarray import array2qimage
+import threading
 from pathlib import Path
 
 
 from pymm_eventserver.data_structures import ParameterSet, PyImage
-from .event_bus import EventBus
-from .core_event_bus import CoreEventBus
-from .qt_classes import QMainWindowRestore, QWidgetRestore
-import qdarkstyle
+from .image_processing import downsample
+from .qt_classes import QMainWindowRestore, QWidgetRestore, dark_stylesheet
+
+if TYPE_CHECKING:
+    from .event_bus import EventBus
+    from .core_event_bus import CoreEventBus
 
 # import matplotlib.pyplot as plt
 
@@ -30,11 +34,18 @@ QtWidgets.QApplication.setHighDpiScaleFactorRoundingPolicy(QtCore.Qt.HighDpiScal
 class EDAMainGUI(QMainWindowRestore):
     """Assemble different Widgets to have a main window for the GUI."""
 
-    def __init__(self, event_bus: EventBus|CoreEventBus, viewer: bool = False):
-        """Set up GUI and establish communication with the EventBus."""
+    def __init__(self, event_bus: EventBus|CoreEventBus, viewer: bool = False,
+                 coalesce: bool = True):
+        """Set up GUI and establish communication with the EventBus.
+
+        With coalesce, decision parameters and images reach the plot and the viewer through a
+        GUIRelay at a fixed rate instead of one by one.
+        """
         super().__init__()
         self.setWindowTitle("Event Driven Acquisition")
         self.plot = EDAPlot()
+        self.relay = GUIRelay(event_bus) if coalesce else None
+        source = event_bus if self.relay is None else self.relay
         self.central_widget = QtWidgets.QWidget()
         self.central_widget.setLayout(QtWidgets.QHBoxLayout())
 
@@ -44,13 +55,13 @@ class EDAMainGUI(QMainWindowRestore):
         self.dock_widgets = []
         self.widgets = []
 
-        self.setStyleSheet(qdarkstyle.load_stylesheet(qt_api="pyqt5"))
+        self.setStyleSheet(dark_stylesheet())
 
         if viewer:
             self.viewer = NetworkImageViewer()
             self.add_dock_widget(self.viewer, "Viewer", 2)
-            event_bus.new_network_image.connect(self.viewer.add_network_image)
-            event_bus.new_prepared_image.connect(self.viewer.add_image)
+            source.new_prepared_image.connect(self.viewer.add_image)
+            source.new_network_image.connect(self.viewer.add_network_image)
 
         # Make docking to this window possible
         # self.dockers = QtWidgets.QDockWidget("Dockable", self)
@@ -58,7 +69,10 @@ class EDAMainGUI(QMainWindowRestore):
 
         # Establish communication between the different parts
         event_bus.acquisition_started_event.connect(self.plot._reset_plot)
-        event_bus.new_decision_parameter.connect(self.plot.add_datapoint)
+        if self.relay is None:
+            event_bus.new_decision_parameter.connect(self.plot.add_datapoint)
+        else:
+            self.relay.new_decision_parameters.connect(self.plot.add_datapoints)
         event_bus.new_parameters.connect(self.plot._set_thr_lines)
         self.event_bus = event_bus
 
@@ -75,10 +89,123 @@ class EDAMainGUI(QMainWindowRestore):
             widget.closeEvent(e)
 
 
+class GUIRelay(QtCore.QObject):
+    """Collects what the GUI shows from the EventBus and passes it on at a fixed rate.
+
+    Decision parameters are batched, of the images only the newest per stream is kept, the ones
+    that were replaced are counted in dropped. The first prepared image of an acquisition is always
+    delivered, the viewer sets itself up for the new image size with it. The slots only store and are connected directly,
+    so they run in the thread that emits and the GUI thread only works at the rate of the relay,
+    however fast the analysis is.
+    """
+
+    new_decision_parameters = QtCore.Signal(object, object, object)
+    new_prepared_image = QtCore.Signal(np.ndarray, int)
+    new_network_image = QtCore.Signal(np.ndarray, tuple)
+
+    def __init__(self, event_bus: EventBus|CoreEventBus, rate: float = 20):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.decisions = []
+        self.first_image = None
+        self.prepared_image = None
+        self.network_image = None
+        self.dropped = {"prepared_image": 0, "network_image": 0}
+        direct = QtCore.Qt.ConnectionType.DirectConnection
+        event_bus.acquisition_started_event.connect(self.reset, direct)
+        event_bus.new_decision_parameter.connect(self._add_decision, direct)
+        event_bus.new_prepared_image.connect(self._set_prepared_image, direct)
+        event_bus.new_network_image.connect(self._set_network_image, direct)
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.deliver)
+        self.timer.start(int(1000 / rate))
+
+    def _add_decision(self, y: float, x: float, timepoint: int):
+        with self.lock:
+            self.decisions.append((y, x, timepoint))
+
+    def _set_prepared_image(self, image: np.ndarray, timepoint: int):
+        with self.lock:
+            if timepoint == 0:
+                self.first_image = (image, timepoint)
+                return
+            self.dropped["prepared_image"] += self.prepared_image is not None
+            self.prepared_image = (image, timepoint)
+
+    def _set_network_image(self, image: np.ndarray, dims: tuple):
+        with self.lock:
+            self.dropped["network_image"] += self.network_image is not None
+            self.network_image = (image, dims)
+
+    def reset(self, *_):
+        """Nothing from the last acquisition should show up in the next one."""
+        with self.lock:
+            self.decisions = []
+            self.first_image = None
+            self.prepared_image = None
+            self.network_image = None
+
+    def deliver(self):
+        with self.lock:
+            decisions, self.decisions = self.decisions, []
+            first_image, self.first_image = self.first_image, None
+            prepared_image, self.prepared_image = self.prepared_image, None
+            network_image, self.network_image = self.network_image, None
+        if decisions:
+            y, x, timepoints = (np.array(column) for column in zip(*decisions))
+            self.new_decision_parameters.emit(y, x, timepoints)
+        # The image first, the viewer shows it with the network image
+        if first_image is not None:
+            self.new_prepared_image.emit(*first_image)
+        if prepared_image is not None:
+            self.new_prepared_image.emit(*prepared_image)
+        if network_image is not None:
+            self.new_network_image.emit(*network_image)
+
+
+class DataSeries:
+    """x and y values in NumPy arrays that double in size when full, so appending is O(1)."""
+
+    def __init__(self, capacity: int = 1024):
+        self._x = np.zeros(capacity)
+        self._y = np.zeros(capacity)
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:self.n]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self.n]
+
+    def append(self, x: float, y: float):
+        self.extend([x], [y])
+
+    def extend(self, x: np.ndarray, y: np.ndarray):
+        while self.n + len(x) > len(self._x):
+            self._x = np.concatenate([self._x, np.zeros_like(self._x)])
+            self._y = np.concatenate([self._y, np.zeros_like(self._y)])
+        self._x[self.n:self.n + len(x)] = x
+        self._y[self.n:self.n + len(y)] = y
+        self.n += len(x)
+
+    def clear(self):
+        self.n = 0
+
+
 class EDAPlot(pg.PlotWidget):
-    """Displays output of an analyser over time and the decision parameters of the interpreter."""
+    """Displays output of an analyser over time and the decision parameters of the interpreter.
 
-    def __init__(self, *args, **kwargs):
+    New datapoints are only stored when they arrive, the plot is redrawn at refresh_rate (Hz) if
+    there are new ones. Only the new points are added to the scatter, the line is downsampled to
+    max_points bins (minimum and maximum of each) for long acquisitions, None to plot all points.
+    """
+
+    def __init__(self, *args, refresh_rate: float = 20, max_points: int = 5000, **kwargs):
         """Initialise the main plot and the horizontal lines showing the thresholds.
 
         The lines are used to show the current parameters of a BinaryFrameRateInterpreter.
@@ -99,25 +226,55 @@ class EDAPlot(pg.PlotWidget):
         self.enableAutoRange()
         pg.setConfigOptions(antialias=True)
 
-        self.x_data = []
-        self.y_data = []
+        self.series = DataSeries()
+        self.plotted = 0
+        self.max_points = max_points
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self._refresh_plot)
+        self.refresh_timer.start(int(1000 / refresh_rate))
+
+    @property
+    def x_data(self) -> np.ndarray:
+        return self.series.x
+
+    @property
+    def y_data(self) -> np.ndarray:
+        return self.series.y
 
     @QtCore.Slot(float, float, int)
     def add_datapoint(self, y: float, x: float, _):
-        """Add a datapoint that is received from the analyser."""
-        self.x_data.append(x)
-        self.y_data.append(y)
-        self._refresh_plot()
+        """Add a datapoint that is received from the analyser, it is drawn on the next refresh."""
+        self.series.append(x, y)
+
+    def add_datapoints(self, y: np.ndarray, x: np.ndarray, _):
+        """Add a batch of datapoints, e.g. from a GUIRelay."""
+        self.series.extend(x, y)
 
     def _refresh_plot(self):
-        self.output_line.setData(self.x_data, self.y_data)
-        self.output_scatter.setData(self.x_data, self.y_data)
-        self.enableAutoRange()
+        if len(self.series) == self.plotted:
+            return
+        self.output_line.setData(*self._downsample(self.series.x, self.series.y))
+        self.output_scatter.addPoints(x=self.series.x[self.plotted:],
+                                      y=self.series.y[self.plotted:])
+        self.plotted = len(self.series)
+
+    def _downsample(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Minimum and maximum of bins of points, so that peaks stay visible."""
+        if self.max_points is None or len(x) <= self.max_points:
+            return x, y
+        size = len(x) // (self.max_points // 2)
+        n = len(x) // size * size
+        bins = y[:n].reshape(-1, size)
+        x_down = np.repeat(x[:n:size], 2)
+        y_down = np.stack([bins.min(axis=1), bins.max(axis=1)], axis=1).ravel()
+        return np.append(x_down, x[n:]), np.append(y_down, y[n:])
 
     def _reset_plot(self):
-        self.x_data = []
-        self.y_data = []
-        self._refresh_plot()
+        self.series.clear()
+        self.plotted = 0
+        self.output_line.setData([], [])
+        self.output_scatter.clear()
+        self.enableAutoRange()
 
     QtCore.Slot(ParameterSet)
     def _set_thr_lines(self, params: Union[dict, ParameterSet]):
@@ -129,8 +286,144 @@ class EDAPlot(pg.PlotWidget):
             self.thrLine2.setPos(params['upper_threshold'])
 
 
+def display_factor(scale: float) -> int:
+    """Power of 2 to downsample by to show an image at scale screen pixels per image pixel."""
+    if scale <= 0 or scale >= 1:
+        return 1
+    return 2 ** int(np.floor(np.log2(1 / scale)))
+
+
+def to_uint8(image: np.ndarray, out: np.ndarray, scratch: np.ndarray = None) -> np.ndarray:
+    """Scale the image to 0-255 by its maximum into out, without float64 temporaries.
+
+    Integer images go through a lookup table, float images through the float32 scratch buffer.
+    """
+    maximum = image.max()
+    if image.dtype.kind in "ui" and image.dtype.itemsize <= 2 and maximum >= 0:
+        lut = (np.arange(int(maximum) + 1, dtype=np.uint32) * 255 // max(int(maximum), 1))
+        np.take(lut.astype(np.uint8), np.clip(image, 0, None), out=out)
+        return out
+    if scratch is None or scratch.shape != image.shape:
+        scratch = np.empty(image.shape, np.float32)
+    np.multiply(image, np.float32(255 / maximum) if maximum > 0 else 0, out=scratch,
+                casting="unsafe")
+    np.clip(scratch, 0, 255, out=scratch)
+    np.copyto(out, scratch, casting="unsafe")
+    return out
+
+
+class OverlayRenderer(QtCore.QObject):
+    """Screen blend of a grayscale image and a false color network image in its own thread.
+
+    The blend of every pair of 8 bit values is precomputed, so rendering is two scalings to 8 bit
+    and one table lookup into a reused RGB32 buffer. Only the newest submitted pair is rendered,
+    pairs that were superseded before the thread got to them are counted in dropped. The images
+    are reduced to the display resolution first if a factor is given, the image by block mean and
+    the network image by block max to keep small events visible.
+    """
+
+    rendered = QtCore.Signal()
+
+    def __init__(self, color_lut: np.ndarray):
+        """color_lut is 256 x 3 uint8 for the network image, the image is shown in gray."""
+        super().__init__()
+        gray = np.arange(256, dtype=np.uint32)[:, None, None]
+        color = color_lut.astype(np.uint32)[None, :, :]
+        screen = gray + color - gray * color // 255
+        self.lut = (0xFF000000 | screen[..., 0] << 16 | screen[..., 1] << 8 | screen[..., 2]
+                    ).astype(np.uint32).ravel()
+        self.pending = None
+        self.dropped = 0
+        self.fresh = False
+        self.front = None
+        self.back = None
+        self.factor = 1
+        self._buffers = {}
+        self.lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="EDA Overlay", daemon=True)
+        self.thread.start()
+
+    def submit(self, image: np.ndarray, network: np.ndarray, factor: int = 1):
+        """Render this pair next, replacing one that is still waiting."""
+        with self.condition:
+            self.dropped += self.pending is not None
+            self.pending = (image, network, factor)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(1)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running:
+                    return
+                image, network, factor = self.pending
+                self.pending = None
+            try:
+                self.render(image, network, factor)
+            except Exception:
+                log.exception("Rendering the network image failed")
+                continue
+            self.rendered.emit()
+
+    def _buffer(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.zeros(shape, dtype)
+        return buffer
+
+    def render(self, image: np.ndarray, network: np.ndarray, factor: int = 1) -> np.ndarray:
+        """Blend into the back buffer and swap it to the front, the network image is put at the
+        top left of the image."""
+        image = downsample(image, factor, "mean")
+        network = downsample(network, factor, "max")
+        scratch = (self._buffer("image_scratch", image.shape, np.float32)
+                   if image.dtype.kind == "f" else None)
+        gray = to_uint8(image, self._buffer("gray", image.shape, np.uint8), scratch)
+        height, width = min(image.shape[0], network.shape[0]), min(image.shape[1], network.shape[1])
+        color = self._buffer("color", image.shape, np.uint8)
+        if network.shape != image.shape:
+            color[:] = 0
+        to_uint8(network[:height, :width], color[:height, :width],
+                 self._buffer("scratch", (height, width), np.float32))
+        index = self._buffer("index", image.shape, np.uint16)
+        np.left_shift(gray, 8, out=index, dtype=np.uint16)
+        np.bitwise_or(index, color, out=index)
+        if self.back is None or self.back.shape != image.shape:
+            self.back = np.zeros(image.shape, np.uint32)
+        np.take(self.lut, index, out=self.back)
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.factor = factor
+            self.fresh = True
+        return self.front
+
+    def to_pixmap(self) -> Tuple[QtGui.QPixmap | None, int]:
+        """The newest rendered frame and its downsampling factor, None if it was shown already."""
+        with self.lock:
+            if not self.fresh:
+                return None, self.factor
+            self.fresh = False
+            height, width = self.front.shape
+            qimage = QtGui.QImage(self.front.data, width, height, width * 4,
+                                  QtGui.QImage.Format.Format_RGB32)
+            return QtGui.QPixmap.fromImage(qimage), self.factor
+
+
 class NetworkImageViewer(QtWidgets.QGraphicsView):
-    """Display a grayscale np.ndarray."""
+    """Display a grayscale np.ndarray with the network image on top.
+
+    The overlay is rendered in the thread of an OverlayRenderer, only the upload of the finished
+    frame happens in the GUI thread. The images are rendered at the resolution they are displayed
+    at, zooming in with Ctrl + wheel renders the last images again at a higher resolution.
+    """
 
     def __init__(self):
         """Set up with the default image size and initialise with a dummy pixmap."""
@@ -145,14 +438,12 @@ class NetworkImageViewer(QtWidgets.QGraphicsView):
         self.network_image = None
         self.stacked = np.zeros((512, 512, 3), dtype=np.float16)
         self.setDragMode(QtWidgets.QGraphicsView.ScrollHandDrag)
-        self.red_lut = self.inferno_colormap()
-        self.gray_lut = [QtGui.qRgb(i, i, i) for i in range(256)]
+        self.renderer = OverlayRenderer(self.inferno_colormap())
+        self.renderer.rendered.connect(self._show_rendered)
 
-    def inferno_colormap(self, n=256):
+    def inferno_colormap(self, n=256) -> np.ndarray:
         inferno = np.genfromtxt(Path(__file__).parent / "inferno.csv", delimiter=",")[1:,1:]
-        inferno = inferno.astype(np.uint8)
-        qt_inferno = [QtGui.qRgb(color[0], color[1], color[2]) for color in inferno]
-        return qt_inferno
+        return inferno.astype(np.uint8)
 
 
     def _reset_scene_rect(self, shape: Tuple):
@@ -163,43 +454,27 @@ class NetworkImageViewer(QtWidgets.QGraphicsView):
 
     @QtCore.Slot(np.ndarray, tuple)
     def add_network_image(self, image: np.ndarray, dims: tuple):
-        """Translate the input image into a QImage and display in the scene."""
-        t0 = time.perf_counter()
+        """Hand the network image and the last image to the renderer."""
         self.network_image = image
-        # qimage = self.screen_images()
-        # self.image.setPixmap(QtGui.QPixmap.fromImage(qimage))
-
-
-        self.pixmap.fill(QtGui.QColor("transparent"))
-
-        self.painter = QtGui.QPainter()
-
-        # here the two images are drawn into the pixmap
-        self.painter.begin(self.pixmap)
-        self.painter.setCompositionMode(QtGui.QPainter.CompositionMode.CompositionMode_Screen)
-
-        norm_image = self.original_image / (np.max(self.original_image)/255)
-        norm_net_image = self.network_image / (np.max(self.network_image)/255)
+        if self.original_image is None:
+            return
+        self.renderer.submit(self.original_image, self.network_image, self.display_factor())
 
-        # choose composition mode
-        qimage_1 = gray2qimage(norm_image.astype(np.uint8))
-        qimage_2 = gray2qimage(norm_net_image.astype(np.uint8))
-        qimage_1.setColorTable(self.gray_lut)
-        qimage_2.setColorTable(self.red_lut)
-        self.painter.drawImage(0,0, qimage_1)
-        self.painter.drawImage(0,0, qimage_2)
-        self.painter.end()
-
-        self.image.setPixmap(self.pixmap)
-        log.info(f"Screening took {time.perf_counter() - t0} seconds =======")
-        log.info(f"{norm_net_image.max()}")
+    def display_factor(self) -> int:
+        return display_factor(self.transform().m11())
 
+    def _show_rendered(self):
+        pixmap, factor = self.renderer.to_pixmap()
+        if pixmap is not None:
+            self.pixmap = pixmap
+            self.image.setPixmap(self.pixmap)
+            # Keep the scene in the coordinates of the full resolution image
+            self.image.setScale(factor)
 
     @QtCore.Slot(np.ndarray, int)
     def add_image(self, image: np.ndarray, timepoint):
-        """Translate the input image into a QImage and display in the scene."""
+        """Keep the image to be shown with the next network image."""
         self.original_image = image
-        print(image.shape)
         if timepoint == 0:
             self.stacked = np.zeros(list(self.original_image.shape) + [3], dtype=np.float16)
             self._reset_scene_rect(self.original_image.shape)
@@ -225,9 +500,82 @@ class NetworkImageViewer(QtWidgets.QGraphicsView):
             factor = 1.1 if angle > 0 else 0.9
             self.scale(factor, factor)
             self.setTransformationAnchor(anchor)
+            if (self.display_factor() != self.renderer.factor and self.original_image is not None
+                    and self.network_image is not None):
+                self.renderer.submit(self.original_image, self.network_image,
+                                     self.display_factor())
         else:
             QtWidgets.QGraphicsView.wheelEvent(self, event)
 
+    def closeEvent(self, e):
+        self.renderer.stop()
+        return super().closeEvent(e)
+
+
+class PlaneStore:
+    """Growable (t, y, x) array of planes for napari, stored in chunks of chunk_size timepoints.
+
+    Memory follows the timepoints that were added, in the dtype of the planes. napari only indexes
+    the planes it shows, so adding a plane does not touch the others.
+    """
+
+    def __init__(self, plane_shape: tuple, dtype, chunk_size: int = 16):
+        self.plane_shape = tuple(plane_shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        self.n_timepoints = 0
+
+    @property
+    def shape(self) -> tuple:
+        return (self.n_timepoints, *self.plane_shape)
+
+    @property
+    def ndim(self) -> int:
+        return 1 + len(self.plane_shape)
+
+    @property
+    def size(self) -> int:
+        return int(np.prod(self.shape))
+
+    def __len__(self) -> int:
+        return self.n_timepoints
+
+    def set_plane(self, timepoint: int, plane: np.ndarray):
+        """Timepoints that were skipped stay empty and show as zeros."""
+        chunk = self.chunks.get(timepoint // self.chunk_size)
+        if chunk is None:
+            chunk = np.zeros((self.chunk_size, *self.plane_shape), self.dtype)
+            self.chunks[timepoint // self.chunk_size] = chunk
+        chunk[timepoint % self.chunk_size] = plane
+        self.n_timepoints = max(self.n_timepoints, timepoint + 1)
+
+    def plane(self, timepoint: int) -> np.ndarray:
+        chunk = self.chunks.get(timepoint // self.chunk_size)
+        if chunk is None:
+            return np.zeros(self.plane_shape, self.dtype)
+        return chunk[timepoint % self.chunk_size]
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if key and key[0] is Ellipsis:
+            key = (slice(None),) * (self.ndim - len(key) + 1) + key[1:]
+        if not key:
+            key = (slice(None),)
+        if isinstance(key[0], slice):
+            planes = [self.plane(t) for t in range(*key[0].indices(self.n_timepoints))]
+            stack = (np.stack(planes) if planes
+                     else np.zeros((0, *self.plane_shape), self.dtype))
+            return stack[(slice(None), *key[1:])]
+        timepoint = int(key[0])
+        if timepoint < 0:
+            timepoint += self.n_timepoints
+        return self.plane(timepoint)[key[1:]]
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
 
 class NapariImageViewer(QtWidgets.QWidget):
     """Simple implementation showing the output of the neural network.
@@ -237,26 +585,41 @@ class NapariImageViewer(QtWidgets.QWidget):
     is not installed with the module, so you have to install it yourself.
     """
 
-    def __init__(self):
-        """Open a napari viewer."""
+    def __init__(self, viewer=None):
+        """Open a napari viewer, or use the one (or a ViewerModel) that is passed."""
         try:
             import napari
         except:
             log.warning("Napari was most likely not installed in this environment, please install")
 
         super().__init__()
-        self.viewer = napari.Viewer()
+        self.viewer = napari.Viewer() if viewer is None else viewer
         self.layer = None
-        self.timepoints = 300
+        self.data = None
+        self.factor = 1
 
     @QtCore.Slot(np.ndarray, tuple)
     def add_network_image(self, image, dims: tuple):
-        """Add the image received to the respective layer, or make a new layer."""
+        """Add the image received to the respective layer, or make a new layer.
+
+        A new layer is fitted into the view, the images are then downsampled (block max) to the
+        resolution they are shown at. The scale of the layer keeps the full resolution coordinates.
+        The images are kept in a PlaneStore, so napari only reads the new plane when it is added.
+        """
         if dims[0] == 0 or self.layer is None:
-            self.data = np.ndarray([self.timepoints, *image.shape])
-            self.data[0, :, :] = image
-            self.layer = self.viewer.add_image(self.data)
+            # Fit the first image into the view to know the resolution it is shown at
+            self.layer = self.viewer.add_image(image[None])
+            self.viewer.reset_view()
+            # The camera moved to viewer.scene in napari 0.9
+            camera = getattr(self.viewer, "scene", self.viewer).camera
+            self.factor = display_factor(camera.zoom)
+            image = downsample(image, self.factor, "max")
+            self.data = PlaneStore(image.shape, image.dtype)
+            self.data.set_plane(dims[0], image)
+            self.layer.data = self.data
+            self.layer.scale = (1, self.factor, self.factor)
         else:
-            self.data[dims[0] :, :] = image
+            self.data.set_plane(dims[0], downsample(image, self.factor, "max"))
+            # Only the shape changed, napari slices the new plane when the point is set
             self.layer.data = self.data
-            self.viewer.dims.set_point(0, dims[0])
+        self.viewer.dims.set_point(0, dims[0])
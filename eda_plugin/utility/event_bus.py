@@ -4,12 +4,17 @@ Also handles the connection to the EventThread that receives events from Micro-M
 PythonEventServer plugin provided.
 """
 
-from qtpy.QtCore import QObject, Signal
+from __future__ import annotations
+
+from qtpy.QtCore import QCoreApplication, QObject, Signal
 from pymm_eventserver.data_structures import ParameterSet, PyImage
+from eda_plugin.utility.frame_ring import FrameRing
 
-from pymm_eventserver.event_thread import EventThread
 import numpy as np
-from typing import Union, List
+from typing import TYPE_CHECKING, Union, List
+
+if TYPE_CHECKING:
+    from pymm_eventserver.event_thread import EventThread
 
 
 class EventBus(QObject):
@@ -24,23 +29,39 @@ class EventBus(QObject):
     acquisition_started_event = Signal(object)
     acquisition_ended_event = Signal(object)
     new_image_event = Signal(PyImage)
+    new_frame_event = Signal(int, object)
     mda_settings_event = Signal(object)
     configuration_settings_event = Signal(str, str, str)
     exposure_changed_event = Signal(str, str, str)
 
     # Analyser Events
     new_decision_parameter = Signal(float, float, int)
+    new_stage_times = Signal(int, object)
     new_output_shape = Signal(tuple)
     new_network_image = Signal(np.ndarray, tuple)
     new_prepared_image = Signal(np.ndarray, int)
+    new_mask_event = Signal(np.ndarray)
 
     # Magellan Events
     new_magellan_settings = Signal(dict)
 
-    def __init__(self, event_thread: EventThread = EventThread,
-                 subscribe_to: Union[str, List] = "all"):
-        """Connect to Micro-Manager using the EventThread. Pass these signals through to subs."""
+    def __init__(self, event_thread: EventThread = None,
+                 subscribe_to: Union[str, List] = "all", frame_ring_slots: int = 0):
+        """Connect to Micro-Manager using the EventThread. Pass these signals through to subs.
+
+        With frame_ring_slots > 0, incoming images are also put into a shared FrameRing and
+        announced by slot index in new_frame_event.
+        """
         super().__init__()
+        self.frame_ring = FrameRing(frame_ring_slots) if frame_ring_slots else None
+        if self.frame_ring is not None and QCoreApplication.instance() is not None:
+            QCoreApplication.instance().aboutToQuit.connect(self.close)
+        # For components that are created after the interpreter has sent its first interval
+        self.last_interpretation = None
+        self.new_interpretation.connect(self._remember_interpretation)
+        if event_thread is None:
+            # pycromanager/zmq are only loaded once an EventBus is actually started
+            from pymm_eventserver.event_thread import EventThread as event_thread
         if subscribe_to == "all":
             topics = ["StandardEvent", "GUIRefreshEvent", "Acquisition", "GUI", "Settings",
                       "NewImage"]
@@ -53,6 +74,8 @@ class EventBus(QObject):
         self.event_thread.listener.acquisition_started_event.connect(self.acquisition_started_event)
         self.event_thread.listener.acquisition_ended_event.connect(self.acquisition_ended_event)
         self.event_thread.listener.new_image_event.connect(self.new_image_event)
+        if self.frame_ring is not None:
+            self.new_image_event.connect(self.publish_frame)
 
         self.event_thread.listener.mda_settings_event.connect(self.mda_settings_event)
         self.event_thread.listener.configuration_settings_event.connect(
@@ -64,9 +87,22 @@ class EventBus(QObject):
         print("EventBus ready")
         # self.mda_settings_event.emit(settings)
 
+    def _remember_interpretation(self, interpretation: float):
+        self.last_interpretation = interpretation
+
+    def publish_frame(self, image: PyImage):
+        """Copy the image into the frame ring and announce its slot to the ring consumers."""
+        self.new_frame_event.emit(*self.frame_ring.publish(image))
+
+    def close(self):
+        """Free the shared memory of the frame ring."""
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+
 
 def main():
     import time
+    from pymm_eventserver.event_thread import EventThread
 
     thread = EventThread
     bus = EventBus(thread)
@@ -0,0 +1,205 @@
+"""Fixed set of shared memory slots that frames from the event source are written to.
+
+The event buses copy each incoming frame once into a free slot and emit new_frame_event with the
+slot index and the metadata of the image (a PyImage without raw_image). Subscribers get a
+zero-copy, read-only view of the slot with FrameRing.view and hand it back with release, or use
+the image context manager that gives the PyImage with the view as raw_image:
+
+    ring = event_bus.frame_ring
+    ring.register_consumer()
+    ...
+    @QtCore.Slot(int, object)
+    def new_frame(self, slot, image):
+        with ring.image(slot, image) as py_image:
+            self.analyse(py_image.raw_image)
+
+A slot is only written to again when all registered consumers have released it. If all slots are
+still in use, the frame is not put into the ring but passed on with slot -1 and its raw_image, so
+slow consumers don't lose frames. These are counted in FrameRing.dropped. The ImageAnalyser and
+the Writer use the ring when the event bus has one, the buses close it with the application.
+
+The frames live in multiprocessing.shared_memory, so other processes can map the same slots using
+FrameRing.attach(ring.spec()). The bookkeeping of the slot lifetimes stays in the owning process.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+from dataclasses import replace
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+from pymm_eventserver.data_structures import PyImage
+
+log = logging.getLogger("EDA")
+
+
+class FrameRing:
+    """Ring of n_slots equally sized frame buffers in shared memory with per slot reference counts.
+
+    The buffers are allocated for the first frame that is put into the ring, or when the frame
+    shape (camera ROI) or dtype changes and no slot is in use anymore.
+    """
+
+    def __init__(self, n_slots: int = 8, shape: tuple = None, dtype=np.uint16):
+        """Set up the bookkeeping, allocate the shared memory if the frame shape is known."""
+        self.n_slots = n_slots
+        self.n_consumers = 0
+        self.dropped = 0
+        self.shape = None
+        self.dtype = None
+        self.frames = None
+        self._shm = None
+        self._owner = True
+        self._next = 0
+        self._refcount = np.zeros(n_slots, dtype=np.int32)
+        self._lock = threading.Lock()
+        self.closed = False
+        if shape is not None:
+            self.allocate(shape, dtype)
+
+    @classmethod
+    def attach(cls, spec: dict) -> FrameRing:
+        """Map the slots of an existing ring, e.g. in another process, using FrameRing.spec()."""
+        ring = cls(spec["n_slots"])
+        ring._owner = False
+        ring._shm = shared_memory.SharedMemory(name=spec["name"])
+        ring._map(tuple(spec["shape"]), np.dtype(spec["dtype"]))
+        return ring
+
+    def spec(self) -> dict:
+        """Everything that is needed to attach to this ring from another process."""
+        return {"name": self._shm.name, "n_slots": self.n_slots, "shape": self.shape,
+                "dtype": np.dtype(self.dtype).str}
+
+    def allocate(self, shape: tuple, dtype=np.uint16):
+        """(Re)allocate the shared memory for frames of the given shape and dtype."""
+        if self._refcount.any():
+            raise RuntimeError("Can't reallocate the frame ring while slots are in use")
+        self._free()
+        dtype = np.dtype(dtype)
+        nbytes = max(1, self.n_slots * int(np.prod(shape)) * dtype.itemsize)
+        self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._owner = True
+        self._map(tuple(shape), dtype)
+        log.info(f"Frame ring allocated: {self.n_slots} slots of {shape} {dtype}")
+
+    def _map(self, shape: tuple, dtype: np.dtype):
+        self.shape = shape
+        self.dtype = dtype
+        self.frames = np.ndarray((self.n_slots, *shape), dtype=dtype, buffer=self._shm.buf)
+        self._next = 0
+
+    def register_consumer(self):
+        """Subscribers that read slots have to register, each of them has to release every slot."""
+        with self._lock:
+            self.n_consumers += 1
+
+    def unregister_consumer(self):
+        """Stop waiting for this consumer for frames that are put into the ring from now on."""
+        with self._lock:
+            self.n_consumers = max(0, self.n_consumers - 1)
+
+    def put(self, image: np.ndarray) -> Optional[int]:
+        """Copy the image into the next free slot and return its index, None if the ring is full."""
+        with self._lock:
+            if self.closed:
+                return None
+            if self.frames is None or image.shape != self.shape or image.dtype != self.dtype:
+                if self._refcount.any():
+                    log.warning("Frame shape changed while slots are in use, dropping frame")
+                    self.dropped += 1
+                    return None
+                self.allocate(image.shape, image.dtype)
+            slot = self._free_slot()
+            if slot is None:
+                self.dropped += 1
+                log.warning(f"All {self.n_slots} frame ring slots in use, frame not in the ring")
+                return None
+            self.frames[slot] = image
+            self._refcount[slot] = self.n_consumers
+            self._next = (slot + 1) % self.n_slots
+            return slot
+
+    def _free_slot(self) -> Optional[int]:
+        for offset in range(self.n_slots):
+            slot = (self._next + offset) % self.n_slots
+            if self._refcount[slot] == 0:
+                return slot
+        return None
+
+    def view(self, slot: int) -> np.ndarray:
+        """Read-only view of the frame in the slot, valid until the slot is released."""
+        frame = self.frames[slot]
+        frame.flags.writeable = False
+        return frame
+
+    def release(self, slot: int):
+        """The calling consumer is done with the slot."""
+        with self._lock:
+            if self._refcount[slot] > 0:
+                self._refcount[slot] -= 1
+            if self.closed and not self._refcount.any():
+                self._free()
+
+    def in_use(self, slot: int) -> bool:
+        """Is the slot still waiting to be released by any consumer."""
+        return bool(self._refcount[slot])
+
+    @contextlib.contextmanager
+    def borrow(self, slot: int):
+        """Give a view of the slot and release it afterwards."""
+        try:
+            yield self.view(slot)
+        finally:
+            self.release(slot)
+
+    @contextlib.contextmanager
+    def image(self, slot: int, image: PyImage):
+        """Give the PyImage from new_frame_event with the frame of the slot and release it after."""
+        if slot < 0:
+            yield image
+            return
+        with self.borrow(slot) as frame:
+            yield replace(image, raw_image=frame)
+
+    def publish(self, image: PyImage) -> tuple:
+        """Put the raw_image of a PyImage into the ring.
+
+        Returns the slot and the PyImage without raw_image to be passed on in new_frame_event. If
+        there was no free slot, it is -1 and the PyImage is passed on as it is.
+        """
+        slot = self.put(np.asarray(image.raw_image))
+        if slot is None:
+            return -1, image
+        return slot, replace(image, raw_image=None)
+
+    def close(self):
+        """Release the shared memory, unlink it if this ring created it.
+
+        Slots that are still in use, e.g. frames queued in the Writer, stay mapped until the last
+        of them is released. No new frames are put into the ring.
+        """
+        with self._lock:
+            self.closed = True
+            if self._shm is not None and self._owner:
+                self._shm.unlink()
+                self._owner = False
+            if not self._refcount.any():
+                self._free()
+
+    def _free(self):
+        if self._shm is None:
+            return
+        self.frames = None
+        if self._owner:
+            self._shm.unlink()
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views of old frames are still around, the memory is freed with the last of them
+            log.debug("Frame ring closed while views of its frames still exist")
+        self._shm = None
@@ -0,0 +1,103 @@
+"""Assemble an EDA loop without any Qt widgets from a configuration file.
+
+This is used by examples.main.headless to run analysis-only nodes or benchmarks on machines without
+a display. Only a QCoreApplication is needed for the signals between the components. All components
+are constructed with gui=False and get their settings from the configuration instead. Example
+configuration:
+
+    {
+        "event_bus": "core",
+        "mm_config": null,
+        "mda": {"channels": ["DAPI", "FITC"], "time_plan": {"interval": 1, "loops": 20}},
+        "actuator": {"class": "eda_plugin.actuators.pymmc.CoreActuator"},
+        "analyser": {"class": "eda_plugin.analysers.image.ImageAnalyser",
+                     "kwargs": {"analyser_settings": {"n_timepoints": 1}}},
+        "interpreter": {"class": "eda_plugin.interpreters.frame_rate.BinaryFrameRateInterpreter",
+                        "kwargs": {"params": {"slow_interval": 5, "fast_interval": 1,
+                                              "lower_threshold": 80, "upper_threshold": 100}}},
+        "writer": {"class": "eda_plugin.utility.writers.Writer",
+                   "kwargs": {"options": {"path": "./data"}}}
+    }
+
+Components that are not in the configuration are not started. "event_bus" can also be
+"micro_manager" to use the EventBus connected to the PythonEventServer in Micro-Manager, or
+"synthetic" to get the frames from a SyntheticCore instead of a camera, set up by an additional
+"synthetic" entry, e.g. {"fps": 200, "shape": [1024, 1024], "event_times": [20, 50]}. With
+"frame_ring_slots", e.g. 8, the event bus passes the frames to the analyser and the writer through
+a FrameRing in shared memory instead of copies.
+"""
+
+import importlib
+import json
+import logging
+
+log = logging.getLogger("EDA")
+
+COMPONENTS = ["actuator", "analyser", "interpreter", "writer"]
+
+
+def load_config(config_file: str) -> dict:
+    """Read the json configuration file for a headless EDA loop."""
+    with open(config_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def import_from_string(path: str):
+    """Get a class from its import path, e.g. eda_plugin.analysers.image.ImageAnalyser."""
+    module, name = path.rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)
+
+
+def build_pipeline(config: dict, event_bus=None) -> dict:
+    """Construct the event bus and the components defined in the config without GUIs.
+
+    An existing event_bus can be passed in, e.g. for testing. Returns a dict with the event_bus and
+    all the components that were started.
+    """
+    pipeline = {"event_bus": make_event_bus(config) if event_bus is None else event_bus}
+    for component in COMPONENTS:
+        if component not in config:
+            continue
+        component_class = import_from_string(config[component]["class"])
+        kwargs = config[component].get("kwargs", {})
+        pipeline[component] = component_class(pipeline["event_bus"], gui=False, **kwargs)
+        log.info(f"Headless {component}: {component_class.__name__}")
+
+    if "mda" in config:
+        set_mda_settings(pipeline["event_bus"], config["mda"])
+    return pipeline
+
+
+def make_event_bus(config: dict):
+    """Start the event bus as given in the config, pymmcore-plus based by default."""
+    if config.get("event_bus", "core") == "micro_manager":
+        from eda_plugin.utility.event_bus import EventBus
+
+        return EventBus(frame_ring_slots=config.get("frame_ring_slots", 0))
+
+    from eda_plugin.utility.core_event_bus import CoreEventBus
+
+    if config.get("event_bus") == "synthetic":
+        from eda_plugin.utility.synthetic_camera import SyntheticCore
+
+        return CoreEventBus(SyntheticCore.from_config(config.get("synthetic", {})),
+                            frame_ring_slots=config.get("frame_ring_slots", 0))
+
+    from pymmcore_plus import CMMCorePlus
+
+    mmcore = CMMCorePlus.instance()
+    if config.get("mm_config") is None:
+        mmcore.loadSystemConfiguration()
+    else:
+        mmcore.loadSystemConfiguration(config["mm_config"])
+    return CoreEventBus(mmcore, frame_ring_slots=config.get("frame_ring_slots", 0))
+
+
+def set_mda_settings(event_bus, mda: dict):
+    """Distribute the MDA settings that would otherwise come from the MDA GUI."""
+    from useq import MDASequence
+
+    sequence = MDASequence(**mda)
+    event_bus.translate_mda_settings(sequence)
+    event_bus.useq_settings_event.emit(sequence)
+    return sequence
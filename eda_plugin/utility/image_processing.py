@@ -1,9 +1,20 @@
-"""Image processing/preparation functions used in examples.keras."""
+"""Image processing/preparation functions used in examples.keras, the writer and the viewers."""
 import itertools
 import numpy as np
 from skimage import exposure, filters, transform
 
 
+def downsample(plane: np.ndarray, factor: int = 2, method: str = "mean") -> np.ndarray:
+    """Mean or max of factor x factor blocks, an incomplete last row or column is dropped."""
+    if factor == 1:
+        return plane
+    height, width = plane.shape[0] // factor, plane.shape[1] // factor
+    blocks = plane[:height * factor, :width * factor].reshape(height, factor, width, factor)
+    if method == "max":
+        return blocks.max(axis=(1, 3))
+    return blocks.mean(axis=(1, 3), dtype=np.float32).astype(plane.dtype)
+
+
 def stitchImage(data, positions, channel=0):
     """Stitch an image back together that has been tiled by prepareNNImages."""
     stitch = positions["stitch"]
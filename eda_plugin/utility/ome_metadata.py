@@ -2,8 +2,10 @@
 import ome_types
 import numpy as np
 from datetime import datetime
+import io
 import json
-from typing import List
+import re
+from typing import List, TextIO
 from pymm_eventserver.data_structures import MMSettings, PyImage, MMChannel
 from ome_types.model import simple_types
 
@@ -11,6 +13,10 @@ from ome_types.model import simple_types
 ome_model = ome_types.model
 COLORS = ["white", "magenta", "green", "blue"]
 ACQ_ORDER_MODES = ['XYCZT', 'XYZCT']
+# Per plane values that are kept in columns, the ifd is the row
+PLANE_COLUMNS = {"c": "i4", "z": "i4", "t": "i4", "delta_t": "f8", "exposure": "f8"}
+# More planes than this are only written to the plane table, not into the XML
+XML_PLANE_LIMIT = 100_000
 
 class OME:
     """OME Metadata class based on ome_types
@@ -36,44 +42,42 @@ class OME:
         self.acquisition_date = datetime.now()
         self.image_size = [0, 0]
         self.max_indices = [1, 1, 1]
-        self.planes = []
-        self.tiff_data = []
+        # Planes are only turned into XML at the end, see write_xml
+        n_planes = 1024
+        if settings is not None and settings.timepoints:
+            n_planes = min(settings.timepoints * settings.n_channels * settings.n_slices, 2**20)
+        self.plane_table = {name: np.zeros(max(1, n_planes), dtype)
+                            for name, dtype in PLANE_COLUMNS.items()}
+        self.n_planes = 0
 
     def add_plane_from_image(self, image: PyImage):
-        """The units are hardcoded for now."""
-        plane = ome_model.Plane(
-            exposure_time=self.internal_channels[image.channel - 1]["exposure"],
-            exposure_time_unit="ms",
-            the_c=image.channel,
-            the_z=image.z_slice,
-            the_t=image.timepoint,
-            delta_t=image.time,
-            delta_t_unit="ms",
-            position_x=0.0,
-            position_x_unit="µm",
-            position_y=0.0,
-            position_y_unit="µm",
-            position_z=0.0,
-            position_z_unit="µm",
-        )
-        tiff = ome_model.TiffData(
-            first_c=image.channel,
-            first_t=image.timepoint,
-            first_z=image.z_slice,
-            ifd=len(self.planes),
-            plane_count=1,
-        )
+        """Store the values of the plane in the plane table. The units are hardcoded for now."""
+        if self.n_planes == len(self.plane_table["t"]):
+            for name, column in self.plane_table.items():
+                self.plane_table[name] = np.concatenate([column, np.zeros_like(column)])
+        row = self.n_planes
+        self.plane_table["c"][row] = image.channel
+        self.plane_table["z"][row] = image.z_slice
+        self.plane_table["t"][row] = image.timepoint
+        self.plane_table["delta_t"][row] = image.time
+        self.plane_table["exposure"][row] = self.internal_channels[image.channel - 1]["exposure"]
+        self.n_planes += 1
         self.image_size = image.raw_image.shape
         self.max_indices = [
             max(self.max_indices[0], image.channel + 1),
             max(self.max_indices[1], image.timepoint + 1),
             max(self.max_indices[2], image.z_slice + 1),
         ]
-        self.planes.append(plane)
-        self.tiff_data.append(tiff)
+
+    def planes(self) -> dict:
+        """The columns of the plane table for the planes received so far."""
+        return {name: column[:self.n_planes] for name, column in self.plane_table.items()}
 
     def finalize_metadata(self):
-        """No more images to be expected, set the values for all images received so far."""
+        """No more images to be expected, set the values for all images received so far.
+
+        The planes are not part of the ome_types model, use to_xml or write_xml to get them.
+        """
         pixels = self.pixels_after_acqusition()
         images = [
             ome_model.Image(id="Image:0", pixels=pixels, acquisition_date=self.acquisition_date)
@@ -103,11 +107,53 @@ class OME:
             physical_size_z=0.5,
             physical_size_z_unit=simple_types.UnitsLength("µm"),
             channels=self.channels,
-            planes=self.planes,
-            tiff_data_blocks=self.tiff_data,
         )
         return pixels
 
+    def write_xml(self, file: TextIO, planes: bool = None):
+        """Stream the OME-XML to an open file, the planes are formatted in blocks from the table.
+
+        By default, the planes are left out if there are more than XML_PLANE_LIMIT.
+        """
+        if planes is None:
+            planes = self.n_planes <= XML_PLANE_LIMIT
+        self.finalize_metadata()
+        xml = self.ome.to_xml()
+        # Make sure the Pixels element has a closing tag to put the planes before, whatever the
+        # indentation and namespace prefix of the serializer
+        xml = re.sub(r"<((?:[\w.-]+:)?Pixels)\b([^>]*?)\s*/>", r"<\1\2>\n</\1>", xml, count=1)
+        closing = re.search(r"[ \t]*</([\w.-]+:)?Pixels\s*>", xml)
+        file.write(xml[:closing.start()])
+        if planes:
+            self._write_planes(file, prefix=closing.group(1) or "")
+        file.write(xml[closing.start():])
+
+    def _write_planes(self, file: TextIO, block_size: int = 10_000, prefix: str = ""):
+        """TiffData and then Plane elements, as the schema wants them, with the namespace prefix
+        of the Pixels element."""
+        table = self.planes()
+        for start in range(0, self.n_planes, block_size):
+            rows = range(start, min(start + block_size, self.n_planes))
+            file.write("".join(
+                f'      <{prefix}TiffData IFD="{ifd}" FirstZ="{table["z"][ifd]}" '
+                f'FirstT="{table["t"][ifd]}" FirstC="{table["c"][ifd]}" PlaneCount="1"/>\n'
+                for ifd in rows))
+        for start in range(0, self.n_planes, block_size):
+            rows = range(start, min(start + block_size, self.n_planes))
+            file.write("".join(
+                f'      <{prefix}Plane TheZ="{table["z"][ifd]}" TheT="{table["t"][ifd]}" '
+                f'TheC="{table["c"][ifd]}" DeltaT="{float(table["delta_t"][ifd])}" '
+                f'DeltaTUnit="ms" ExposureTime="{float(table["exposure"][ifd])}" '
+                f'ExposureTimeUnit="ms" PositionX="0.0" PositionXUnit="µm" PositionY="0.0" '
+                f'PositionYUnit="µm" PositionZ="0.0" PositionZUnit="µm"/>\n'
+                for ifd in rows))
+
+    def to_xml(self, planes: bool = None) -> str:
+        """The OME-XML as a string, see write_xml."""
+        xml = io.StringIO()
+        self.write_xml(xml, planes)
+        return xml.getvalue()
+
     def init_from_settings(self, settings: MMSettings):
         """Initialize OME from MMSettings translated from Micro-Manager settings from java."""
         self.settings = settings
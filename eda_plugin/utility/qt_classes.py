@@ -1,8 +1,18 @@
 """Customized Qt classes for overall GUI behaviour."""
 
+from functools import lru_cache
+
 from qtpy import QtWidgets, QtCore
 
 
+@lru_cache(maxsize=None)
+def dark_stylesheet() -> str:
+    """Load the qdarkstyle stylesheet once and share it between all widgets."""
+    import qdarkstyle
+
+    return qdarkstyle.load_stylesheet(qt_api="pyqt5")
+
+
 class QMainWindowRestore(QtWidgets.QMainWindow):
     """QMainWindow that saves its last position to the registry and loads it when opened again.
 
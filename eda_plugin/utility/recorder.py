@@ -0,0 +1,251 @@
+"""Record the events on an event bus to disk and play them back later.
+
+The EventRecorder subscribes to the image, settings, acquisition and interpretation events of an
+EventBus or CoreEventBus. Images are appended to a raw chunk file (frames.bin), all events with
+their time since the start of the recording go to a small log (events.jsonl). The EventPlayer
+memory maps the frames and emits the events into another event bus in the same order, in real
+time, faster or as fast as possible. This way analysers and writers can be tested and benchmarked
+on recorded acquisitions on any machine, without Micro-Manager.
+
+    recorder = EventRecorder(event_bus, "recordings/run_01")
+    ...
+    recorder.close()
+
+    player = EventPlayer("recordings/run_01")
+    player.play(other_event_bus, speed=10)
+
+The java objects that Micro-Manager sends with acquisition_started_event can't be saved. Their
+MMSettings are kept instead, with the save path of the datastore, and replayed as the event. The
+Writer opens its store from these like from the java event. useq MDASequences from pymmcore-plus
+are saved and replayed as they are.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from pymm_eventserver.data_structures import MMSettings, PyImage
+from qtpy.QtCore import QObject, Signal, Slot
+
+log = logging.getLogger("EDA")
+
+FRAMES_FILE = "frames.bin"
+EVENTS_FILE = "events.jsonl"
+FORMAT_VERSION = 1
+
+
+class EventRecorder(QObject):
+    """Write the events of an event bus with timestamps to a folder."""
+
+    def __init__(self, event_bus, path: str):
+        """Open the files and subscribe to the events that should be recorded."""
+        super().__init__()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.frames_file = open(os.path.join(path, FRAMES_FILE), "wb")
+        self.events_file = open(os.path.join(path, EVENTS_FILE), "w", encoding="utf-8")
+        self.offset = 0
+        self.n_frames = 0
+        self.start = time.perf_counter()
+        self._write({"event": "header", "version": FORMAT_VERSION})
+
+        self.event_bus = event_bus
+        event_bus.new_image_event.connect(self.record_image)
+        event_bus.mda_settings_event.connect(self.record_settings)
+        event_bus.acquisition_started_event.connect(self.record_acquisition_started)
+        event_bus.acquisition_ended_event.connect(self.record_acquisition_ended)
+        event_bus.new_interpretation.connect(self.record_interpretation)
+
+    @Slot(PyImage)
+    def record_image(self, image: PyImage):
+        """Append the raw frame to the chunk file and note where it can be found."""
+        frame = np.ascontiguousarray(image.raw_image)
+        frame.tofile(self.frames_file)
+        self._write({"event": "image", "offset": self.offset, "shape": frame.shape,
+                     "dtype": frame.dtype.str, "timepoint": image.timepoint,
+                     "channel": image.channel, "z_slice": image.z_slice, "time": image.time,
+                     "metadata": _jsonable(image.metadata, {})})
+        self.offset += frame.nbytes
+        self.n_frames += 1
+
+    @Slot(object)
+    def record_settings(self, settings: MMSettings):
+        """Keep all the settings that don't depend on java objects."""
+        self._write({"event": "mda_settings", "settings": settings_to_dict(settings)})
+
+    @Slot(object)
+    def record_acquisition_started(self, event):
+        """Save the MDASequence for pymmcore-plus acquisitions, the MMSettings for Micro-Manager."""
+        sequence, settings = None, None
+        if hasattr(event, "get_settings"):
+            mm_settings = MMSettings(event.get_settings())
+            mm_settings.save_path = _jsonable(event.get_datastore().get_save_path(), None)
+            settings = settings_to_dict(mm_settings)
+        elif hasattr(event, "model_dump_json"):
+            sequence = event.model_dump_json()
+        self._write({"event": "acquisition_started", "sequence": sequence,
+                     "settings": settings})
+
+    @Slot(object)
+    def record_acquisition_ended(self, _):
+        """Note the end, also flushes the files to have a usable recording at this point."""
+        self._write({"event": "acquisition_ended"})
+        self.flush()
+
+    @Slot(float)
+    def record_interpretation(self, value: float):
+        """Interpretations are kept to compare them to the ones of a replay."""
+        self._write({"event": "interpretation", "value": value})
+
+    def flush(self):
+        self.frames_file.flush()
+        self.events_file.flush()
+
+    def close(self):
+        """Stop recording and close the files."""
+        for signal, slot in [(self.event_bus.new_image_event, self.record_image),
+                             (self.event_bus.mda_settings_event, self.record_settings),
+                             (self.event_bus.acquisition_started_event,
+                              self.record_acquisition_started),
+                             (self.event_bus.acquisition_ended_event,
+                              self.record_acquisition_ended),
+                             (self.event_bus.new_interpretation, self.record_interpretation)]:
+            signal.disconnect(slot)
+        self.frames_file.close()
+        self.events_file.close()
+        log.info(f"Recorded {self.n_frames} frames to {self.path}")
+
+    def _write(self, entry: dict):
+        entry["t"] = time.perf_counter() - self.start
+        self.events_file.write(json.dumps(entry) + "\n")
+
+
+class EventPlayer(QObject):
+    """Emit recorded events into an event bus."""
+
+    finished = Signal()
+
+    def __init__(self, path: str):
+        """Read the event log and memory map the frames."""
+        super().__init__()
+        self.path = path
+        with open(os.path.join(path, EVENTS_FILE), "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        header = entries.pop(0)
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unknown recording format {header.get('version')} in {path}")
+        self.events = entries
+        self.interpretations = [e["value"] for e in entries if e["event"] == "interpretation"]
+        frames_path = os.path.join(path, FRAMES_FILE)
+        if os.path.getsize(frames_path) > 0:
+            self.frames = np.memmap(frames_path, dtype=np.uint8, mode="r")
+        else:
+            self.frames = np.zeros(0, dtype=np.uint8)
+        self.thread = None
+        self._stop = threading.Event()
+
+    @property
+    def n_frames(self) -> int:
+        return sum(1 for entry in self.events if entry["event"] == "image")
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1]["t"] - self.events[0]["t"] if self.events else 0.
+
+    def frame(self, entry: dict) -> np.ndarray:
+        """Zero-copy view of a recorded frame."""
+        dtype = np.dtype(entry["dtype"])
+        size = int(np.prod(entry["shape"])) * dtype.itemsize
+        data = self.frames[entry["offset"]: entry["offset"] + size]
+        return data.view(dtype).reshape(entry["shape"])
+
+    def play(self, event_bus, speed: float = 1., interpretations: bool = False,
+             block: bool = False):
+        """Emit the recorded events into the event bus.
+
+        speed is relative to the recording, 0 emits all events as fast as possible. The recorded
+        interpretations are only emitted if asked for, normally the replay should produce its own.
+        Playback runs in its own thread like a camera would, unless block is set.
+        """
+        self._stop.clear()
+        if block:
+            self._play(event_bus, speed, interpretations)
+            return
+        self.thread = threading.Thread(target=self._play,
+                                       args=(event_bus, speed, interpretations), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop a running playback."""
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _play(self, event_bus, speed: float, interpretations: bool):
+        start = time.perf_counter()
+        t_first = self.events[0]["t"] if self.events else 0.
+        for entry in self.events:
+            if self._stop.is_set():
+                break
+            if speed:
+                delay = (entry["t"] - t_first) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            self._emit(event_bus, entry, interpretations)
+        self.finished.emit()
+
+    def _emit(self, event_bus, entry: dict, interpretations: bool):
+        if entry["event"] == "image":
+            event_bus.new_image_event.emit(PyImage(self.frame(entry), entry["metadata"],
+                                                   entry["timepoint"], entry["channel"],
+                                                   entry["z_slice"], entry["time"]))
+        elif entry["event"] == "mda_settings":
+            event_bus.mda_settings_event.emit(settings_from_dict(entry["settings"]))
+        elif entry["event"] == "acquisition_started":
+            if entry.get("settings") is not None:
+                event_bus.acquisition_started_event.emit(settings_from_dict(entry["settings"]))
+            else:
+                event_bus.acquisition_started_event.emit(_sequence(entry["sequence"]))
+        elif entry["event"] == "acquisition_ended":
+            event_bus.acquisition_ended_event.emit(None)
+        elif entry["event"] == "interpretation" and interpretations:
+            event_bus.new_interpretation.emit(entry["value"])
+
+
+def settings_to_dict(settings: MMSettings) -> dict:
+    """MMSettings without the fields that can't be saved to json (java objects and such)."""
+    values = {}
+    for settings_field in dataclasses.fields(settings):
+        value = _jsonable(getattr(settings, settings_field.name), None)
+        if value is not None:
+            values[settings_field.name] = value
+    return values
+
+
+def settings_from_dict(values: dict) -> MMSettings:
+    settings = MMSettings()
+    for key, value in values.items():
+        setattr(settings, key, value)
+    return settings
+
+
+def _jsonable(value, default):
+    try:
+        json.dumps(value)
+        return value
+    except (TypeError, ValueError):
+        return default
+
+
+def _sequence(sequence_json: str):
+    if sequence_json is None:
+        return None
+    from useq import MDASequence
+
+    return MDASequence.model_validate_json(sequence_json)
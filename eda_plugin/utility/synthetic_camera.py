@@ -0,0 +1,224 @@
+"""Synthetic camera that can replace pymmcore-plus as the source of frames for the CoreEventBus.
+
+SyntheticCore has the parts of CMMCorePlus that the CoreEventBus and the CoreActuator use
+(mda.events.frameReady/sequenceStarted/sequenceFinished, events.propertyChanged and run_mda). It
+runs the MDAEvents it gets in its own thread, like pymmcore-plus, but takes the frames from a
+frame source at up to a target frame rate:
+
+    BlobFrames: procedurally generated blobs on a noisy background. At the scheduled event_times a
+        bright blob grows in the images, for the analysers to find.
+    StackFrames: frames from an array, e.g. a memory mapped TIFF or a zarr array.
+
+This way the full EDA loop can be run without a microscope and be pushed to find the maximum frame
+rate it can sustain:
+
+    core = SyntheticCore(BlobFrames((1024, 1024), event_times=[20, 50]), fps=200)
+    event_bus = CoreEventBus(core)
+    actuator = CoreActuator(event_bus)
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
+from qtpy.QtCore import QObject, Signal
+
+if TYPE_CHECKING:
+    from useq import MDAEvent, MDASequence
+
+log = logging.getLogger("EDA")
+
+
+class BlobFrames:
+    """Gaussian blobs on a noisy background, with events that appear at scheduled timepoints."""
+
+    def __init__(self, shape: tuple = (512, 512), n_blobs: int = 20, event_times: list = None,
+                 event_duration: int = 5, event_position: tuple = None, n_backgrounds: int = 8,
+                 seed: int = 0):
+        """Precompute the background frames, so generating a frame is just a copy and an event."""
+        rng = np.random.default_rng(seed)
+        self.shape = tuple(shape)
+        self.event_times = [] if event_times is None else list(event_times)
+        self.event_duration = event_duration
+        self.event_position = (self.shape[0] // 2, self.shape[1] // 2) if event_position is None \
+            else tuple(event_position)
+
+        static = np.full(self.shape, 100.)
+        for y, x in zip(rng.integers(0, self.shape[0], n_blobs),
+                        rng.integers(0, self.shape[1], n_blobs)):
+            self._add_blob(static, (y, x), rng.uniform(200, 1000), rng.uniform(3, 10))
+        self.backgrounds = [rng.poisson(static).astype(np.uint16) for _ in range(n_backgrounds)]
+        self.event_blob = np.zeros(self.shape)
+        self._add_blob(self.event_blob, self.event_position, 3000, 8)
+
+    @staticmethod
+    def _add_blob(image: np.ndarray, position: tuple, amplitude: float, sigma: float):
+        y0, x0 = position
+        radius = int(3 * sigma)
+        ys = slice(max(0, y0 - radius), min(image.shape[0], y0 + radius + 1))
+        xs = slice(max(0, x0 - radius), min(image.shape[1], x0 + radius + 1))
+        y, x = np.ogrid[ys, xs]
+        image[ys, xs] += amplitude * np.exp(-((y - y0) ** 2 + (x - x0) ** 2) / (2 * sigma ** 2))
+
+    def event_strength(self, timepoint: int) -> float:
+        """Between 0 and 1, ramps up over event_duration timepoints after each event time."""
+        strength = 0.
+        for event_time in self.event_times:
+            if event_time <= timepoint < event_time + self.event_duration:
+                strength = max(strength, (timepoint - event_time + 1) / self.event_duration)
+        return strength
+
+    def __call__(self, timepoint: int, channel: int = 0, z_slice: int = 0) -> np.ndarray:
+        index = (timepoint * 31 + channel * 7 + z_slice) % len(self.backgrounds)
+        frame = self.backgrounds[index].copy()
+        strength = self.event_strength(timepoint)
+        if strength:
+            frame += (self.event_blob * strength).astype(np.uint16)
+        return frame
+
+
+class StackFrames:
+    """Frames from an array with dimensions (t, y, x) or (t, c, z, y, x), looped in time."""
+
+    def __init__(self, data):
+        """The data is only indexed, so memory mapped arrays stay on disk."""
+        if data.ndim == 3:
+            data = data[:, None, None]
+        elif data.ndim == 4:
+            data = data[:, :, None]
+        self.data = data
+        self.shape = tuple(data.shape[-2:])
+
+    @classmethod
+    def from_file(cls, path: str, key: str = None) -> StackFrames:
+        """Memory map a TIFF file or open a zarr array (key for arrays in a zarr group)."""
+        if path.lower().endswith((".tif", ".tiff")):
+            import tifffile
+
+            try:
+                data = tifffile.memmap(path, mode="r")
+            except ValueError:
+                # Compressed or tiled files can't be memory mapped
+                log.warning(f"{path} can not be memory mapped, loading it")
+                data = tifffile.imread(path)
+        else:
+            import zarr
+
+            data = zarr.open(path, mode="r")
+            if key is not None:
+                data = data[key]
+        return cls(data)
+
+    def __call__(self, timepoint: int, channel: int = 0, z_slice: int = 0) -> np.ndarray:
+        return np.asarray(self.data[timepoint % self.data.shape[0],
+                                    channel % self.data.shape[1],
+                                    z_slice % self.data.shape[2]])
+
+
+class _MDASignals(QObject):
+    frameReady = Signal(object, object)
+    sequenceStarted = Signal(object)
+    sequenceFinished = Signal(object)
+
+
+class _CoreSignals(QObject):
+    propertyChanged = Signal(str, str, object)
+
+
+class _SyntheticMDA:
+    """The mda attribute of the core: signals and cancelling."""
+
+    def __init__(self):
+        self.events = _MDASignals()
+        self.cancelled = threading.Event()
+        self.running = False
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_running(self) -> bool:
+        return self.running
+
+
+class SyntheticCore:
+    """Stand-in for CMMCorePlus that emits frames from a frame source at up to fps."""
+
+    def __init__(self, frames=None, fps: float = 100.):
+        """fps limits the frame rate like the readout time of a camera would, 0 for no limit."""
+        self.frames = BlobFrames() if frames is None else frames
+        self.fps = fps
+        self.mda = _SyntheticMDA()
+        self.events = _CoreSignals()
+        self.frames_emitted = 0
+        self.thread = None
+        self._start = None
+        self._last = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> SyntheticCore:
+        """Build from a dict, e.g. {"fps": 200, "file": "data.tif"} or
+        {"fps": 200, "shape": [1024, 1024], "event_times": [20, 50]}."""
+        config = dict(config)
+        fps = config.pop("fps", 100.)
+        if "file" in config:
+            frames = StackFrames.from_file(config.pop("file"), config.pop("key", None))
+        else:
+            frames = BlobFrames(**config)
+        return cls(frames, fps)
+
+    @property
+    def achieved_fps(self) -> float:
+        if self.frames_emitted < 2 or self._start is None:
+            return 0.
+        return (self.frames_emitted - 1) / (self._last - self._start)
+
+    def run_mda(self, events: Iterable[MDAEvent] | MDASequence) -> threading.Thread:
+        """Run the events in a thread, like CMMCorePlus.run_mda this does not block.
+
+        For an MDASequence the min_start_time of the events is respected. Other iterables, like the
+        queue that the CoreAcquisition feeds, decide the timing themselves.
+        """
+        self.mda.cancelled.clear()
+        self.thread = threading.Thread(target=self._run, args=(events,), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def _run(self, events):
+        sequence = events if hasattr(events, "iter_events") else None
+        iterator = sequence.iter_events() if sequence is not None else iter(events)
+        if sequence is None:
+            from useq import MDASequence
+
+            # Like pymmcore-plus, other iterables are announced as an empty sequence
+            sequence = MDASequence()
+        period = 1 / self.fps if self.fps else 0.
+        self.mda.running = True
+        self.frames_emitted = 0
+        self._start = None
+        self.mda.events.sequenceStarted.emit(sequence)
+        t0 = time.perf_counter()
+        next_frame = t0
+        for event in iterator:
+            if self.mda.cancelled.is_set():
+                break
+            wait = next_frame - time.perf_counter()
+            if event.min_start_time:
+                wait = max(wait, t0 + event.min_start_time - time.perf_counter())
+            if wait > 0:
+                time.sleep(wait)
+            index = event.index
+            frame = self.frames(index.get("t", 0), index.get("c", 0), index.get("z", 0))
+            now = time.perf_counter()
+            next_frame = now + period
+            self.mda.events.frameReady.emit(frame, event)
+            self._start = now if self._start is None else self._start
+            self._last = now
+            self.frames_emitted += 1
+        self.mda.running = False
+        self.mda.events.sequenceFinished.emit(sequence)
+        log.info(f"Synthetic acquisition done: {self.frames_emitted} frames at "
+                 f"{self.achieved_fps:.1f} fps")
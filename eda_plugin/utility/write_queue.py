@@ -0,0 +1,193 @@
+"""Bounded queue and thread that do the disk writes of the Writer off the GUI thread.
+
+The Writer puts a WriteJob for every image, network image and decision parameter into the
+WriteQueue and the WriterThread works through them in order. The number of jobs holding image
+data in memory is bounded by maxsize. What happens if the queue is full is decided by the policy:
+
+    block: wait until the writer thread has made space, this slows down the EDA loop
+    drop_network: drop network images (the newest one, or the oldest queued) to make space,
+        other data blocks like above if no network image can be dropped
+    spill: write the image data of the job to a temporary .npy file, it is loaded again when the
+        job is written. Memory stays bounded, the disk has to catch up later.
+
+Jobs without image data (decision parameters, metadata) are small and never wait.
+"""
+
+from __future__ import annotations
+
+import collections
+import logging
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+log = logging.getLogger("EDA")
+
+POLICIES = ["block", "drop_network", "spill"]
+
+
+@dataclass
+class WriteJob:
+    """A write to be done by the writer thread: func(data, *args), then done() if given."""
+
+    kind: str
+    func: Callable
+    data: np.ndarray = None
+    args: tuple = ()
+    spill_file: str = None
+    done: Callable = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def spill(self, directory: str):
+        """Move the data to disk."""
+        handle, self.spill_file = tempfile.mkstemp(suffix=".npy", dir=directory)
+        with os.fdopen(handle, "wb") as f:
+            np.save(f, self.data)
+        self.data = None
+
+    def run(self) -> int:
+        """Do the write, return the number of bytes of data that was written."""
+        data = self.data
+        try:
+            if self.spill_file is not None:
+                data = np.load(self.spill_file)
+                os.remove(self.spill_file)
+            self.func(data, *self.args)
+        finally:
+            if self.done is not None:
+                self.done()
+        return 0 if data is None else data.nbytes
+
+
+class WriteQueue:
+    """FIFO of WriteJobs, bounded in the number of jobs holding data in memory."""
+
+    def __init__(self, maxsize: int = 64, policy: str = "block", spill_path: str = None):
+        """See the module docstring for the policies."""
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy}, use one of {POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_path = spill_path
+        self.jobs = collections.deque()
+        self.in_memory = 0
+        self.unfinished = 0
+        self.max_depth = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.write_time = 0.
+        self.condition = threading.Condition()
+
+    def put(self, job: WriteJob):
+        """Add a job, apply the policy if there is no space."""
+        with self.condition:
+            if job.in_memory and self.in_memory >= self.maxsize:
+                if not self._make_space(job):
+                    return
+            self.jobs.append(job)
+            self.in_memory += job.in_memory
+            self.unfinished += 1
+            self.max_depth = max(self.max_depth, len(self.jobs))
+            self.condition.notify_all()
+
+    def _make_space(self, job: WriteJob) -> bool:
+        """Called with a full queue, returns False if the job should not be queued."""
+        if self.policy == "drop_network":
+            if job.kind == "network_image":
+                self.dropped += 1
+                log.warning("Writer queue full, dropping network image")
+                return False
+            for queued in self.jobs:
+                if queued.kind == "network_image" and queued.in_memory:
+                    self.jobs.remove(queued)
+                    self.in_memory -= 1
+                    self.unfinished -= 1
+                    self.dropped += 1
+                    log.warning("Writer queue full, dropped queued network image")
+                    return True
+        elif self.policy == "spill":
+            if self.spill_path is None:
+                self.spill_path = tempfile.mkdtemp(prefix="eda_writer_spill_")
+            job.spill(self.spill_path)
+            self.spilled += 1
+            return True
+        while self.in_memory >= self.maxsize:
+            self.condition.wait()
+        return True
+
+    def get(self) -> WriteJob:
+        """Next job, waits until there is one."""
+        with self.condition:
+            while not self.jobs:
+                self.condition.wait()
+            job = self.jobs.popleft()
+            self.in_memory -= job.in_memory
+            self.condition.notify_all()
+            return job
+
+    def task_done(self, nbytes: int = 0, duration: float = 0., written: bool = True):
+        with self.condition:
+            self.unfinished -= 1
+            self.written += written
+            self.bytes_written += nbytes
+            self.write_time += duration
+            self.condition.notify_all()
+
+    def join(self, timeout: float = None) -> bool:
+        """Wait until all jobs are written, False if the timeout was reached before."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.unfinished == 0, timeout)
+
+    def metrics(self) -> dict:
+        """Queue depth and write throughput so far."""
+        with self.condition:
+            return {
+                "queue_depth": len(self.jobs),
+                "max_queue_depth": self.max_depth,
+                "written": self.written,
+                "dropped": self.dropped,
+                "spilled": self.spilled,
+                "bytes_written": self.bytes_written,
+                "throughput_mb_s": (self.bytes_written / self.write_time / 1e6
+                                    if self.write_time else 0.),
+            }
+
+
+class WriterThread(threading.Thread):
+    """Works through the jobs in the WriteQueue, errors are logged and don't stop the thread."""
+
+    STOP = "stop"
+
+    def __init__(self, queue: WriteQueue):
+        """Daemon thread, so that an unfinished writer does not block closing the application."""
+        super().__init__(name="EDA Writer", daemon=True)
+        self.queue = queue
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job.kind == self.STOP:
+                self.queue.task_done(written=False)
+                return
+            t0 = time.perf_counter()
+            nbytes = 0
+            try:
+                nbytes = job.run()
+            except Exception:
+                log.exception(f"Writer failed to write {job.kind}")
+            self.queue.task_done(nbytes, time.perf_counter() - t0)
+
+    def stop(self, timeout: float = None):
+        """Finish the queued jobs and end the thread."""
+        self.queue.put(WriteJob(self.STOP, None))
+        self.join(timeout)
@@ -8,6 +8,7 @@ import json
 import logging
 import os
 import re
+import time
 from pathlib import Path
 from typing import Union
 
@@ -15,8 +16,14 @@ import numcodecs
 import numpy as np
 import tifffile
 import zarr
+from dataclasses import replace
+from eda_plugin.utility import compression
+from eda_plugin.utility.columnar_log import ColumnarLog, write_block
+from eda_plugin.utility.core_event_bus import settings_from_sequence
 from eda_plugin.utility.event_bus import EventBus
+from eda_plugin.utility.image_processing import downsample
 from eda_plugin.utility.ome_metadata import OME
+from eda_plugin.utility.write_queue import WriteJob, WriteQueue, WriterThread
 from eda_plugin.utility.qt_classes import QWidgetRestore
 from ome_zarr import io, writer
 from pymm_eventserver.data_structures import MMSettings, ParameterSet, PyImage
@@ -27,6 +34,56 @@ import pdb
 
 log = logging.getLogger("EDA")
 
+# What to save and where, the WriterGUI keeps these up to date with its menu
+WRITER_OPTIONS = {
+    "path": "C:/Users",
+    "save_images": True,
+    "ome_metadata": True,
+    "network_images": True,
+    "network_output": True,
+    "interpretations": True,
+    # Network images quantized to "uint8"/"uint16" (None: as they come) over the fixed nn_range,
+    # values outside are clipped. With nn_native they are not padded to the image size. Both are
+    # fixed for an acquisition when it starts.
+    "nn_dtype": None,
+    "nn_range": (0., 1.),
+    "nn_native": False,
+    # Chunk size in y, x for the image arrays, None for one chunk per plane
+    "chunk_tile": None,
+    # Blosc compression per dataset, see utility.compression for the possible settings
+    "compression": {"images": "auto", "nn_images": "auto", "analyser_output": "zstd"},
+    "compression_threads": 4,
+    # Resolution levels of the images including the full one, 1 for no pyramid. "auto" halves the
+    # size until it would be below PYRAMID_MIN_SIZE, for at most PYRAMID_MAX_LEVELS levels
+    "pyramid_levels": "auto",
+    # Writes are done in a separate thread, see utility.write_queue for the policies
+    "queue_size": 64,
+    "queue_policy": "block",
+    "spill_path": None,
+}
+
+# One row per decision in EDA/analyser_output, times in s. The stages of a timepoint are relative to
+# the start of the acquisition: the last image arrived in the analyser (image, in the Writer if the
+# analyser doesn't say), the analyser worker started, its network input was prepared, the decision
+# parameter was calculated (analysed) and sent (decided), and the decision arrived in the Writer
+# (received). Stages that an analyser doesn't have are NaN. The latency is from the last image of
+# the timepoint to the decision. The interval is the one in effect after the decision. The
+# interpreters are connected to the decisions before the Writer, so an interpretation of the
+# decision has arrived before the row is logged.
+STAGES = ["image", "started", "prepared", "analysed", "decided"]
+LOG_COLUMNS = {
+    "timepoint": "i8",
+    "elapsed": "f8",
+    "decision": "f8",
+    **{stage: "f8" for stage in STAGES},
+    "received": "f8",
+    "analysis_latency": "f8",
+    "interval": "f8",
+}
+LOG_BLOCK_SIZE = 1024
+PYRAMID_MIN_SIZE = 256
+PYRAMID_MAX_LEVELS = 5
+
 
 class Writer(QObject):
     """Writer that writes images, metadata and EDA specific data to have all information for EDA.
@@ -35,41 +92,128 @@ class Writer(QObject):
     Metadata for both Micro-Manager and EDA specific information.
     """
 
-    def __init__(self, event_bus: EventBus):
-        """Connect the necessary signals"""
+    def __init__(self, event_bus: EventBus, gui: bool = True, options: dict = None):
+        """Connect the necessary signals
+
+        Without a gui, the options decide what is saved where. See WRITER_OPTIONS for the keys.
+        """
         super().__init__()
         self.event_bus = event_bus
 
-        # TODO: Put/Get these things into/from a WriterGUI
-
-        self.gui = WriterGUI(self)
-
+        self.options = copy.deepcopy(WRITER_OPTIONS)
+        if options is not None:
+            options = dict(options)
+            # Only the datasets that are named get another compression
+            self.options["compression"].update(options.pop("compression", {}))
+            self.options.update(options)
+        compression.set_threads(self.options["compression_threads"])
+        self.codecs = {}
+
+        self.queue = WriteQueue(self.options["queue_size"], self.options["queue_policy"],
+                                self.options["spill_path"])
+        self.thread = WriterThread(self.queue)
+        self.thread.start()
+        # The lower resolution levels are computed in their own thread, after the full resolution
+        # plane was written
+        self.pyramid_queue = WriteQueue(self.options["queue_size"])
+        self.pyramid_thread = WriterThread(self.pyramid_queue)
+        self.pyramid_thread.start()
+        self.n_levels = 1
+        self.nn_dtype = None
+        self.nn_range = None
+        self.nn_quantization = None
+        self.nn_clipped = 0
+
+        self.gui = WriterGUI(self) if gui else None
+
+        self.event_bus.new_stage_times.connect(self.save_stage_times)
         self.event_bus.new_decision_parameter.connect(self.save_decision_parameter)
+        self.event_bus.new_interpretation.connect(self.save_interpretation)
         self.event_bus.new_parameters.connect(self.update_parameters)
         self.event_bus.acquisition_started_event.connect(self.new_save_location)
-        self.event_bus.new_image_event.connect(self.save_image)
+        self.mda_settings = None
+        self.event_bus.mda_settings_event.connect(self._new_mda_settings)
+        # With a frame ring the images are written from the ring slots without a copy
+        self.frame_ring = getattr(event_bus, "frame_ring", None)
+        if self.frame_ring is not None:
+            self.frame_ring.register_consumer()
+            self.event_bus.new_frame_event.connect(self.save_frame)
+        else:
+            self.event_bus.new_image_event.connect(self.save_image)
         self.event_bus.new_network_image.connect(self.save_network_image)
         self.event_bus.acquisition_ended_event.connect(self.save_metadata)
 
         self.store = None
         self.root = None
-        self.local_image_store = None
+        self.arrays = {}
+        self.written = {}
+        self.image_shape = None
         self.params = None
         self.settings = None
         self.ome = None
+        self.log = None
+        self.log_root = None
+        last = getattr(event_bus, "last_interpretation", None)
+        self.interval = np.nan if last is None else last
+        self._image_times = {}
+        self._stage_times = {}
+        self._t0 = time.perf_counter()
+
+    def metrics(self) -> dict:
+        """Queue depth and write throughput of the writer thread."""
+        return self.queue.metrics()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait for the writer threads to write everything that is queued."""
+        return self.queue.join(timeout) and self.pyramid_queue.join(timeout)
+
+    def close(self, timeout: float = None):
+        """Write what is queued and stop the writer threads."""
+        self.thread.stop(timeout)
+        self.pyramid_thread.stop(timeout)
+
+    def _new_mda_settings(self, settings: MMSettings):
+        self.mda_settings = settings
 
     def new_save_location(self, event):
         """A new acquisition was started leading to a new path for saving"""
         if event is None:
             return
-        self.settings = MMSettings(event.get_settings())
+        # Everything from the last acquisition has to be written before the stores are replaced
+        self.flush_log()
+        self.flush()
+        self.n_levels = 1
+        if hasattr(event, "get_settings"):
+            self.settings = MMSettings(event.get_settings())
+        elif isinstance(event, MMSettings):
+            # Replayed by the EventPlayer in place of the java event
+            self.settings = copy.deepcopy(event)
+        elif event.sizes["c"] or self.mda_settings is None:
+            # A useq MDASequence from the CoreEventBus
+            self.settings = settings_from_sequence(event)
+        else:
+            # Sequences fed by an actuator event by event don't know their channels
+            self.settings = copy.deepcopy(self.mda_settings)
+        # Changing the precision during the acquisition would mix encodings in one array
+        self.nn_dtype = self.options["nn_dtype"]
+        self.nn_range = self.options["nn_range"]
+        self.nn_quantization = (None if self.nn_dtype is None
+                                else quantization(self.nn_dtype, self.nn_range))
+        self.nn_clipped = 0
 
         writer_path = self._set_possible_folder_name(event)
 
         self.root = self._zarr_group(writer_path)
 
         self.eda_root = self._zarr_group(writer_path, "EDA")
-        self.eda_root.create_dataset("analyser_output", shape=(1, 2))  # for analyser output
+        self.arrays = {}
+        self.written = {}
+        # Decisions and interpretations are collected in memory and written in blocks
+        self.log_root = self.eda_root.create_group("analyser_output", overwrite=True)
+        self.log = ColumnarLog(LOG_COLUMNS, LOG_BLOCK_SIZE)
+        self._image_times = {}
+        self._stage_times = {}
+        self._t0 = time.perf_counter()
         self.eda_root.create_dataset(
             "parameters", shape=(1, 1), dtype=object, object_codec=numcodecs.JSON()
         )
@@ -86,62 +230,166 @@ class Writer(QObject):
         self.save_mmdev_settings(event)
 
     def save_image(self, py_image: PyImage):
-        """Gather one timepoint for the original data and save it."""
-        self.ome.add_plane_from_image(py_image)
-        if not self.gui.save_images.isChecked() or py_image is None:
+        """Queue the image to be written by the writer thread."""
+        if self.ome is None or py_image is None:
+            # No acquisition with a save location was started
             return
-        # if all([py_image.timepoint == 0, py_image.channel == 0, py_image.z_slice == 0,
-        #         self.local_image_store is not None]) or
-        if self.local_image_store is None:
-            shape = (1, self.settings.n_channels, self.settings.n_slices, py_image.raw_image.shape[-2], py_image.raw_image.shape[-1])
-            self.image_root.create_dataset("0", shape=shape, dtype="uint16")
-            self._fake_metadata(py_image.raw_image.shape, self.image_root, "0")
-            self.local_image_store = np.ndarray(shape, np.uint16)
-        self.local_image_store[0, py_image.channel, py_image.z_slice, :, :] = py_image.raw_image
-
-        if (
-            py_image.channel == self.settings.n_channels - 1
-            and py_image.z_slice == self.settings.n_slices - 1
-        ):
-            if py_image.timepoint == 0:
-                self.image_root[0] = copy.deepcopy(self.local_image_store)
-            else:
-                self.image_root[0].append(self.local_image_store)
+        self._image_times[py_image.timepoint] = time.perf_counter()
+        self.queue.put(WriteJob("image", self._write_image, py_image.raw_image,
+                                (replace(py_image, raw_image=None),)))
+
+    def save_frame(self, slot: int, py_image: PyImage):
+        """Queue the frame in the ring slot, the slot is released once it is written."""
+        if slot < 0:
+            # Not in the ring, the image was passed on as it is
+            self.save_image(py_image)
+            return
+        if self.ome is None:
+            self.frame_ring.release(slot)
+            return
+        self._image_times[py_image.timepoint] = time.perf_counter()
+        self.queue.put(WriteJob("image", self._write_image, self.frame_ring.view(slot),
+                                (py_image,), done=lambda: self.frame_ring.release(slot)))
 
+    def _write_image(self, raw_image: np.ndarray, py_image: PyImage):
+        """Write the plane into the preallocated array, this is one chunk write per image."""
+        py_image = replace(py_image, raw_image=raw_image)
+        self.ome.add_plane_from_image(py_image)
+        self.image_shape = raw_image.shape
+        if not self.options["save_images"]:
+            return
+        if "images" not in self.arrays:
+            self._create_image_arrays(raw_image)
+        index = (py_image.timepoint, py_image.channel, py_image.z_slice)
+        self._write_plane("images", index, raw_image)
+        if self.n_levels > 1:
+            # Frames from the ring are read-only and released after this job
+            plane = raw_image if raw_image.flags.writeable else raw_image.copy()
+            self.pyramid_queue.put(WriteJob("pyramid", self._write_pyramid, plane, (index,)))
+
+    def _create_image_arrays(self, sample: np.ndarray):
+        """Full resolution array and the pyramid levels, with the multiscales metadata for all."""
+        self._create_t_array("images", self.image_root, "0", sample.shape, "uint16",
+                             self.settings.n_channels, self.settings.n_slices, sample=sample)
+        self.n_levels = self._pyramid_levels(sample.shape)
+        shape = sample.shape
+        for level in range(1, self.n_levels):
+            shape = (shape[0] // 2, shape[1] // 2)
+            self._create_t_array(f"images_{level}", self.image_root, str(level), shape, "uint16",
+                                 self.settings.n_channels, self.settings.n_slices,
+                                 compressor=self.arrays["images"].compressor, metadata=False)
+        self._fake_metadata(sample.shape, self.image_root, levels=self.n_levels)
+
+    def _pyramid_levels(self, shape: tuple) -> int:
+        levels = self.options["pyramid_levels"]
+        if levels != "auto":
+            return max(1, min(int(levels), int(np.log2(min(shape))) + 1))
+        levels = 1
+        while min(shape) // 2 ** levels >= PYRAMID_MIN_SIZE and levels < PYRAMID_MAX_LEVELS:
+            levels += 1
+        return levels
+
+    def _write_pyramid(self, plane: np.ndarray, index: tuple):
+        """Block means of 2x2 pixels, each level from the one above."""
+        for level in range(1, self.n_levels):
+            plane = downsample(plane)
+            self._write_plane(f"images_{level}", index, plane)
 
     def save_network_image(self, image: np.ndarray, dims: tuple):
-        """Save network image to zarr store"""
-        if not self.gui.save_nn_images.isChecked():
+        """Queue the network image to be written by the writer thread."""
+        if not self.options["network_images"] or self.root is None:
             return
-        # -> Put this into a function so we can adjust it when subclassing
-        image = self.prepare_nn_image(image, dims)
+        self.queue.put(WriteJob("network_image", self._write_network_image, image, (dims,)))
 
-        if "nn_images" not in self.eda_root:
-            self.eda_root.create_dataset(
-                "nn_images", shape=(1, 1, 1, image.shape[0], image.shape[1])
-            )
-            self._fake_metadata(image.shape, self.eda_root, "nn_images")
+    def _write_network_image(self, image: np.ndarray, dims: tuple):
+        """Save network image to zarr store"""
+        # -> Put this into a function so we can adjust it when subclassing
+        if not self.options["nn_native"]:
+            image = self.prepare_nn_image(image, dims)
+        dtype = self.nn_dtype
+        if dtype is not None:
+            self._count_clipped(image, dims)
+        if "nn_images" not in self.arrays:
+            attrs = {}
+            if dtype is not None:
+                attrs = {"scale_factor": self.nn_quantization[0],
+                         "add_offset": self.nn_quantization[1], "missing_value": 0}
+            if self.image_shape is not None:
+                # The network image covers this part of the original image
+                attrs["image_region"] = [[0, min(n, m)] for n, m in
+                                         zip(image.shape, self.image_shape[-2:])]
+            sample = image if dtype is None else quantize(image, *self.nn_quantization, dtype)
+            self._create_t_array("nn_images", self.eda_root, "nn_images", image.shape,
+                                 sample.dtype, sample=sample)
+            self.arrays["nn_images"].attrs.update(attrs)
+        if dtype is not None:
+            image = quantize(image, *self.nn_quantization, dtype)
+        # Frames that were missed stay at the fill value
+        self._write_plane("nn_images", (dims[0], 0, 0), image)
+
+    def _count_clipped(self, image: np.ndarray, dims: tuple):
+        low, high = self.nn_range
+        clipped = np.count_nonzero((image < low) | (image > high))
+        if clipped and not self.nn_clipped:
+            log.warning(f"Network image {dims[0]}: {clipped} values outside of nn_range "
+                        f"{self.nn_range} are clipped")
+        self.nn_clipped += clipped
 
-        image = np.expand_dims(image, axis=[0, 1, 2])
+    def save_decision_parameter(self, param: float, elapsed: float, timepoint: int):
+        """Received new decision parameter from the analyser, add it to the log."""
+        if self.log is None:
+            return
+        now = time.perf_counter()
+        image_time = None
+        for image_timepoint in [t for t in self._image_times if t <= timepoint]:
+            image_time = self._image_times.pop(image_timepoint)
+        stage_times = self._stage_times.pop(timepoint, {})
+        image_time = stage_times.get("image", image_time)
+        for stage_timepoint in [t for t in self._stage_times if t < timepoint]:
+            del self._stage_times[stage_timepoint]
+        if not self.options["network_output"]:
+            return
+        self._log_row({
+            "timepoint": timepoint,
+            "elapsed": elapsed,
+            "decision": param,
+            **{stage: stage_times.get(stage, np.nan) - self._t0 for stage in STAGES},
+            "image": np.nan if image_time is None else image_time - self._t0,
+            "received": now - self._t0,
+            "analysis_latency": np.nan if image_time is None else now - image_time,
+            "interval": self.interval if self.options["interpretations"] else np.nan,
+        })
+
+    def save_stage_times(self, timepoint: int, stage_times: dict):
+        """The analyser sends the times of its stages right before the decision of the timepoint."""
+        if self.log is not None:
+            self._stage_times[timepoint] = stage_times
+
+    def save_interpretation(self, interval: float):
+        """Received new interpretation from the interpreter, it is logged with the next decisions.
+
+        Interpreters only emit when the interval changes, or when their parameters change.
+        """
+        self.interval = interval
 
-        while dims[0] > self.eda_root["nn_images"].shape[0] - 1:
-            # A frame was missed, lets add an empty frame
-            print(dims)
-            print(self.eda_root["nn_images"].shape)
-            log.warning("Frame missed, saving empty nn image!")
-            self.eda_root["nn_images"].append(np.zeros_like(image))
+    def _log_row(self, row: dict):
+        block = self.log.append(**row)
+        if block is not None:
+            self.queue.put(WriteJob("log", self._write_log, None, (self.log_root, block)))
 
-        if dims[0] == 0:
-            self.eda_root["nn_images"] = image
-        else:
-            self.eda_root["nn_images"].append(image)
+    def _write_log(self, _, group: zarr.Group, block: dict):
+        write_block(group, block, LOG_BLOCK_SIZE, self._compressor("analyser_output"))
 
-    def save_decision_parameter(self, param: float, elapsed: float, timepoint: int):
-        "Received new interpretation from interpreter, save value into the EDA file"
-        if not self.gui.save_nn_output.isChecked():
+    def flush_log(self):
+        """Queue the rows of the log that are not written yet."""
+        if self.log is None:
             return
-        # TODO: be careful, might not get all the params!
-        self.eda_root["analyser_output"].append([[timepoint, param]])
+        self._flush_log(self.log, self.log_root)
+
+    def _flush_log(self, acq_log: ColumnarLog, log_root: zarr.Group):
+        block = acq_log.take()
+        if block is not None:
+            self.queue.put(WriteJob("log", self._write_log, None, (log_root, block)))
 
     def update_parameters(self, params: Union[ParameterSet, dict]):
         """Update the parameters for the Interpreter used."""
@@ -160,7 +408,9 @@ class Writer(QObject):
 
         Note, that the cropping was done at the end of the image in the KerasRescaleWorker.
         """
-        diff = tuple(map(lambda i, j: i - j, self.local_image_store.shape[-2:], image.shape))
+        if self.image_shape is None:
+            return image
+        diff = tuple(map(lambda i, j: i - j, self.image_shape[-2:], image.shape))
         if not diff == (0, 0):
             image = np.pad(image, ((0, diff[0]), (0, diff[1])))
         return image
@@ -169,7 +419,11 @@ class Writer(QObject):
         """Sace Micro-Manager settings"""
         file = "MM_state.txt"
         path = os.path.join(self.metadata_root.store.path, file)
-        self.event_bus.studio.get_cmm_core().save_system_state(path)
+        if hasattr(self.event_bus, "studio"):
+            self.event_bus.studio.get_cmm_core().save_system_state(path)
+        elif hasattr(getattr(self.event_bus, "mmcore", None), "saveSystemState"):
+            # pymmcore-plus, a SyntheticCore has no state to save
+            self.event_bus.mmcore.saveSystemState(path)
 
     def save_mmacq_settings(self):
         """Save acquisition settings but strip off the Java objects first."""
@@ -185,28 +439,51 @@ class Writer(QObject):
             f.write(settings_json)
 
     def save_metadata(self):
-        """Save all the metadata once the acquisition is over."""
+        """Save all the metadata once the acquisition is over, after the queued data."""
+        if self.ome is None:
+            return
+        self.flush_log()
+        self.queue.put(WriteJob("metadata", self._write_metadata))
+        # Delay this so that network images can be saved. The next acquisition might have started
+        # by then, so the log and the arrays of this one are passed along.
+        acquisition = (self.log, self.log_root, self.arrays, self.written)
+        QTimer.singleShot(1000, lambda: self._finish_acquisition(*acquisition))
+
+    def _finish_acquisition(self, acq_log: ColumnarLog, log_root: zarr.Group, arrays: dict,
+                            written: dict):
+        self._flush_log(acq_log, log_root)
+        if self.nn_clipped and acq_log is self.log:
+            log.warning(f"{self.nn_clipped} network image values were clipped to nn_range "
+                        f"{self.nn_range}")
+        self.queue.put(WriteJob("trim", self.trim_arrays, None, (arrays, written)))
+
+    def _write_metadata(self, _):
+        self.trim_arrays()
         try:
             tif_file = glob.glob(self.orig_save_path + "/*.ome.tif")[0]
             with tifffile.TiffFile(tif_file) as tif:
                 self.save_ome_metadata(tif)
                 self.save_imagej_metadata(tif)
         except IndexError:
-            self.ome.finalize_metadata()
-            self.save_ome_metadata(xml=self.ome.ome.to_xml())
-        finally:
-            # Delay this so that network images can be saved
-            self.reset_timer = QTimer()
-            self.reset_timer.singleShot(1000, self.reset_local_image_store)
-            self.reset_timer.start()
+            self.save_ome_metadata(ome=self.ome)
 
-    def reset_local_image_store(self):
-        self.local_image_store = None
+    def trim_arrays(self, _=None, arrays: dict = None, written: dict = None):
+        """Cut the preallocated arrays down to what was actually written.
+
+        By default these are the arrays of the current acquisition.
+        """
+        arrays = self.arrays if arrays is None else arrays
+        written = self.written if written is None else written
+        # The pyramid levels of everything written so far have to be there first
+        self.pyramid_queue.join()
+        for key, array in list(arrays.items()):
+            if array.shape[0] != written[key]:
+                array.resize(written[key], *array.shape[1:])
 
     def save_imagej_metadata(self, tif: Union[tifffile.TiffFile, None] = None):
         """Get the ImageJ metadata from the original tiff file and save it"""
         # Again, only works if micro-manager saved the tif in the first place
-        if not self.gui.save_metadata.isChecked():
+        if not self.options["ome_metadata"]:
             return
         metadata_file = "imagej_metadata.json"
 
@@ -221,12 +498,24 @@ class Writer(QObject):
         with open(path, "w", encoding="utf-8") as f:
             f.write(data)
 
-    def save_ome_metadata(self, tif: Union[tifffile.TiffFile, None] = None, xml: str = None):
-        """Get the OME metadata from the original tiff file and save it"""
-        if not self.gui.save_metadata.isChecked():
+    def save_ome_metadata(self, tif: Union[tifffile.TiffFile, None] = None, xml: str = None,
+                          ome: OME = None):
+        """Get the OME metadata from the original tiff file and save it
+
+        Metadata that was collected during the acquisition is streamed to the file and the plane
+        table is saved in OME/planes as well.
+        """
+        if not self.options["ome_metadata"]:
             return
         metadata_file = "METADATA.ome.xml"
+        ome_path = os.path.join(self.ome_root.store.path, metadata_file)
 
+        if ome is not None:
+            with open(ome_path, "w", encoding="utf-8") as f:
+                ome.write_xml(f)
+            planes = self.ome_root.create_group("planes", overwrite=True)
+            write_block(planes, ome.planes(), LOG_BLOCK_SIZE, self._compressor("planes"))
+            return
         if tif is not None:
             xml_metadata = tif.ome_metadata
         elif xml is not None:
@@ -240,7 +529,6 @@ class Writer(QObject):
         # xml_metadata = xml_re.search(xml_metadata).group(2)
 
         # This might be to naive, bioformats2raw does some more things here.
-        ome_path = os.path.join(self.ome_root.store.path, metadata_file)
         with open(ome_path, "w", encoding="utf-8") as f:
             f.write(xml_metadata)
 
@@ -250,47 +538,126 @@ class Writer(QObject):
         root = zarr.group(store=store)
         return root
 
-    def _fake_metadata(self, shape, group, name="0"):
+    def _create_t_array(self, key: str, group: zarr.Group, name: str, shape: tuple,
+                        dtype="float64", n_channels: int = None, n_slices: int = None,
+                        chunks: tuple = None, sample: np.ndarray = None, compressor=None,
+                        metadata: bool = True):
+        """Array preallocated along t for the expected timepoints, chunked by plane or tile.
+
+        With channels or slices given, the array is (t, c, z, y, x) with ome-ngff metadata. The
+        sample frame is used to choose the codec if the compression for key is "auto" and no
+        compressor is given.
+        """
+        n_timepoints = max(1, self.settings.timepoints or 1)
+        if n_channels is not None:
+            shape = (n_channels, n_slices, *shape)
+        elif len(shape) == 2:
+            shape = (1, 1, *shape)
+        if chunks is None:
+            tile = self.options["chunk_tile"] or shape[-2:]
+            chunks = (1,) * (len(shape) - 1) + tuple(min(t, s) for t, s in zip(tile, shape[-2:]))
+        if compressor is None:
+            compressor = self._compressor(key, sample)
+        self.arrays[key] = group.create_dataset(name, shape=(n_timepoints, *shape), chunks=chunks,
+                                                dtype=dtype, fill_value=0, overwrite=True,
+                                                compressor=compressor)
+        self.written[key] = 0
+        if len(shape) > 2 and metadata:
+            self._fake_metadata(shape[-2:], group, name)
+
+    def _compressor(self, key: str, sample: np.ndarray = None):
+        setting = self.options["compression"].get(key, "auto")
+        if setting == "auto":
+            if sample is None:
+                setting = "zstd"
+            else:
+                setting = compression.choose_codec(sample, self._data_rate(key, sample))
+        self.codecs[key] = setting
+        return compression.make_compressor(setting)
+
+    def _data_rate(self, key: str, sample: np.ndarray):
+        """Expected MB/s for the dataset, None if the interval is not known."""
+        if not self.settings.interval_ms:
+            return None
+        frames = self.settings.n_channels * self.settings.n_slices if key == "images" else 1
+        return sample.nbytes * frames / (self.settings.interval_ms / 1000) / 1e6
+
+    def _write_plane(self, key: str, index: tuple, data):
+        """Write at index, grow the array in large steps if the timepoint is beyond its end."""
+        array = self.arrays[key]
+        if index[0] >= array.shape[0]:
+            array.resize(max(index[0] + 1, 2 * array.shape[0]), *array.shape[1:])
+        array[index] = data
+        self.written[key] = max(self.written[key], index[0] + 1)
+
+    def _fake_metadata(self, shape, group, name="0", levels: int = 1):
+        """Multiscales metadata, the levels are named 0, 1, ... if there is more than one."""
         axes = ["t", "c", "z", "y", "x"]
-        shapes = [[1, self.settings.n_channels, self.settings.n_slices, shape[-2], shape[-1]]]
+        shapes = [[1, self.settings.n_channels, self.settings.n_slices,
+                   shape[-2] // 2 ** level, shape[-1] // 2 ** level] for level in range(levels)]
         coordinate_transformations = writer.CurrentFormat().generate_coordinate_transformations(
             shapes
         )
-        datasets = [{"path": name, "coordinateTransformations": coordinate_transformations[0]}]
+        paths = [name] if levels == 1 else [str(level) for level in range(levels)]
+        datasets = [{"path": path, "coordinateTransformations": transformations}
+                    for path, transformations in zip(paths, coordinate_transformations)]
         writer.write_multiscales_metadata(group, datasets, writer.CurrentFormat(), axes)
 
     def _set_possible_folder_name(self, event):
         folder_number = 0
-        self.orig_save_path = event.get_datastore().get_save_path()
+        # Sequences from the CoreEventBus have no datastore
+        if hasattr(event, "get_datastore"):
+            self.orig_save_path = event.get_datastore().get_save_path()
+        else:
+            self.orig_save_path = getattr(event, "save_path", None)
 
         if self.orig_save_path is None:
             self.orig_save_path = "mock/FOV"
         writer_path = os.path.join(
-            self.gui.path.text(), os.path.basename(self.orig_save_path) + ".ome.zarr"
+            self.options["path"], os.path.basename(self.orig_save_path) + ".ome.zarr"
         )
 
         path_now = os.path.join(
-            self.gui.path.text(),
+            self.options["path"],
             self.orig_save_path + "_" + str(folder_number).zfill(3) + ".ome.zarr",
         )
         while Path(path_now).is_dir():
             folder_number += 1
             path_now = os.path.join(
-                self.gui.path.text(),
+                self.options["path"],
                 self.orig_save_path + "_" + str(folder_number).zfill(3) + ".ome.zarr",
             )
         self.orig_save_path = self.orig_save_path + "_" + str(folder_number).zfill(3) + ".ome.zarr"
         return path_now
 
 
+def quantization(dtype: str, value_range: tuple) -> tuple:
+    """Scale factor and offset to store values in value_range as dtype, decoded as
+    stored * scale_factor + add_offset. The stored value 0 is kept for missing frames."""
+    if value_range is None or not value_range[1] > value_range[0]:
+        raise ValueError(f"Quantized network images need a fixed nn_range, got {value_range}")
+    low, high = value_range
+    levels = np.iinfo(dtype).max - 1
+    scale = (float(high) - float(low)) / levels
+    return scale, float(low) - scale
+
+
+def quantize(image: np.ndarray, scale: float, offset: float, dtype: str) -> np.ndarray:
+    """Values outside of the range of the quantization are clipped."""
+    stored = np.rint((np.nan_to_num(image) - offset) / scale)
+    return np.clip(stored, 1, np.iinfo(dtype).max).astype(dtype)
+
+
 class WriterGUI(QWidgetRestore):
     """GUI to set the save location and what to save"""
 
     def __init__(self, writer: Writer):
         super().__init__()
+        self.writer = writer
+        self.settings = self.qt_settings
 
         self.path_label = QtWidgets.QLabel("Save Path")
-        self.path = QtWidgets.QLineEdit(self.settings.value("path", "C:/Users"))
+        self.path = QtWidgets.QLineEdit(self.settings.value("path", writer.options["path"]))
 
         self.menu = QtWidgets.QMenu("Options")
         self.save_images = QtWidgets.QAction("Original Images", self.menu, checkable=True)
@@ -317,13 +684,95 @@ class WriterGUI(QWidgetRestore):
                 self.save_interpretations,
             ]
         )
+        self.compression_menu = self.menu.addMenu("Image Compression")
+        self.compression_group = QtWidgets.QActionGroup(self.compression_menu)
+        compression_setting = self.settings.value("compression",
+                                                  writer.options["compression"]["images"])
+        for preset in ["auto", *compression.PRESETS]:
+            action = QtWidgets.QAction(preset, self.compression_menu, checkable=True)
+            action.setChecked(preset == compression_setting)
+            action.toggled.connect(lambda checked, preset=preset:
+                                   checked and self._set_compression(preset))
+            self.compression_group.addAction(action)
+            self.compression_menu.addAction(action)
+        self._set_compression(compression_setting)
+        self.nn_dtype_menu = self.menu.addMenu("Network Image Precision")
+        self.nn_dtype_group = QtWidgets.QActionGroup(self.nn_dtype_menu)
+        nn_dtype = self.settings.value("nn_dtype", writer.options["nn_dtype"] or "float")
+        for dtype in ["float", "uint16", "uint8"]:
+            action = QtWidgets.QAction(dtype, self.nn_dtype_menu, checkable=True)
+            action.setChecked(dtype == nn_dtype)
+            action.toggled.connect(lambda checked, dtype=dtype:
+                                   checked and self._set_nn_dtype(dtype))
+            self.nn_dtype_group.addAction(action)
+            self.nn_dtype_menu.addAction(action)
+        self._set_nn_dtype(nn_dtype)
+        # Range of the network image values that the quantized precisions cover
+        self.nn_range_label = QtWidgets.QLabel("Network Image Range")
+        self.nn_range = []
+        for i, value in enumerate(writer.options["nn_range"]):
+            box = QtWidgets.QDoubleSpinBox()
+            box.setRange(-1e6, 1e6)
+            box.setDecimals(3)
+            box.setValue(float(self.settings.value(f"nn_range_{i}", value)))
+            box.valueChanged.connect(self._set_nn_range)
+            self.nn_range.append(box)
+        self._set_nn_range()
         self.menu_button = QtWidgets.QPushButton("Options")
         self.menu_button.setMenu(self.menu)
 
+        self.actions = {
+            "save_images": self.save_images,
+            "ome_metadata": self.save_metadata,
+            "network_images": self.save_nn_images,
+            "network_output": self.save_nn_output,
+            "interpretations": self.save_interpretations,
+        }
+        for key, action in self.actions.items():
+            action.toggled.connect(lambda checked, key=key: self._set_option(key, checked))
+            self._set_option(key, action.isChecked())
+        self.path.textChanged.connect(lambda text: self._set_option("path", text))
+        self._set_option("path", self.path.text())
+
+        self.metrics_label = QtWidgets.QLabel()
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self._update_metrics)
+        self.metrics_timer.start(1000)
+        self._update_metrics()
+
         self.setLayout(QtWidgets.QVBoxLayout())
         self.layout().addWidget(self.path_label)
         self.layout().addWidget(self.path)
         self.layout().addWidget(self.menu_button)
+        nn_range_layout = QtWidgets.QHBoxLayout()
+        nn_range_layout.addWidget(self.nn_range_label)
+        for box in self.nn_range:
+            nn_range_layout.addWidget(box)
+        self.layout().addLayout(nn_range_layout)
+        self.layout().addWidget(self.metrics_label)
+
+    def _update_metrics(self):
+        metrics = self.writer.metrics()
+        text = f"Queue: {metrics['queue_depth']}  {metrics['throughput_mb_s']:.0f} MB/s"
+        if metrics["dropped"] or metrics["spilled"]:
+            text += f"  dropped {metrics['dropped']}, spilled {metrics['spilled']}"
+        self.metrics_label.setText(text)
+
+    def _set_option(self, key: str, value):
+        self.writer.options[key] = value
+
+    def _set_compression(self, preset: str):
+        """Same compression for the original and the network images."""
+        self.compression = preset
+        self.writer.options["compression"]["images"] = preset
+        self.writer.options["compression"]["nn_images"] = preset
+
+    def _set_nn_dtype(self, dtype: str):
+        self.nn_dtype = dtype
+        self.writer.options["nn_dtype"] = None if dtype == "float" else dtype
+
+    def _set_nn_range(self, *_):
+        self.writer.options["nn_range"] = tuple(box.value() for box in self.nn_range)
 
     def closeEvent(self, e):
         self.settings.setValue("save_images", self.save_images.isChecked())
@@ -332,6 +781,10 @@ class WriterGUI(QWidgetRestore):
         self.settings.setValue("network_output", self.save_nn_output.isChecked())
         self.settings.setValue("interpretations", self.save_interpretations.isChecked())
         self.settings.setValue("path", self.path.text())
+        self.settings.setValue("compression", self.compression)
+        self.settings.setValue("nn_dtype", self.nn_dtype)
+        for i, box in enumerate(self.nn_range):
+            self.settings.setValue(f"nn_range_{i}", box.value())
         return super().closeEvent(e)
 
 
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from pymm_eventserver.data_structures import MMSettings
+
+
+class StubDevice:
+    """Stands in for an isimgui device, the frame depends on its attributes and the arguments."""
+
+    def __init__(self, rows: int = 1, **attributes):
+        self.rows = rows
+        # A list, numbers would be part of the key of the cached frames
+        self.calls = []
+        self.__dict__.update(attributes)
+
+    def one_frame(self, ni_settings, *args) -> np.ndarray:
+        self.calls.append(args)
+        n_points = round(ni_settings.cycle_time)
+        level = sum(value for value in self.__dict__.values() if isinstance(value, float))
+        for arg in args:
+            level += arg if isinstance(arg, (int, float)) else 100 * (arg["name"] == "561")
+        frame = np.linspace(0, 1, n_points) + level + np.arange(self.rows)[:, None]
+        return frame[0] if self.rows == 1 else frame
+
+
+class StubCore:
+    def __init__(self):
+        self.properties = {}
+
+    def get_property(self, device: str, prop: str) -> str:
+        return self.properties.get((device, prop), "0")
+
+
+@pytest.fixture
+def daq_devices():
+    """The devices of the DAQActuator, 7 rows like the DAQ channels."""
+    return {"ni_settings": SimpleNamespace(camera_readout_time=0., cycle_time=0.),
+            "galvo": StubDevice(offset=-0.15), "stage": StubDevice(), "camera": StubDevice(),
+            "aotf": StubDevice(3, power_488=20., power_561=0.), "twitcher": StubDevice()}
+
+
+@pytest.fixture
+def daq_core():
+    return StubCore()
+
+
+@pytest.fixture
+def daq_settings():
+    """Two channels with two slices each, 100 samples per frame with the stub devices."""
+    settings = MMSettings(interval_ms=200, post_delay=0.)
+    for name in ["488", "561"]:
+        settings.channels[name] = {"name": name, "color": [255, 255, 255], "use": True,
+                                   "exposure": 100, "z_stack": False}
+    settings.n_channels = 2
+    settings.slices = [0., 1.]
+    settings.n_slices = 2
+    return settings
@@ -0,0 +1,89 @@
+import copy
+
+import numpy as np
+import pytest
+
+from eda_plugin.actuators.daq import DAQActuator
+
+POWER = r"Power (% of max)"
+
+
+def stacked_timepoint(actuator) -> np.ndarray:
+    """The timepoint as it was made before the segments were cached."""
+    iter_slices = copy.deepcopy(actuator.settings.slices)
+    iter_slices_rev = copy.deepcopy(iter_slices)
+    iter_slices_rev.reverse()
+
+    galvo = actuator.galvo.one_frame(actuator.ni_settings)
+    camera = actuator.camera.one_frame(actuator.ni_settings)
+    twitcher = actuator.twitcher.one_frame(actuator.ni_settings)
+
+    z_iter = 0
+    channels_data = []
+    for channel in actuator.settings.channels.values():
+        if channel["use"]:
+            slices_data = []
+            slices = iter_slices if not np.mod(z_iter, 2) else iter_slices_rev
+            for sli in slices:
+                aotf = actuator.aotf.one_frame(actuator.ni_settings, channel)
+                offset = sli - actuator.settings.slices[0]
+                stage = actuator.stage.one_frame(actuator.ni_settings, offset)
+                slices_data.append(np.vstack((galvo, stage, camera, aotf, twitcher)))
+            z_iter += 1
+            channels_data.append(np.hstack(slices_data))
+    return np.hstack(channels_data)
+
+
+@pytest.fixture
+def actuator(daq_devices, daq_settings):
+    actuator = DAQActuator.__new__(DAQActuator)
+    actuator.settings = daq_settings
+    actuator.ni_settings = daq_devices["ni_settings"]
+    actuator.ni_settings.cycle_time = 100
+    actuator.sampling_rate = 9600
+    actuator.smpl_rate = 96000
+    actuator.sweeps_per_frame = 1
+    for name in ["galvo", "stage", "camera", "aotf", "twitcher"]:
+        setattr(actuator, name, daq_devices[name])
+    actuator._segments = {}
+    actuator._timepoint = None
+    actuator._timepoint_keys = {}
+    return actuator
+
+
+def test_timepoint_as_stacked(actuator):
+    assert np.array_equal(actuator._generate_one_timepoint(), stacked_timepoint(actuator))
+    actuator.aotf.power_488 = 50.
+    assert np.array_equal(actuator._generate_one_timepoint(), stacked_timepoint(actuator))
+    actuator.settings.slices = [0., 1., 2.]
+    assert np.array_equal(actuator._generate_one_timepoint(), stacked_timepoint(actuator))
+    actuator.settings.channels["561"]["use"] = False
+    assert np.array_equal(actuator._generate_one_timepoint(), stacked_timepoint(actuator))
+    actuator.settings.channels["561"]["use"] = True
+    actuator.ni_settings.cycle_time = 50
+    assert np.array_equal(actuator._generate_one_timepoint(), stacked_timepoint(actuator))
+
+
+def test_unchanged_blocks_are_kept(actuator):
+    timepoint = actuator._generate_one_timepoint()
+    calls = {name: len(getattr(actuator, name).calls) for name in ["galvo", "stage", "aotf"]}
+    # Written only if the galvo frame of the first frame was copied again
+    timepoint[0, :100] = -1
+    actuator.aotf.power_561 = 50.
+    assert actuator._generate_one_timepoint() is timepoint
+    # One new AOTF frame per channel, the other devices come from the cache
+    assert len(actuator.galvo.calls) == calls["galvo"]
+    assert len(actuator.stage.calls) == calls["stage"]
+    assert len(actuator.aotf.calls) == calls["aotf"] + 2
+    assert (timepoint[0, :100] == -1).all()
+    timepoint[0, :100] = timepoint[0, 100:200]
+    assert np.array_equal(timepoint, stacked_timepoint(actuator))
+
+
+def test_power_makes_daq_data(event_bus, daq_devices, daq_core, daq_settings):
+    actuator = DAQActuator(event_bus, simulate=True, devices=daq_devices, core=daq_core,
+                           settings=daq_settings)
+    event_bus.configuration_settings_event.emit("488_AOTF", POWER, "50")
+    assert actuator.aotf.power_488 == 50.
+    assert np.array_equal(actuator.acq.timepoint, stacked_timepoint(actuator))
+    actuator.task.close()
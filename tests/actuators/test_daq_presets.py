@@ -0,0 +1,98 @@
+from dataclasses import replace
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from eda_plugin.actuators.daq import DAQActuator
+from eda_plugin.actuators.daq_presets import (POWER, DAQPresetsAcquisition, DAQPresetsActuator)
+
+PRESETS = {"screen": (20., 0., 200), "image": (20., 50., 100), "bleach": (80., 0., 300)}
+
+
+@pytest.fixture
+def actuator(event_bus, daq_devices, daq_core, daq_settings):
+    """DAQPresetsActuator with three presets, without Micro-Manager and the GUI."""
+    actuator = DAQPresetsActuator.__new__(DAQPresetsActuator)
+    DAQActuator.__init__(actuator, event_bus, simulate=True, devices=daq_devices, core=daq_core,
+                         settings=daq_settings)
+    actuator.gui = None
+    actuator.presets = {}
+    for name, (power_488, power_561, interval_ms) in PRESETS.items():
+        actuator.add_preset(name, replace(daq_settings, interval_ms=interval_ms),
+                            {"488_AOTF": {POWER: power_488}, "561_AOTF": {POWER: power_561}})
+    actuator.active_preset = "screen"
+    actuator.acq = DAQPresetsAcquisition(actuator, daq_settings)
+    yield actuator
+    actuator.task.close()
+
+
+def count_renders(actuator, monkeypatch) -> list:
+    rendered = []
+    generate = actuator._generate_one_timepoint
+    monkeypatch.setattr(actuator, "_generate_one_timepoint",
+                        lambda: rendered.append(1) or generate())
+    return rendered
+
+
+def test_presets_rendered_once(actuator, monkeypatch):
+    segments = actuator.acq.segments
+    assert list(segments) == ["screen", "image", "bleach"]
+    for name, segment in segments.items():
+        assert segment is actuator.presets[name].segment
+        assert len(segment) == round(actuator.smpl_rate * PRESETS[name][2] / 1000)
+    assert not np.array_equal(segments["screen"].active, segments["image"].active)
+
+    rendered = count_renders(actuator, monkeypatch)
+    actuator.acq.make_daq_data()
+    assert rendered == []
+    assert all(actuator.acq.segments[name] is segment for name, segment in segments.items())
+
+
+def test_preset_applied_restores(actuator):
+    saved = (actuator.settings, actuator.smpl_rate, actuator.ni_settings.cycle_time,
+             actuator.aotf.power_488, actuator.aotf.power_561)
+    with actuator._preset_applied("bleach"):
+        assert actuator.settings is actuator.presets["bleach"].settings
+        assert (actuator.aotf.power_488, actuator.aotf.power_561) == (80., 0.)
+    assert saved == (actuator.settings, actuator.smpl_rate, actuator.ni_settings.cycle_time,
+                     actuator.aotf.power_488, actuator.aotf.power_561)
+
+
+def test_switch_by_index_and_name(actuator):
+    assert actuator.acq.mode == "screen"
+    actuator.call_action(1)
+    assert actuator.acq.mode == "image"
+    actuator.call_action("bleach")
+    assert actuator.acq.mode == "bleach"
+    for unknown in [3, 0.5, "other"]:
+        actuator.call_action(unknown)
+        assert actuator.acq.mode == "bleach"
+    assert actuator.acq.segment_for("bleach") is actuator.presets["bleach"].segment
+
+
+def test_invalidate_on_new_settings(actuator, daq_settings, monkeypatch):
+    image, bleach = (actuator.presets[name].segment for name in ["image", "bleach"])
+    rendered = count_renders(actuator, monkeypatch)
+    actuator.configuration_settings("561_AOTF", POWER, "30")
+    # The active preset is rendered again with the new power, the others are kept
+    screen = actuator.presets["screen"]
+    assert screen.config["561_AOTF"][POWER] == 30.
+    assert len(rendered) == 1 and actuator.acq.segments["screen"] is screen.segment
+    assert actuator.acq.segments["image"] is image
+
+    new_settings = replace(daq_settings, interval_ms=400)
+    actuator.new_settings(new_settings)
+    assert screen.settings is new_settings and screen.segment is None
+    assert actuator.presets["bleach"].segment is bleach
+
+
+def test_non_numeric_setting(actuator, monkeypatch):
+    flippers = []
+    monkeypatch.setattr(actuator, "brightfield_control",
+                        SimpleNamespace(toggle_flippers=flippers.append), raising=False)
+    segment = actuator.presets["screen"].segment
+    actuator.configuration_settings("PrimeB_Camera", "TriggerMode", "Internal Trigger")
+    assert flippers == [True]
+    assert "TriggerMode" not in actuator.presets["screen"].config["PrimeB_Camera"]
+    assert actuator.presets["screen"].segment is segment
@@ -0,0 +1,150 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from eda_plugin.actuators import daq_simulation
+from eda_plugin.actuators.daq import BUFFERED_CHUNKS, EDAAcquisition
+from eda_plugin.actuators.daq_simulation import (DaqError, SimulatedDAQ, SimulatedTask,
+                                                  timepoint_starts)
+
+
+def make_task(**kwargs) -> tuple:
+    task = SimulatedTask("test", **kwargs)
+    task.ao_channels.add_ao_voltage_chan("Dev1/ao0")
+    task.ao_channels.add_ao_voltage_chan("Dev1/ao1")
+    task.timing.cfg_samp_clk_timing(
+        10000, sample_mode=daq_simulation.constants.AcquisitionType.CONTINUOUS)
+    task.out_stream.regen_mode = daq_simulation.constants.RegenerationMode.DONT_ALLOW_REGENERATION
+    writer = daq_simulation.stream_writers.AnalogMultiChannelWriter(task.out_stream)
+    return task, writer
+
+
+def chunk(index: int) -> np.ndarray:
+    return np.full((2, 200), float(index))
+
+
+def test_simulated_task():
+    task, writer = make_task()
+    written = [chunk(0), chunk(1)]
+    for data in written:
+        writer.write_many_sample(data)
+
+    def callback(*_):
+        written.append(chunk(len(written)))
+        writer.write_many_sample(written[-1])
+        return 0
+
+    task.register_every_n_samples_transferred_from_buffer_event(200, callback)
+    task.start()
+    time.sleep(0.3)
+    task.stop()
+    output = task.output()
+    assert task.underruns == 0
+    assert 2000 <= output.shape[1] <= 4000
+    assert np.array_equal(output, np.hstack(written)[:, :output.shape[1]])
+    assert len(task.callback_times) == output.shape[1] // 200
+    periods = np.diff(task.callback_times)
+    assert 0.01 < np.median(periods) < 0.03
+
+    with pytest.raises(DaqError):
+        writer.write_many_sample(np.zeros((3, 10)))
+
+
+def test_underrun():
+    task, writer = make_task()
+    writer.write_many_sample(chunk(1))
+    task.register_every_n_samples_transferred_from_buffer_event(100, lambda *_: 0)
+    task.start()
+    for _ in range(100):
+        if not task.running:
+            break
+        time.sleep(0.01)
+    assert task.underruns == 1 and not task.running
+    assert task.output().shape[1] == 200
+    with pytest.raises(DaqError) as error:
+        writer.write_many_sample(chunk(2))
+    assert error.value.error_code == daq_simulation.UNDERFLOW
+    task.stop()
+
+    # The task can be started again, with its callbacks
+    written = [chunk(3), chunk(4)]
+    for data in written:
+        writer.write_many_sample(data)
+
+    def callback(*_):
+        written.append(chunk(len(written)))
+        writer.write_many_sample(written[-1])
+        return 0
+
+    task.register_every_n_samples_transferred_from_buffer_event(200, callback)
+    task.start()
+    time.sleep(0.2)
+    task.stop()
+    assert task.underruns == 1
+    assert len(task.callback_times) >= 5
+
+    # Without stopping, the outputs hold the last value
+    task, writer = make_task(stop_on_underrun=False)
+    writer.write_many_sample(chunk(1))
+    task.start()
+    time.sleep(0.1)
+    writer.write_many_sample(chunk(2))
+    time.sleep(0.1)
+    task.stop()
+    output = task.output()
+    # Before and after the second chunk
+    assert task.underruns == 2
+    assert output.shape[1] == 400 + task.underrun_samples
+    first_gap = np.argmax(output[0] == 2) - 200
+    assert first_gap > 0 and (output[:, :200 + first_gap] == 1).all()
+    assert (output[:, 200 + first_gap:] == 2).all()
+
+
+def test_eda_acquisition_switching():
+    ni = SimulatedDAQ(smpl_rate=20000, n_channels=3, timepoint_ms=20)
+    acq = EDAAcquisition(ni, None, SimpleNamespace(slow_interval=0.2, fast_interval=0.05))
+    ni.task.start()
+    time.sleep(0.5)
+    switch = ni.task.position
+    acq.interval = acq.interval_fast
+    time.sleep(0.3)
+    ni.task.stop()
+
+    output = ni.task.output()
+    assert ni.task.underruns == 0
+    starts = timepoint_starts(output)
+    slow, fast = starts[starts < switch], starts[starts >= switch]
+    assert (np.diff(slow) == 4000).all() and (np.diff(fast) == 1000).all()
+    # The next timepoint starts after the buffered chunks, or one fast interval after the last
+    assert fast[0] - switch <= max(slow[-1] + 1000 - switch, 0) + (BUFFERED_CHUNKS + 1) * 400
+    assert len(acq.switch_latencies) == 1
+    assert acq.switch_latencies[0] <= (BUFFERED_CHUNKS + 1) * acq.chunk_ms
+
+
+def test_switch_latency_from_request():
+    ni = SimulatedDAQ(smpl_rate=20000, n_channels=3, timepoint_ms=20)
+    acq = EDAAcquisition(ni, None, SimpleNamespace(slow_interval=0.2, fast_interval=0.05))
+    acq.interval = acq.interval_fast
+    requested = acq._switch_requested
+    time.sleep(0.01)
+    # The task has not output anything yet, the first fast sample is 200 samples (10 ms) ahead
+    acq._switched(acq.interval, acq._stream_start + 200)
+    elapsed = (time.perf_counter() - requested) * 1000
+    assert 20 <= acq.switch_latencies[0] <= 10 + elapsed
+
+
+def test_simulated_actuator(event_bus, daq_devices, daq_core, daq_settings):
+    from eda_plugin.actuators.daq import DAQActuator
+
+    actuator = DAQActuator(event_bus, simulate=True, devices=daq_devices, core=daq_core,
+                           settings=daq_settings)
+    assert isinstance(actuator.task, SimulatedTask)
+    actuator.task.start()
+    time.sleep(0.2)
+    actuator.task.stop()
+    output = actuator.task.output()
+    assert actuator.task.underruns == 0 and output.shape[0] == 7
+    timepoint = actuator.acq.timepoint
+    assert np.array_equal(output[:, :timepoint.shape[1]], timepoint)
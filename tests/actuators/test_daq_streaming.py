@@ -0,0 +1,61 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from eda_plugin.actuators.daq_streaming import Segment, SegmentStream, hold_samples
+
+
+def test_segment():
+    active = np.arange(12.).reshape(3, 4)
+    segment = Segment(active, hold=5)
+    assert segment.shape == (3, 9)
+    samples = segment.samples()
+    assert np.array_equal(samples[:, :4], active)
+    assert (samples[:, 4:] == active[:, -1:]).all()
+
+    out = np.zeros((3, 4))
+    assert segment.fill(out, 2) == 4
+    assert np.array_equal(out[:, :2], active[:, 2:]) and (out[:, 2:] == active[:, -1:]).all()
+    assert segment.fill(out, 7) == 2
+
+    assert hold_samples(1000, 10, active) == 6
+    assert hold_samples(1000, 1, active) == 0
+
+
+def test_stream_chunks():
+    active = np.arange(14.).reshape(2, 7)
+    segments = [Segment(active, hold_samples(1000, 20, active)),
+                Segment(2 * active, 3)]
+    next_segment = itertools.cycle(segments).__next__
+    stream = SegmentStream(2, chunk_size=4)
+    chunks = [stream.next_chunk(next_segment).copy() for _ in range(8)]
+    out = np.hstack(chunks)
+    assert out.shape == (2, 32)
+    assert np.array_equal(out[:, :20], segments[0].samples())
+    assert np.array_equal(out[:, 20:30], segments[1].samples())
+    assert np.array_equal(out[:, 30:], active[:, :2])
+
+    # The buffer is the same for every chunk
+    assert stream.next_chunk(lambda: segments[0]) is stream.buffer
+    stream.reset()
+    assert np.array_equal(stream.next_chunk(lambda: segments[0]), active[:, :4])
+    with pytest.raises(ValueError):
+        SegmentStream(2, 4).next_chunk(lambda: Segment(active[:, :0], value=[0, 0]))
+
+
+def test_retime():
+    active = np.arange(8.).reshape(2, 4)
+    slow, fast = Segment(active, hold=100), Segment(2 * active, hold=2)
+    stream = SegmentStream(2, chunk_size=4)
+    stream.next_chunk(lambda: slow)
+    stream.next_chunk(lambda: slow)
+    assert stream.position == 8
+    # Shorter than played already: the next segment starts with the next chunk
+    stream.retime(2)
+    chunk = stream.next_chunk(lambda: fast)
+    assert stream.start == 8 and np.array_equal(chunk, fast.active)
+    # Longer: the playing segment is held longer
+    stream.retime(10)
+    assert len(stream.segment) == 14 and stream.segment.active is fast.active
+    assert (stream.next_chunk(lambda: slow) == 2 * active[:, -1:]).all()
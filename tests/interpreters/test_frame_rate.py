@@ -0,0 +1,72 @@
+import pytest
+
+from eda_plugin.interpreters import frame_rate
+from eda_plugin.interpreters.frame_rate import (BinaryFrameRateInterpreter,
+                                                PredictiveFrameRateInterpreter, TrendModel)
+
+
+DEFAULT_PARAMS = {"slow_interval": 5., "fast_interval": 0.5,
+                  "lower_threshold": 70, "upper_threshold": 90}
+
+# Decision parameters recorded during an event rising towards the upper threshold:
+# (decision parameter, elapsed [s], timepoint)
+REPLAY = [(40, 5, 1), (46, 10, 2), (53, 15, 3), (61, 20, 4), (70, 25, 5), (79, 30, 6),
+          (87, 35, 7), (95, 40, 8), (96, 40.5, 9), (60, 41, 10)]
+
+
+@pytest.fixture
+def default_settings(monkeypatch):
+    monkeypatch.setattr(frame_rate.settings, "get_settings", lambda *_: dict(DEFAULT_PARAMS))
+
+
+def replay(interpreter, latency=None):
+    intervals = []
+    for value, elapsed, timepoint in REPLAY:
+        if latency is not None:
+            interpreter.latency = latency
+        interpreter.calculate_interpretation(value, elapsed, timepoint)
+        intervals.append(interpreter.interval)
+    return intervals
+
+
+def test_trend_model_linear():
+    trend = TrendModel(n_points=3)
+    for t in range(40):
+        trend.update(2. * t + 1, t)
+    assert trend.slope == pytest.approx(2., rel=1e-3)
+    assert trend.extrapolate(1.5) == pytest.approx(2. * 39 + 1 + 3., rel=1e-3)
+
+    trend.reset()
+    assert trend.level is None
+
+
+def test_binary_replay(default_settings, event_bus, qtbot):
+    interpreter = BinaryFrameRateInterpreter(event_bus)
+    intervals = replay(interpreter)
+    assert intervals.index(0.5) == 7
+
+
+def test_predictive_replay(default_settings, event_bus, qtbot):
+    interpreter = PredictiveFrameRateInterpreter(event_bus, n_points=3)
+    intervals = replay(interpreter, latency=4.)
+    # The rising trend triggers fast imaging before the value itself crosses the threshold
+    assert intervals.index(0.5) < 7
+    assert intervals[-1] == 5.
+
+
+def test_predictive_without_latency(default_settings, event_bus, qtbot):
+    interpreter = PredictiveFrameRateInterpreter(event_bus, n_points=3)
+    intervals = replay(interpreter, latency=0.)
+    assert intervals.index(0.5) == 7
+
+
+def test_latency_measured(default_settings, event_bus, qtbot):
+    import numpy as np
+    from pymm_eventserver.data_structures import PyImage
+
+    interpreter = PredictiveFrameRateInterpreter(event_bus)
+    event_bus.new_image_event.emit(PyImage(np.zeros((8, 8)), {}, 3, 0, 0, 0))
+    event_bus.new_image_event.emit(PyImage(np.zeros((8, 8)), {}, 4, 0, 0, 0))
+    event_bus.new_decision_parameter.emit(10., 1., 4)
+    assert interpreter.latency > 0
+    assert interpreter.image_times == {}
@@ -0,0 +1,36 @@
+import gc
+
+import numpy as np
+from qtpy import QtWidgets
+from pymm_eventserver.data_structures import PyImage
+
+from eda_plugin.utility.headless import build_pipeline
+
+
+CONFIG = {
+    "analyser": {"class": "eda_plugin.analysers.image.ImageAnalyser",
+                 "kwargs": {"analyser_settings": {"n_timepoints": 1}}},
+    "interpreter": {"class": "eda_plugin.interpreters.frame_rate.BinaryFrameRateInterpreter",
+                    "kwargs": {"params": {"slow_interval": 5., "fast_interval": 0.5,
+                                          "lower_threshold": 0.2, "upper_threshold": 0.5}}},
+    "writer": {"class": "eda_plugin.utility.writers.Writer",
+               "kwargs": {"options": {"save_images": False, "network_images": False}}},
+}
+
+
+def test_headless_pipeline(event_bus, MMSettings_mock, qtbot):
+    # Widgets left by other tests must not be collected while counting
+    gc.collect()
+    n_widgets = len(QtWidgets.QApplication.topLevelWidgets())
+    pipeline = build_pipeline(CONFIG, event_bus=event_bus)
+    assert len(QtWidgets.QApplication.topLevelWidgets()) == n_widgets
+    assert all(pipeline[c].gui is None for c in ["analyser", "interpreter", "writer"])
+    assert not pipeline["writer"].options["save_images"]
+
+    event_bus.mda_settings_event.emit(MMSettings_mock)
+    event_bus.acquisition_started_event.emit(None)
+    with qtbot.waitSignal(event_bus.new_interpretation, timeout=2000) as blocker:
+        for channel in range(2):
+            event_bus.new_image_event.emit(PyImage(np.ones((128, 128)), {}, 0, channel, 0, 0))
+    assert blocker.args == [0.5]
+    pipeline["analyser"].threadpool.waitForDone(1000)
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+HEAVY_MODULES = ["tensorflow", "nidaqmx", "zarr", "pyqtgraph", "pymmcore_widgets", "pycromanager",
+                 "napari", "ome_types", "isimgui"]
+
+
+def test_import_is_lightweight():
+    """Importing the package should not pull in the optional/heavy dependencies."""
+    code = ("import sys, time; t0 = time.perf_counter(); import eda_plugin; "
+            "print(time.perf_counter() - t0); "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True)
+    import_time, loaded = result.stdout.strip().splitlines()[-2:]
+    assert loaded == "[]"
+    assert float(import_time) < 2
+
+
+def test_headless_startup(tmp_path):
+    """The headless core loop on a synthetic camera starts quickly and only with what it needs."""
+    config = {
+        "event_bus": "synthetic",
+        "synthetic": {"fps": 200, "shape": [128, 128]},
+        "mda": {"channels": ["Channel_0", "Channel_1"], "time_plan": {"interval": 0, "loops": 3}},
+        "analyser": {"class": "eda_plugin.analysers.image.ImageAnalyser"},
+        "interpreter": {"class": "eda_plugin.interpreters.frame_rate.BinaryFrameRateInterpreter",
+                        "kwargs": {"params": {"slow_interval": 5, "fast_interval": 0.5,
+                                              "lower_threshold": 80, "upper_threshold": 100}}},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    code = ("import sys, time; t0 = time.perf_counter(); from eda_plugin.examples import main\n"
+            "try:\n    main.headless(sys.argv[1])\nexcept SystemExit as exit:\n"
+            "    print(exit.code)\n"
+            "print(time.perf_counter() - t0); "
+            f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run([sys.executable, "-c", code, str(config_file)], capture_output=True,
+                            text=True, check=True, env=env, timeout=60)
+    exit_code, startup_time, loaded = result.stdout.strip().splitlines()[-3:]
+    assert exit_code == "0"
+    assert "Synthetic acquisition done: 6 frames" in result.stderr
+    assert loaded == "[]"
+    assert float(startup_time) < 5
+
+
+@pytest.mark.parametrize("frame_ring_slots", [0, 4])
+def test_headless_writer(frame_ring_slots, tmp_path):
+    """A Writer on the core bus opens its store from the MDASequence that starts the acquisition."""
+    config = {
+        "event_bus": "synthetic",
+        "frame_ring_slots": frame_ring_slots,
+        "synthetic": {"fps": 200, "shape": [128, 128]},
+        "mda": {"channels": ["Channel_0", "Channel_1"], "time_plan": {"interval": 0, "loops": 3}},
+        "writer": {"class": "eda_plugin.utility.writers.Writer",
+                   "kwargs": {"options": {"path": str(tmp_path / "data")}}},
+    }
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(config))
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run([sys.executable, "-m", "eda_plugin.examples.main", "headless",
+                             str(config_file)], capture_output=True, text=True, env=env,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+
+    import zarr
+
+    stores = list((tmp_path / "data").glob("**/*.ome.zarr"))
+    assert len(stores) == 1
+    images = zarr.open(str(stores[0]), mode="r")["Images/0"]
+    assert images.shape[1:] == (2, 1, 128, 128)
+    assert images[2, 1, 0].any()
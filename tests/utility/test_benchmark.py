@@ -0,0 +1,26 @@
+import pytest
+
+from eda_plugin.utility.benchmark import BenchmarkSettings, run_benchmark
+
+
+@pytest.mark.parametrize("bus", ["core", "micro_manager"])
+def test_benchmark(bus, tmp_path, qtbot):
+    settings = BenchmarkSettings(bus=bus, fps=0, n_frames=21, shape=(128, 128), n_channels=2,
+                                 path=str(tmp_path), timeout=20)
+    result = run_benchmark(settings)
+    assert result.frames_sent == 20
+    assert result.frames_delivered == 20
+    assert result.delivered_fps > 0
+    assert set(result.latency_ms) == {"mean", "p50", "p99", "max"}
+    assert result.analyser_dropped <= 10
+    assert "delivered fps" in result.report()
+    assert settings.n_frames == 21
+
+
+def test_benchmark_frame_ring(tmp_path, qtbot):
+    settings = BenchmarkSettings(fps=0, n_frames=20, shape=(128, 128), n_channels=2,
+                                 path=str(tmp_path), timeout=20, frame_ring_slots=4, viewer=False)
+    result = run_benchmark(settings)
+    assert result.frames_delivered == 20
+    assert result.writer["written"] >= 20
+    assert "frame ring dropped" in result.report()
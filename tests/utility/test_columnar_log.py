@@ -0,0 +1,29 @@
+import numpy as np
+import zarr
+
+from eda_plugin.utility.columnar_log import ColumnarLog, read_log, write_block
+
+
+def test_blocks():
+    group = zarr.group()
+    log = ColumnarLog({"timepoint": "i8", "decision": "f8", "interval": "f8"}, block_size=4)
+    blocks = []
+    for t in range(10):
+        row = {"timepoint": t, "decision": t / 2}
+        if t % 2:
+            row["interval"] = 100.
+        block = log.append(**row)
+        if block is not None:
+            blocks.append(block)
+    assert len(blocks) == 2 and log.rows == 2
+    for block in blocks:
+        write_block(group, block, chunk_size=4)
+    write_block(group, log.take())
+    assert log.take() is None
+
+    table = read_log(group)
+    assert table.dtype.names == ("timepoint", "decision", "interval")
+    assert np.array_equal(table["timepoint"], np.arange(10))
+    assert np.array_equal(table["decision"], np.arange(10) / 2)
+    assert np.isnan(table["interval"][::2]).all() and (table["interval"][1::2] == 100).all()
+    assert group["decision"].chunks == (4,)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from eda_plugin.utility import compression
+
+
+def test_make_compressor():
+    assert compression.make_compressor("none") is None
+    assert compression.make_compressor(None) is None
+    blosc = compression.make_compressor({"cname": "lz4", "clevel": 1, "shuffle": "byte"})
+    assert blosc.cname == "lz4" and blosc.clevel == 1
+    with pytest.raises(ValueError):
+        compression.make_compressor("gzip_9000")
+
+
+def test_choose_codec():
+    frame = np.random.default_rng(0).poisson(100, (256, 256)).astype(np.uint16)
+    results = compression.benchmark_codecs(frame, repeats=1)
+    assert {result["preset"] for result in results} == set(compression.PRESETS) - {"none"}
+    assert all(result["ratio"] > 1 for result in results)
+    assert compression.choose_codec(frame) != "none"
+    # Nothing can keep up with this
+    assert compression.choose_codec(frame, data_rate_mb_s=1e9) == "none"
+    noise = np.random.default_rng(0).integers(0, 2**16, (256, 256), dtype=np.uint16)
+    assert compression.choose_codec(noise) == "none"
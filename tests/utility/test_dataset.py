@@ -0,0 +1,64 @@
+import glob
+
+import numpy as np
+from pymm_eventserver.data_structures import PyImage
+
+from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+from eda_plugin.utility.dataset import EDADataset
+from eda_plugin.utility.writers import Writer
+
+
+def test_read_back(event_bus, java_settings_event, tmp_path, qtbot):
+    # Fast imaging once the decision parameter is above 0.25, as in an experiment the interpreter
+    # gets the decisions before the Writer
+    interpreter = BinaryFrameRateInterpreter(event_bus, gui=False, params={
+        "slow_interval": 5., "fast_interval": 0., "lower_threshold": 0.15,
+        "upper_threshold": 0.25})
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    for t in range(6):
+        for c in range(2):
+            frame = np.full((16, 8), t * 10 + c, dtype=np.uint16)
+            event_bus.new_image_event.emit(PyImage(frame, {}, t, c, 0, t * 100))
+        event_bus.new_network_image.emit(np.full((16, 8), t, dtype=np.float32), (t, 0))
+        event_bus.new_decision_parameter.emit(t / 10, t / 10, t)
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+    writer.close()
+    assert interpreter.interval == 0
+
+    dataset = EDADataset(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0])
+    assert len(dataset) == 6
+    assert np.allclose(dataset.decisions, np.arange(6) / 10)
+    assert list(dataset.fast_timepoints()) == [3, 4, 5]
+    assert dataset.planes is not None and len(dataset.planes) == 12
+
+    timepoint = dataset.timepoint(2)
+    assert timepoint["image"].shape == (2, 1, 16, 8) and timepoint["image"][1, 0, 0, 0] == 21
+    assert timepoint["network"][0, 0, 0, 0] == 2 and timepoint["interval"] == 5
+
+    fast = dataset.view(dataset.fast_timepoints())
+    images = fast.images(channel=0, z_slice=0)
+    assert images.shape == (3, 16, 8)
+    assert np.array_equal(images[:, 0, 0], [30, 40, 50])
+    assert np.array_equal(fast.network_images()[:, 0, 0, 0, 0], [3, 4, 5])
+    assert [timepoint["timepoint"] for timepoint in fast] == [3, 4, 5]
+
+
+def test_without_images(event_bus, java_settings_event, tmp_path, qtbot):
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path), "save_images": False})
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    for t in range(3):
+        for c in range(2):
+            event_bus.new_image_event.emit(PyImage(np.zeros((16, 8), np.uint16), {}, t, c, 0, 0))
+        event_bus.new_decision_parameter.emit(t / 10, t / 10, t)
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+    writer.close()
+
+    dataset = EDADataset(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0])
+    assert dataset.images is None and dataset.nn_images is None
+    view = dataset.view([0, 2])
+    assert view.images() is None
+    assert view.network_images() is None
+    assert np.allclose(view.decisions, [0, 0.2])
@@ -0,0 +1,154 @@
+import numpy as np
+
+from eda_plugin.utility.eda_gui import EDAPlot
+
+
+def test_plot_refresh(qtbot):
+    plot = EDAPlot(max_points=100)
+    qtbot.addWidget(plot)
+    for t in range(1000):
+        plot.add_datapoint(float(t % 50), t / 10, t)
+    assert plot.plotted == 0
+    plot._refresh_plot()
+    assert len(plot.output_scatter.data) == 1000
+    x, y = plot.output_line.getData()
+    assert len(x) <= 100 and y.max() == 49 and y.min() == 0
+
+    plot.add_datapoint(7., 100., 1000)
+    qtbot.waitUntil(lambda: plot.plotted == 1001, timeout=1000)
+    assert len(plot.output_scatter.data) == 1001
+    assert np.array_equal(plot.y_data[-2:], [49., 7.])
+
+    plot._reset_plot()
+    assert len(plot.x_data) == 0 and len(plot.output_scatter.data) == 0
+
+
+def test_overlay_render(qtbot):
+    from eda_plugin.utility.eda_gui import NetworkImageViewer
+
+    viewer = NetworkImageViewer()
+    qtbot.addWidget(viewer)
+    image = np.zeros((64, 48), np.uint16)
+    image[0, 0], image[0, 1] = 1000, 500
+    network = np.zeros((60, 48), np.float32)
+    network[0, 1], network[0, 2] = 2., 1.
+
+    rendered = viewer.renderer.render(image, network)
+    lut = viewer.inferno_colormap()
+    pixel = lambda value: (0xFF << 24 | int(value[0]) << 16 | int(value[1]) << 8 | int(value[2]))
+    assert rendered[0, 0] == pixel([255] * 3)
+    # Screen blend of gray 127 and the brightest color
+    assert rendered[0, 1] == pixel([127 + c - 127 * c // 255 for c in lut[255].astype(int)])
+    assert rendered[0, 2] == pixel(lut[127])
+    assert rendered[63, 0] == pixel(lut[0])
+    pixmap, factor = viewer.renderer.to_pixmap()
+    assert pixmap.size().width() == 48 and factor == 1
+    assert viewer.renderer.to_pixmap()[0] is None
+
+    viewer.add_image(image, 0)
+    with qtbot.waitSignal(viewer.renderer.rendered, timeout=2000):
+        viewer.add_network_image(network, (0, 0))
+    qtbot.waitUntil(lambda: viewer.image.pixmap().width() == 48, timeout=2000)
+    viewer.close()
+
+
+def test_display_resolution(qtbot):
+    from eda_plugin.utility.eda_gui import NetworkImageViewer, display_factor
+
+    assert [display_factor(scale) for scale in [2, 1, 0.6, 0.5, 0.3, 0.2]] == [1, 1, 1, 2, 2, 4]
+    viewer = NetworkImageViewer()
+    qtbot.addWidget(viewer)
+    image = np.random.default_rng(0).integers(0, 1000, (512, 512), np.uint16)
+    network = np.zeros((512, 512), np.float32)
+    network[101, 101] = 1.
+
+    rendered = viewer.renderer.render(image, network, 4).copy()
+    assert rendered.shape == (128, 128)
+    # The single pixel event survives the block max
+    assert rendered[25, 25] != viewer.renderer.render(image, np.zeros_like(network), 4)[25, 25]
+
+    viewer.resize(200, 200)
+    viewer.show()
+    qtbot.waitExposed(viewer)
+    viewer.add_image(image, 0)
+    assert viewer.display_factor() > 1
+    with qtbot.waitSignal(viewer.renderer.rendered, timeout=2000):
+        viewer.add_network_image(network, (0, 0))
+    qtbot.waitUntil(lambda: viewer.image.scale() == viewer.display_factor(), timeout=2000)
+    viewer.scale(8, 8)
+    viewer.wheelEvent(mock_wheel(120))
+    qtbot.waitUntil(lambda: viewer.image.scale() == 1, timeout=2000)
+    assert viewer.image.pixmap().width() == 512
+    viewer.close()
+
+
+def mock_wheel(angle):
+    from unittest import mock
+
+    from qtpy import QtCore
+
+    event = mock.MagicMock()
+    event.modifiers.return_value = QtCore.Qt.ControlModifier
+    event.angleDelta.return_value.y.return_value = angle
+    return event
+
+
+def test_plane_store():
+    from eda_plugin.utility.eda_gui import PlaneStore
+
+    store = PlaneStore((4, 6), np.float32, chunk_size=2)
+    store.set_plane(0, np.ones((4, 6)))
+    store.set_plane(5, np.full((4, 6), 5))
+    assert store.shape == (6, 4, 6) and store.dtype == np.float32
+    # Timepoints 2 and 3 were skipped, their chunk is never allocated
+    assert sorted(store.chunks) == [0, 2]
+    assert store[5, 1, 2] == 5 and store[3].max() == 0
+    assert store[4:6, :2].shape == (2, 2, 6)
+    assert np.asarray(store).sum() == 4 * 6 * 6
+
+
+def test_napari_viewer():
+    from napari.components import ViewerModel
+
+    from eda_plugin.utility.eda_gui import NapariImageViewer
+
+    viewer = NapariImageViewer(ViewerModel())
+    for t in range(3):
+        viewer.add_network_image(np.full((64, 64), t, np.float32), (t, 0))
+    assert viewer.data.shape[0] == 3 and viewer.data.dtype == np.float32
+    assert viewer.viewer.dims.point[0] == 2
+    assert viewer.layer.data is viewer.data
+
+
+def test_gui_relay(event_bus, qtbot):
+    import threading
+
+    from eda_plugin.utility.eda_gui import GUIRelay
+
+    relay = GUIRelay(event_bus, rate=10)
+    batches, networks, images = [], [], []
+    relay.new_decision_parameters.connect(lambda y, x, t: batches.append(t))
+    relay.new_network_image.connect(lambda image, dims: networks.append(dims))
+    relay.new_prepared_image.connect(lambda image, t: images.append(t))
+
+    def analyse():
+        for t in range(50):
+            event_bus.new_prepared_image.emit(np.zeros((4, 4)), t)
+            event_bus.new_decision_parameter.emit(float(t), t / 10, t)
+            event_bus.new_network_image.emit(np.zeros((4, 4)), (t, 0))
+
+    thread = threading.Thread(target=analyse)
+    thread.start()
+    thread.join()
+    relay.deliver()
+    assert len(batches) == 1 and np.array_equal(batches[0], np.arange(50))
+    assert networks == [(49, 0)] and relay.dropped["network_image"] == 49
+    # The viewer only resets for a new acquisition on the image of timepoint 0
+    assert images == [0, 49] and relay.dropped["prepared_image"] == 48
+
+    event_bus.new_decision_parameter.emit(1., 5., 50)
+    event_bus.acquisition_started_event.emit(None)
+    relay.deliver()
+    assert len(batches) == 1
+    event_bus.new_decision_parameter.emit(1., 0., 0)
+    qtbot.waitUntil(lambda: len(batches) == 2, timeout=1000)
@@ -0,0 +1,135 @@
+from unittest import mock
+
+import numpy as np
+import pytest
+from pymm_eventserver.data_structures import PyImage
+
+from eda_plugin.utility.event_bus import EventBus
+from eda_plugin.utility.frame_ring import FrameRing
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(3)
+    yield ring
+    ring.close()
+
+
+def test_put_and_view(ring):
+    image = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    slot = ring.put(image)
+    frame = ring.view(slot)
+    assert np.array_equal(frame, image)
+    assert np.shares_memory(frame, ring.frames)
+    assert not frame.flags.writeable
+
+
+def test_slots_in_use_are_not_overwritten(ring):
+    ring.register_consumer()
+    slots = [ring.put(np.full((2, 2), i, dtype=np.uint8)) for i in range(3)]
+    assert slots == [0, 1, 2]
+    assert ring.put(np.full((2, 2), 3, dtype=np.uint8)) is None
+    assert ring.dropped == 1
+    assert ring.view(0)[0, 0] == 0
+
+    with ring.borrow(1) as frame:
+        assert frame[0, 0] == 1
+    assert not ring.in_use(1)
+    assert ring.put(np.full((2, 2), 4, dtype=np.uint8)) == 1
+    assert ring.view(0)[0, 0] == 0
+
+
+def test_all_consumers_release(ring):
+    ring.register_consumer()
+    ring.register_consumer()
+    slot = ring.put(np.zeros((2, 2)))
+    ring.release(slot)
+    assert ring.in_use(slot)
+    ring.release(slot)
+    assert not ring.in_use(slot)
+
+
+def test_new_frame_shape(ring):
+    ring.put(np.zeros((2, 2), dtype=np.uint8))
+    slot = ring.put(np.ones((4, 4), dtype=np.uint16))
+    assert ring.shape == (4, 4)
+    assert ring.dtype == np.uint16
+    assert ring.view(slot).sum() == 16
+
+
+def test_close_waits_for_slots_in_use(ring):
+    ring.register_consumer()
+    slot = ring.put(np.full((2, 2), 5, dtype=np.uint16))
+    ring.close()
+    assert ring.put(np.zeros((2, 2), dtype=np.uint16)) is None
+    # Still mapped for the consumer that holds the slot
+    assert ring.view(slot)[0, 0] == 5
+    ring.release(slot)
+    assert ring.frames is None
+
+
+def test_attach(ring):
+    slot = ring.put(np.full((5, 5), 7, dtype=np.uint16))
+    other = FrameRing.attach(ring.spec())
+    assert np.array_equal(other.view(slot), ring.view(slot))
+    other.close()
+
+
+def test_event_bus_frames(qtbot):
+    event_bus = EventBus(mock.MagicMock(), frame_ring_slots=2)
+    event_bus.frame_ring.register_consumer()
+    image = PyImage(np.ones((8, 8), dtype=np.uint16), {}, 3, 1, 0, 0)
+    with qtbot.waitSignal(event_bus.new_frame_event) as blocker:
+        event_bus.new_image_event.emit(image)
+    slot, metadata = blocker.args
+    assert metadata.raw_image is None
+    assert metadata.timepoint == 3 and metadata.channel == 1
+    with event_bus.frame_ring.borrow(slot) as frame:
+        assert np.array_equal(frame, image.raw_image)
+    event_bus.frame_ring.close()
+
+
+def test_full_ring_passes_frames_on(ring):
+    ring.register_consumer()
+    image = PyImage(np.ones((2, 2), dtype=np.uint8), {}, 0, 0, 0, 0)
+    slots = [ring.publish(image)[0] for _ in range(3)]
+    slot, passed = ring.publish(image)
+    assert slots == [0, 1, 2] and slot == -1 and passed is image
+    with ring.image(slot, passed) as py_image:
+        assert py_image.raw_image is image.raw_image
+
+
+def test_consumers_on_the_ring(java_settings_event, MMSettings_mock, tmp_path):
+    import glob
+    import zarr
+    from multiprocessing import shared_memory
+
+    from eda_plugin.analysers.image import ImageAnalyser
+    from eda_plugin.utility.writers import Writer
+
+    event_bus = EventBus(mock.MagicMock(), frame_ring_slots=2)
+    analyser = ImageAnalyser(event_bus, gui=False)
+    analyser.new_mda_settings(MMSettings_mock)
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    assert event_bus.frame_ring.n_consumers == 2
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    frames = {}
+    for t in range(5):
+        for c in range(2):
+            frames[t, c] = np.full((128, 64), t * 10 + c, dtype=np.uint16)
+            event_bus.new_image_event.emit(PyImage(frames[t, c], {}, t, c, 0, t * 100))
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+    analyser.threadpool.waitForDone(1000)
+
+    ring = event_bus.frame_ring
+    assert not any(ring.in_use(slot) for slot in range(ring.n_slots))
+    root = zarr.open(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0], mode="r")
+    for (t, c), frame in frames.items():
+        assert np.array_equal(root["Images/0"][t, c, 0], frame)
+    writer.close()
+
+    name = ring.spec()["name"]
+    event_bus.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
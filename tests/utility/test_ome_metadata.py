@@ -1,6 +1,8 @@
 from eda_plugin.utility.ome_metadata import OME
 import numpy as np
+import ome_types
 import os
+import re
 import tifffile
 from pymm_eventserver.data_structures import PyImage
 # from tests.utility.test_writers import test_clean_up
@@ -29,7 +31,7 @@ def test_writing_data(MMSettings_mock):
             image = PyImage(frame, None, timepoint + 1, channel + 1, 1, time)
             ome.add_plane_from_image(image)
     ome.finalize_metadata()
-    xml_ome = ome.ome.to_xml()
+    xml_ome = ome.to_xml()
     tifffile.imwrite(
         os.path.dirname(os.path.dirname(__file__)) + "/data/FOV.ome.tif",
         test_data,
@@ -37,5 +39,47 @@ def test_writing_data(MMSettings_mock):
     )
 
 
+def test_plane_table(MMSettings_mock):
+    ome = OME(settings=MMSettings_mock)
+    frame = np.zeros((32, 16), dtype=np.uint16)
+    for timepoint in range(600):
+        for channel in range(2):
+            ome.add_plane_from_image(PyImage(frame, None, timepoint, channel, 0,
+                                             timepoint * 300 + channel * 150))
+    assert ome.n_planes == 1200
+    assert np.array_equal(ome.planes()["t"][::2], np.arange(600))
+
+    xml = ome.to_xml()
+    ome_types.validate_xml(xml)
+    pixels = ome_types.from_xml(xml).images[0].pixels
+    assert (pixels.size_t, pixels.size_c) == (600, 2)
+    assert len(pixels.planes) == len(pixels.tiff_data_blocks) == 1200
+    plane = pixels.planes[3]
+    assert (plane.the_t, plane.the_c, plane.delta_t) == (1, 1, 450)
+    assert pixels.tiff_data_blocks[3].ifd == 3
+    assert "<Plane" not in ome.to_xml(planes=False)
+
+
+def test_planes_in_any_serialization(MMSettings_mock, monkeypatch):
+    import xml.etree.ElementTree as ElementTree
+
+    ome = OME(settings=MMSettings_mock)
+    frame = np.zeros((32, 16), dtype=np.uint16)
+    for channel in range(2):
+        ome.add_plane_from_image(PyImage(frame, None, 0, channel, 0, channel * 150))
+    ome.finalize_metadata()
+    xml = ome.ome.to_xml()
+    namespace = "http://www.openmicroscopy.org/Schemas/OME/2016-06"
+    # Prefixed tags and other indentation than the one ome_types writes now
+    prefixed = re.sub(r"<(/?)(\w+)", r"<\1ome:\2", xml.replace('xmlns="', 'xmlns:ome="'))
+    prefixed = re.sub(r"\n +", "\n\t", prefixed)
+    for variant in [prefixed, re.sub(r"<ome:Pixels([^>]*)>.*</ome:Pixels>",
+                                     r"<ome:Pixels\1/>", prefixed, flags=re.S)]:
+        monkeypatch.setattr(type(ome.ome), "to_xml", lambda _, variant=variant: variant)
+        pixels = ElementTree.fromstring(ome.to_xml()).find(f".//{{{namespace}}}Pixels")
+        assert len(pixels.findall(f"{{{namespace}}}Plane")) == 2
+        assert len(pixels.findall(f"{{{namespace}}}TiffData")) == 2
+
+
 if __name__ == "__main__":
     main()
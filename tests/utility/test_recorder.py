@@ -0,0 +1,76 @@
+from unittest import mock
+
+import numpy as np
+from pymm_eventserver.data_structures import MMSettings, PyImage
+
+from eda_plugin.utility.event_bus import EventBus
+from eda_plugin.utility.recorder import EventPlayer, EventRecorder
+from eda_plugin.utility.writers import Writer
+
+
+def record(event_bus, path, MMSettings_mock, start_event=None):
+    recorder = EventRecorder(event_bus, str(path))
+    event_bus.mda_settings_event.emit(MMSettings_mock)
+    event_bus.acquisition_started_event.emit(start_event)
+    images = []
+    for timepoint in range(3):
+        for channel in range(2):
+            image = np.full((16, 32), timepoint * 10 + channel, dtype=np.uint16)
+            images.append(PyImage(image, {"Camera": "Fake"}, timepoint, channel, 0, timepoint))
+            event_bus.new_image_event.emit(images[-1])
+        event_bus.new_interpretation.emit(float(timepoint))
+    event_bus.acquisition_ended_event.emit(None)
+    recorder.close()
+    return images
+
+
+def test_record_replay(event_bus, MMSettings_mock, tmp_path, qtbot):
+    images = record(event_bus, tmp_path, MMSettings_mock)
+
+    player = EventPlayer(str(tmp_path))
+    assert player.n_frames == 6
+    assert player.interpretations == [0., 1., 2.]
+
+    replay_bus = EventBus(mock.MagicMock())
+    received, settings, events = [], [], []
+    replay_bus.new_image_event.connect(received.append)
+    replay_bus.mda_settings_event.connect(settings.append)
+    replay_bus.acquisition_started_event.connect(lambda _: events.append("started"))
+    replay_bus.acquisition_ended_event.connect(lambda _: events.append("ended"))
+    player.play(replay_bus, speed=0, block=True)
+
+    assert events == ["started", "ended"]
+    assert settings[0].n_channels == MMSettings_mock.n_channels
+    assert list(settings[0].channels) == list(MMSettings_mock.channels)
+    assert len(received) == len(images)
+    for replayed, original in zip(received, images):
+        assert np.array_equal(replayed.raw_image, original.raw_image)
+        assert replayed.raw_image.dtype == np.uint16
+        assert (replayed.timepoint, replayed.channel) == (original.timepoint, original.channel)
+        assert replayed.metadata == original.metadata
+
+
+def test_threaded_replay(event_bus, MMSettings_mock, tmp_path, qtbot):
+    record(event_bus, tmp_path, MMSettings_mock)
+    player = EventPlayer(str(tmp_path))
+    replay_bus = EventBus(mock.MagicMock())
+    interpretations = []
+    replay_bus.new_interpretation.connect(interpretations.append)
+    with qtbot.waitSignal(player.finished, timeout=5000):
+        player.play(replay_bus, speed=4, interpretations=True)
+    qtbot.waitUntil(lambda: len(interpretations) == 3)
+    assert interpretations == [0., 1., 2.]
+
+
+def test_replay_into_writer(event_bus, MMSettings_mock, java_settings_event, tmp_path, qtbot):
+    """Micro-Manager acquisitions are replayed with their MMSettings, the Writer can use these."""
+    record(event_bus, tmp_path / "recording", MMSettings_mock, java_settings_event)
+    replay_bus = EventBus(mock.MagicMock())
+    writer = Writer(replay_bus, gui=False, options={"path": str(tmp_path / "data")})
+    EventPlayer(str(tmp_path / "recording")).play(replay_bus, speed=0, block=True)
+    writer.close(5)
+
+    expected = MMSettings(java_settings_event.get_settings())
+    assert writer.settings.n_channels == expected.n_channels == 2
+    assert list(writer.settings.channels) == list(expected.channels)
+    assert writer.arrays["images"][2, 1, 0, 0, 0] == 21
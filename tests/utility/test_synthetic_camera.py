@@ -0,0 +1,72 @@
+import numpy as np
+import tifffile
+from useq import MDASequence
+
+from eda_plugin.actuators.pymmc import CoreActuator
+from eda_plugin.utility.core_event_bus import CoreEventBus
+from eda_plugin.utility.synthetic_camera import BlobFrames, StackFrames, SyntheticCore
+
+
+def test_blob_events():
+    frames = BlobFrames((128, 128), event_times=[3], event_duration=2, event_position=(64, 64))
+    assert frames(0).shape == (128, 128)
+    assert frames(0).dtype == np.uint16
+    assert frames.event_strength(2) == 0
+    assert frames.event_strength(3) == 0.5
+    assert frames.event_strength(4) == 1
+    assert frames(4)[64, 64] > frames(3)[64, 64] > frames(2)[64, 64] + 1000
+    assert frames(5)[64, 64] < 2000
+
+
+def test_stack_from_tiff(tmp_path):
+    data = np.arange(3 * 2 * 8 * 8, dtype=np.uint16).reshape(3, 2, 8, 8)
+    path = str(tmp_path / "stack.tif")
+    tifffile.imwrite(path, data)
+    frames = StackFrames.from_file(path)
+    assert np.array_equal(frames(1, 1), data[1, 1])
+    assert np.array_equal(frames(4, 0), data[1, 0])
+
+
+def test_sequence(qtbot):
+    core = SyntheticCore(BlobFrames((64, 64)), fps=0)
+    event_bus = CoreEventBus(core)
+    images = []
+    event_bus.new_image_event.connect(images.append)
+    sequence = MDASequence(channels=["A", "B"], time_plan={"interval": 0, "loops": 5})
+    with qtbot.waitSignal(event_bus.acquisition_ended_event, timeout=5000):
+        core.run_mda(sequence)
+    qtbot.waitUntil(lambda: len(images) == 10)
+    assert [(image.timepoint, image.channel) for image in images[:3]] == [(0, 0), (0, 1), (1, 0)]
+    assert core.frames_emitted == 10
+
+
+def test_frame_rate_limit(qtbot):
+    core = SyntheticCore(BlobFrames((64, 64)), fps=50)
+    event_bus = CoreEventBus(core)
+    sequence = MDASequence(time_plan={"interval": 0, "loops": 6})
+    with qtbot.waitSignal(event_bus.acquisition_ended_event, timeout=5000):
+        core.run_mda(sequence)
+    assert core.achieved_fps <= 55
+
+
+def test_core_actuator(qtbot):
+    core = SyntheticCore(BlobFrames((64, 64)), fps=0)
+    event_bus = CoreEventBus(core)
+    actuator = CoreActuator(event_bus, gui=False)
+    images = []
+    event_bus.new_image_event.connect(images.append)
+    actuator.acquisition.run()
+    qtbot.waitUntil(lambda: len(images) == 2)
+    with qtbot.waitSignal(event_bus.acquisition_ended_event, timeout=5000):
+        actuator.acquisition.stop_acq()
+    assert [image.channel for image in images] == [0, 1]
+
+
+def test_headless_config(qtbot):
+    from eda_plugin.utility.headless import make_event_bus
+
+    event_bus = make_event_bus({"event_bus": "synthetic",
+                                "synthetic": {"fps": 20, "shape": [32, 32], "event_times": [1]}})
+    assert isinstance(event_bus.mmcore, SyntheticCore)
+    assert event_bus.mmcore.fps == 20
+    assert event_bus.mmcore.frames.shape == (32, 32)
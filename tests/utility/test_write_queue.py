@@ -0,0 +1,92 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from eda_plugin.utility.write_queue import WriteJob, WriteQueue, WriterThread
+
+
+def job(kind, written, value=0):
+    return WriteJob(kind, lambda data, value: written.append((kind, value, data)),
+                    np.full((4, 4), value, dtype=np.uint16), (value,))
+
+
+def run_all(queue):
+    thread = WriterThread(queue)
+    thread.start()
+    assert queue.join(5)
+    thread.stop(5)
+
+
+def test_order_and_metrics():
+    written = []
+    queue = WriteQueue(4)
+    for value in range(3):
+        queue.put(job("image", written, value))
+    queue.put(WriteJob("decision_parameter", lambda _, v: written.append(("decision", v, None)),
+                       args=(1.,)))
+    run_all(queue)
+    assert [entry[:2] for entry in written] == [("image", 0), ("image", 1), ("image", 2),
+                                               ("decision", 1.)]
+    metrics = queue.metrics()
+    assert metrics["written"] == 4
+    assert metrics["bytes_written"] == 3 * 32
+    assert metrics["max_queue_depth"] == 4
+    assert metrics["queue_depth"] == 0
+
+
+def test_block():
+    written = []
+    queue = WriteQueue(1, "block")
+    queue.put(job("image", written, 0))
+    producer = threading.Thread(target=queue.put, args=(job("image", written, 1),))
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()
+    thread = WriterThread(queue)
+    thread.start()
+    producer.join(1)
+    assert not producer.is_alive()
+    assert queue.join(5)
+    thread.stop(5)
+    assert [entry[1] for entry in written] == [0, 1]
+
+
+def test_drop_network():
+    written = []
+    queue = WriteQueue(2, "drop_network")
+    queue.put(job("network_image", written, 0))
+    queue.put(job("network_image", written, 1))
+    queue.put(job("image", written, 2))
+    queue.put(job("network_image", written, 3))
+    run_all(queue)
+    assert [entry[:2] for entry in written] == [("network_image", 1), ("image", 2)]
+    assert queue.metrics()["dropped"] == 2
+
+
+def test_spill(tmp_path):
+    written = []
+    queue = WriteQueue(1, "spill", str(tmp_path))
+    for value in range(3):
+        queue.put(job("image", written, value))
+    assert queue.metrics()["spilled"] == 2
+    assert len(os.listdir(tmp_path)) == 2
+    run_all(queue)
+    for value, (_, _, data) in enumerate(written):
+        assert np.array_equal(data, np.full((4, 4), value, dtype=np.uint16))
+    assert os.listdir(tmp_path) == []
+
+
+def test_errors_are_logged():
+    written = []
+    queue = WriteQueue(2)
+    queue.put(WriteJob("image", lambda data: 1 / 0, np.zeros(2)))
+    queue.put(job("image", written, 1))
+    run_all(queue)
+    assert len(written) == 1
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        WriteQueue(2, "lose_everything")
@@ -8,6 +8,7 @@ import numpy as np
 import ome_types
 import pytest
 
+from eda_plugin.utility.columnar_log import read_log
 from eda_plugin.utility.writers import Writer
 from ome_zarr.io import parse_url
 from ome_zarr.reader import Reader
@@ -65,6 +66,7 @@ def test_full(writer_plugin, java_settings_event_w_save_loc):
     writer_plugin.event_bus.acquisition_ended_event.emit(None)
 
     time.sleep(1)
+    assert writer_plugin.flush(10)
 
     folders = sorted(glob.glob(os.path.dirname(__file__) + "/../data/FOV*.ome.zarr"))
     folder = folders[-1]
@@ -96,3 +98,197 @@ def test_clean_up():
             shutil.rmtree(os.path.join(folder, subfolder))
         except NotADirectoryError:
             os.remove(os.path.join(folder, subfolder))
+
+
+def test_preallocated_arrays(event_bus, java_settings_event, tmp_path, qtbot):
+    import zarr
+
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    frames = {}
+    for t in range(5):
+        for c in range(2):
+            frames[t, c] = np.full((64, 32), t * 10 + c, dtype=np.uint16)
+            event_bus.new_image_event.emit(PyImage(frames[t, c], {}, t, c, 0, t * 100))
+        # As from an interpreter connected before the Writer
+        event_bus.new_interpretation.emit(100. * t)
+        event_bus.new_decision_parameter.emit(float(t), t / 10, t)
+    event_bus.new_network_image.emit(np.ones((64, 32), dtype=np.float32), (0, 0))
+    event_bus.new_network_image.emit(np.full((64, 32), 3, dtype=np.float32), (3, 0))
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+
+    root = zarr.open(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0], mode="r")
+    images = root["Images/0"]
+    assert images.shape == (5, 2, 1, 64, 32)
+    assert images.chunks == (1, 1, 1, 64, 32)
+    assert np.array_equal(images[4, 1, 0], frames[4, 1])
+    nn_images = root["EDA/nn_images"]
+    assert nn_images.shape == (4, 1, 1, 64, 32)
+    assert nn_images[1].max() == 0 and nn_images[3].min() == 3
+    log = read_log(root["EDA/analyser_output"])
+    assert np.array_equal(log["timepoint"], np.arange(5))
+    assert np.array_equal(log["decision"], np.arange(5.))
+    assert np.array_equal(log["interval"], np.arange(5) * 100.)
+    assert np.all(log["analysis_latency"] >= 0)
+    writer.close()
+
+
+def test_stage_times(event_bus, java_settings_event, MMSettings_mock, tmp_path, qtbot):
+    import zarr
+    from eda_plugin.analysers.image import ImageAnalyser
+
+    analyser = ImageAnalyser(event_bus, gui=False)
+    analyser.new_mda_settings(MMSettings_mock)
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    decisions = []
+    event_bus.new_decision_parameter.connect(lambda *args: decisions.append(args))
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    for t in range(3):
+        for c in range(2):
+            event_bus.new_image_event.emit(PyImage(np.full((128, 64), t, np.uint16), {}, t, c, 0,
+                                                   t * 100))
+        qtbot.waitUntil(lambda: len(decisions) == t + 1)
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+
+    root = zarr.open(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0], mode="r")
+    log = read_log(root["EDA/analyser_output"])
+    assert np.array_equal(log["timepoint"], np.arange(3))
+    # The ImageAnalyserWorker has no network input to prepare
+    assert np.isnan(log["prepared"]).all()
+    stages = np.stack([log[stage] for stage in ["image", "started", "analysed", "decided",
+                                                "received"]])
+    assert (np.diff(stages, axis=0) >= 0).all()
+    assert np.allclose(log["analysis_latency"], log["received"] - log["image"])
+    writer.close()
+
+
+def test_next_acquisition_within_finish(event_bus, java_settings_event, tmp_path, qtbot):
+    """The delayed end of an acquisition only trims and flushes the arrays and log of that one."""
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    for acquisition in range(2):
+        event_bus.acquisition_started_event.emit(java_settings_event)
+        event_bus.new_image_event.emit(PyImage(np.zeros((64, 32), np.uint16), {}, 0, 0, 0, 0))
+        event_bus.new_decision_parameter.emit(1., 0., 0)
+        if not acquisition:
+            assert writer.flush(10)
+            first = writer.arrays["images"]
+            event_bus.acquisition_ended_event.emit(None)
+    qtbot.wait(1500)
+    assert writer.flush(10)
+    assert first.shape[0] == 1
+    assert writer.arrays["images"].shape[0] > 1
+    assert writer.log.rows == 1
+    writer.close()
+
+
+def test_log_with_interpreter(event_bus, java_settings_event, tmp_path, qtbot):
+    import zarr
+    from eda_plugin.interpreters.frame_rate import BinaryFrameRateInterpreter
+
+    params = {"slow_interval": 5., "fast_interval": 0.5, "lower_threshold": 20.,
+              "upper_threshold": 50.}
+    interpreter = BinaryFrameRateInterpreter(event_bus, gui=False, params=params)
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path)})
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    for t, decision in enumerate([10, 10, 100, 100, 100, 10, 10]):
+        event_bus.new_decision_parameter.emit(float(decision), t / 10, t)
+    # Parameter changes are in effect for the decisions after them
+    interpreter.update_parameters(interpreter.params.__class__(dict(params, slow_interval=10.)))
+    event_bus.new_decision_parameter.emit(10., 0.7, 7)
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+
+    root = zarr.open(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0], mode="r")
+    log = read_log(root["EDA/analyser_output"])
+    assert np.array_equal(log["timepoint"], np.arange(8))
+    assert np.array_equal(log["interval"], [5., 5., 0.5, 0.5, 0.5, 5., 5., 10.])
+    writer.close()
+
+
+def test_compression(event_bus, java_settings_event, tmp_path, qtbot):
+    import zarr
+
+    options = {"path": str(tmp_path), "compression": {"images": "zstd"}}
+    writer = Writer(event_bus, gui=False, options=options)
+    # The datasets that are not named keep their default
+    assert writer.options["compression"] == {"images": "zstd", "nn_images": "auto",
+                                             "analyser_output": "zstd"}
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    frame = (np.random.default_rng(0).poisson(100, (64, 64))).astype(np.uint16)
+    event_bus.new_image_event.emit(PyImage(frame, {}, 0, 0, 0, 0))
+    event_bus.new_network_image.emit(np.zeros((64, 64), dtype=np.float32), (0, 0))
+    event_bus.new_decision_parameter.emit(1., 0.1, 0)
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+
+    root = zarr.open(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0], mode="r")
+    assert root["Images/0"].compressor.cname == "zstd"
+    assert np.array_equal(root["Images/0"][0, 0, 0], frame)
+    assert writer.codecs["nn_images"] in ["lz4", "lz4_bit", "zstd", "zstd_high"]
+    assert writer.codecs["analyser_output"] == "zstd"
+    writer.close()
+
+
+def test_pyramid(event_bus, java_settings_event, tmp_path, qtbot):
+    import zarr
+
+    writer = Writer(event_bus, gui=False, options={"path": str(tmp_path), "pyramid_levels": 3})
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    frames = {}
+    for t in range(3):
+        for c in range(2):
+            frames[t, c] = np.random.default_rng(t * 2 + c).integers(0, 1000, (64, 32), np.uint16)
+            event_bus.new_image_event.emit(PyImage(frames[t, c], {}, t, c, 0, t * 100))
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+    writer.close()
+
+    folder = glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0]
+    root = zarr.open(folder, mode="r")
+    assert root["Images/1"].shape == (3, 2, 1, 32, 16)
+    assert root["Images/2"].shape == (3, 2, 1, 16, 8)
+    expected = frames[2, 1].reshape(32, 2, 16, 2).mean(axis=(1, 3)).astype(np.uint16)
+    assert np.array_equal(root["Images/1"][2, 1, 0], expected)
+    nodes = list(Reader(parse_url(folder + "/Images"))())
+    assert [level.shape[-2:] for level in nodes[0].data] == [(64, 32), (32, 16), (16, 8)]
+
+
+def test_quantized_network_images(event_bus, java_settings_event, tmp_path, qtbot):
+    from eda_plugin.utility.dataset import EDADataset
+
+    options = {"path": str(tmp_path), "nn_dtype": "uint8", "nn_range": (0., 2.),
+               "nn_native": True}
+    writer = Writer(event_bus, gui=False, options=options)
+    event_bus.acquisition_started_event.emit(java_settings_event)
+    event_bus.new_image_event.emit(PyImage(np.zeros((64, 32), np.uint16), {}, 0, 0, 0, 0))
+    nn_image = np.random.default_rng(0).uniform(0, 2, (48, 32)).astype(np.float32)
+    # Only the settings at the start of the acquisition count
+    writer.options["nn_dtype"] = "uint16"
+    event_bus.new_network_image.emit(nn_image, (0, 0))
+    event_bus.new_network_image.emit(nn_image + 1, (3, 0))
+    event_bus.acquisition_ended_event.emit(None)
+    assert writer.flush(10)
+    writer.close()
+    assert writer.nn_clipped == np.count_nonzero(nn_image > 1)
+
+    dataset = EDADataset(glob.glob(str(tmp_path / "mock" / "FOV_*.ome.zarr"))[0])
+    assert dataset.nn_images.dtype == np.uint8
+    assert dataset.nn_images.shape == (4, 1, 1, 48, 32)
+    assert dataset.nn_images.attrs["image_region"] == [[0, 48], [0, 32]]
+    network = dataset.view([0, 1, 3]).network_images()
+    assert np.allclose(network[0, 0, 0], nn_image, atol=2 / 254)
+    assert np.isnan(network[1]).all()
+    assert dataset.nn_images.nchunks_initialized == 2
+
+
+def test_quantization_needs_a_range():
+    from eda_plugin.utility.writers import quantization
+
+    scale, offset = quantization("uint8", (0., 1.))
+    assert scale == 1 / 254 and offset == -scale
+    with pytest.raises(ValueError):
+        quantization("uint8", None)
+    with pytest.raises(ValueError):
+        quantization("uint8", (0., 0.))